@@ -0,0 +1,364 @@
+"""
+Benchmark the Company and Super-Admin APIs against a seeded local Postgres.
+
+    python Benchmarks/bench.py --dsn "host=localhost user=postgres" \
+        --tenants 1x2000,3x200,10x20 --requests 500 --concurrency 16
+
+Steps:
+  1. (re)create the benchmark database and load SQL/Schema.sql into it
+  2. seed it with the requested tenant sizes (see seed.py)
+  3. import both FastAPI apps in-process and drive them through
+     TestClient from a pool of threads
+  4. report p50/p95/p99 latency, throughput and DB statements per request
+
+--json writes the results for later comparison; --baseline compares
+against such a file and exits non-zero when p95 latency or statements
+per request regress by more than --max-regression.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import psycopg2
+import psycopg2.extensions
+
+from seed import seed
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA_PATH = ROOT / "SQL" / "Schema.sql"
+COMPANY_SERVER = ROOT / "Company" / "Backend" / "server.py"
+ADMIN_SERVER = ROOT / "Super-Admin" / "Backend" / "server.py"
+
+
+# =====================================
+# STATEMENT COUNTING
+# =====================================
+class StatementCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self, n=1):
+        with self._lock:
+            self.value += n
+
+statements = StatementCounter()
+
+def counting_cursor(base):
+    """Subclass the app's cursor factory so its own instrumentation still runs."""
+
+    class CountingCursor(base):
+        def execute(self, query, vars=None):
+            statements.add()
+            return super().execute(query, vars)
+
+        def executemany(self, query, vars_list):
+            vars_list = list(vars_list)
+            statements.add(len(vars_list))
+            return super().executemany(query, vars_list)
+
+    return CountingCursor
+
+
+# =====================================
+# DATABASE SETUP
+# =====================================
+def load_schema(conn):
+    # psql meta-commands (\restrict ...) are not SQL
+    sql = "\n".join(
+        line for line in SCHEMA_PATH.read_text().splitlines()
+        if not line.startswith("\\")
+    )
+
+    cur = conn.cursor()
+    cur.execute(sql)
+    # the dump empties search_path for the rest of the session
+    cur.execute("RESET search_path")
+    conn.commit()
+    cur.close()
+
+def prepare_database(admin_dsn, database, reset):
+    admin = psycopg2.connect(admin_dsn)
+    admin.autocommit = True
+    cur = admin.cursor()
+
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,))
+    exists = cur.fetchone() is not None
+
+    if exists and reset:
+        cur.execute(f'DROP DATABASE "{database}" WITH (FORCE)')
+        exists = False
+
+    if not exists:
+        cur.execute(f'CREATE DATABASE "{database}"')
+
+    cur.close()
+    admin.close()
+
+    params = psycopg2.extensions.parse_dsn(admin_dsn)
+    params["dbname"] = database
+    return params, not exists
+
+
+# =====================================
+# APPS
+# =====================================
+def load_app(module_name, path):
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def configure_env(params, extra_env):
+    os.environ["DB_HOST"] = params.get("host", "localhost")
+    os.environ["DB_NAME"] = params["dbname"]
+    os.environ["DB_USER"] = params.get("user", "postgres")
+    os.environ["DB_PASSWORD"] = params.get("password", "")
+
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+
+# =====================================
+# SCENARIOS
+# =====================================
+def company_login(client, company_id, emp_id, password):
+    res = client.post("/company/login", json={
+        "company_id": company_id,
+        "emp_id": emp_id,
+        "password": password
+    })
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def admin_login(client, name, password):
+    res = client.post("/login", json={"admin_id": name, "password": password})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def build_scenarios(company_client, admin_client, fixture):
+    today = date.today().isoformat()
+    tenants = []
+
+    for tenant in fixture["tenants"]:
+        tenants.append({
+            "headers": company_login(
+                company_client,
+                tenant["company_id"],
+                tenant["user_emp_id"],
+                fixture["password"]
+            ),
+            "project_ids": tenant["project_ids"],
+        })
+
+    admin_headers = admin_login(
+        admin_client, fixture["platform_admin"], fixture["password"]
+    )
+
+    def company_get(path_for):
+        def run(rng):
+            tenant = rng.choice(tenants)
+            return company_client.get(path_for(tenant, rng), headers=tenant["headers"])
+        return run
+
+    return {
+        "GET /company/me": company_get(lambda t, r: "/company/me"),
+        "GET /company/attendance": company_get(
+            lambda t, r: f"/company/attendance?date={today}"
+        ),
+        "GET /sales/leads": company_get(lambda t, r: "/sales/leads"),
+        "GET /projects/{id}/tasks": company_get(
+            lambda t, r: f"/projects/{r.choice(t['project_ids'])}/tasks"
+        ),
+        "GET /companies": lambda rng: admin_client.get(
+            "/companies", headers=admin_headers
+        ),
+    }
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def run_scenario(run, requests, concurrency, warmup, seed_value):
+    rng_lock = threading.Lock()
+    rng = random.Random(seed_value)
+
+    def one(_):
+        with rng_lock:
+            local = random.Random(rng.random())
+        started = time.perf_counter()
+        res = run(local)
+        return time.perf_counter() - started, res.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(warmup)))
+
+        before = statements.value
+        started = time.perf_counter()
+        results = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+        executed = statements.value - before
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    errors = sum(1 for r in results if r[1] >= 400)
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "queries_per_request": round(executed / requests, 2) if requests else 0.0,
+    }
+
+
+# =====================================
+# REPORTING
+# =====================================
+def print_report(results):
+    header = f"{'endpoint':<28}{'req':>7}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}{'q/req':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<28}{r['requests']:>7}{r['errors']:>6}"
+            f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['throughput_rps']:>10.1f}{r['queries_per_request']:>8.2f}"
+        )
+
+def compare_to_baseline(results, baseline, max_regression):
+    failures = []
+
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+
+        for metric in ("p95_ms", "queries_per_request"):
+            before, after = previous[metric], current[metric]
+            if before and after > before * (1 + max_regression):
+                failures.append(f"{name}: {metric} {before} -> {after}")
+
+        if current["errors"] > previous.get("errors", 0):
+            failures.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+
+    return failures
+
+
+def parse_tenants(spec):
+    sizes = []
+    for part in spec.split(","):
+        count, _, size = part.strip().partition("x")
+        sizes.extend([int(size)] * int(count))
+    return sizes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default="host=localhost user=postgres dbname=postgres",
+                        help="DSN of a maintenance database used to create the bench DB")
+    parser.add_argument("--database", default="cms_bench")
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep an existing bench database instead of recreating it")
+    parser.add_argument("--tenants", default="1x2000,3x200,10x20",
+                        help="COUNTxUSERS list, e.g. 1x2000,3x200")
+    parser.add_argument("--attendance-days", type=int, default=60)
+    parser.add_argument("--leads-per-user", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", action="append", default=[],
+                        help="run only scenarios containing this text (repeatable)")
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE passed to the apps, e.g. DB_ASYNC=true")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    params, created = prepare_database(args.dsn, args.database, reset=not args.reuse)
+    fixture_path = Path(__file__).resolve().parent / f".{args.database}.fixture.json"
+
+    if created:
+        conn = psycopg2.connect(**params)
+        load_schema(conn)
+        started = time.perf_counter()
+        fixture = seed(
+            conn,
+            parse_tenants(args.tenants),
+            attendance_days=args.attendance_days,
+            leads_per_user=args.leads_per_user,
+            seed=args.seed
+        )
+        conn.close()
+        fixture_path.write_text(json.dumps(fixture))
+        print(f"seeded {args.database} in {time.perf_counter() - started:.1f}s")
+    else:
+        fixture = json.loads(fixture_path.read_text())
+
+    configure_env(params, args.env)
+
+    from fastapi.testclient import TestClient
+
+    company = load_app("company_server", COMPANY_SERVER)
+    admin = load_app("admin_server", ADMIN_SERVER)
+
+    for module in (company, admin):
+        kwargs = module.db_pool.connect_kwargs
+        kwargs["cursor_factory"] = counting_cursor(
+            kwargs.get("cursor_factory", psycopg2.extensions.cursor)
+        )
+
+    with TestClient(company.app) as company_client, TestClient(admin.app) as admin_client:
+        scenarios = build_scenarios(company_client, admin_client, fixture)
+        results = {}
+
+        for name, run in scenarios.items():
+            if args.only and not any(o in name for o in args.only):
+                continue
+            results[name] = run_scenario(
+                run, args.requests, args.concurrency, args.warmup, args.seed
+            )
+
+    print_report(results)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        failures = compare_to_baseline(
+            results,
+            json.loads(Path(args.baseline).read_text()),
+            args.max_regression
+        )
+        if failures:
+            print("\nRegressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
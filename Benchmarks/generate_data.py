@@ -0,0 +1,810 @@
+"""
+Generate a production-sized, multi-tenant dataset for SQL/Schema.sql.
+
+    python Benchmarks/generate_data.py --dsn "host=localhost user=postgres dbname=postgres" \
+        --database cms_big --companies 3000 --users 200000 --years 2 --workers 8
+
+Every table in the schema is filled with referentially valid rows. Tenant
+sizes follow a Zipf-like curve (--skew), so a handful of companies hold a
+large share of the employees while the long tail stays small.
+
+Loading goes through COPY from a pool of worker processes. Row ids are
+assigned up front from per-company offsets, so workers never have to
+coordinate: phase 1 loads the platform tables, phase 2 each company's
+core data, phase 3 the bulk tables (attendance, lead interactions) in
+user/lead slices so the biggest tenants are spread over all workers.
+At the end the rollup tables are built from the loaded rows and the
+sequences are moved past the generated ids.
+
+A fixture file compatible with bench.py --reuse is written next to this
+script, so the benchmark can run against the generated database.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import psycopg2
+from passlib.context import CryptContext
+
+from bench import load_schema, prepare_database
+from seed import BENCH_PASSWORD, PLATFORM_ADMIN_NAME, build_rollups
+
+FEATURES = [
+    ("ATTENDANCE", "Attendance", [("attendance", "Attendance", "/attendance.html")]),
+    ("LEAVES", "Leaves", [("leaves", "Leaves", "/leaves.html")]),
+    ("SALES", "Sales", [("leads", "Leads", "/leads.html")]),
+    ("PROJECTS", "Projects", [
+        ("projects", "Projects", "/projects.html"),
+        ("tasks", "Tasks", "/tasks.html")
+    ]),
+    ("HR", "Teams & HR", [
+        ("teams_hr", "Teams & HR", "/teams_hr.html"),
+        ("user_management", "User Management", "/user_management.html")
+    ]),
+]
+FEATURE_IDS = {code: i for i, (code, _, _) in enumerate(FEATURES, start=1)}
+
+PERMISSIONS = [
+    "attendance.mark", "attendance.view", "leaves.apply", "leaves.review",
+    "leads.create", "leads.assign", "projects.plan", "tasks.approve",
+    "users.manage", "teams.manage",
+]
+
+# role -> (features, permission indexes, share of employees)
+ROLES = [
+    ("Employee", ["ATTENDANCE", "LEAVES", "PROJECTS"], [1, 2], 60),
+    ("Sales", ["ATTENDANCE", "LEAVES", "SALES"], [1, 2, 4, 5], 25),
+    ("HR", ["ATTENDANCE", "LEAVES", "HR"], [0, 1, 2, 3, 8, 9], 5),
+    ("Manager", ["ATTENDANCE", "LEAVES", "PROJECTS", "HR"], [0, 1, 3, 6, 7, 9], 10),
+]
+ROLE_WEIGHTS = [r[3] for r in ROLES]
+ROLE_FEATURE_COUNT = sum(len(r[1]) for r in ROLES)
+ROLE_PERMISSION_COUNT = sum(len(r[2]) for r in ROLES)
+
+COMPANY_SETTINGS = ["timezone", "work_week"]
+ONBOARDING_STEPS = ["account_created", "admin_invited", "employees_imported"]
+PLANS = [("Starter", 29, 290, 50), ("Growth", 99, 990, 500), ("Enterprise", 499, 4990, None)]
+
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Isha", "Vikram", "Ananya",
+               "Arjun", "Sara", "Nikhil", "Priya", "Karan", "Neha", "Aditya", "Pooja"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Khan", "Gupta", "Nair", "Singh",
+              "Mehta", "Das", "Joshi", "Kapoor", "Rao", "Bose", "Pillai", "Verma"]
+CITIES = ["Mumbai", "Pune", "Bengaluru", "Delhi", "Chennai", "Hyderabad", "Kolkata"]
+SOURCES = ["Website", "Referral", "Cold Call", "Event", "LinkedIn", "Partner"]
+LEAD_STATUSES = ["New", "Contacted", "Qualified", "Proposal", "Lost", "Won"]
+LEAD_STATUS_WEIGHTS = [25, 25, 15, 10, 15, 10]
+INTERACTION_TYPES = ["Call", "Email", "Meeting", "Demo"]
+ATTENDANCE_STATUSES = ["Present", "Absent", "Leave"]
+ATTENDANCE_WEIGHTS = [88, 5, 7]
+LEAVE_TYPES = ["Sick", "Casual", "Earned", "Unpaid"]
+LEAVE_STATUSES = ["Approved", "Rejected", "Pending", "Cancelled"]
+LEAVE_STATUS_WEIGHTS = [70, 10, 15, 5]
+PROJECT_STATUSES = ["Assigned", "Planned", "In Progress", "Completed"]
+TASK_STATUSES = ["Pending Approval", "Active", "In Progress", "Review", "Blocked", "Done"]
+PRIORITIES = ["Low", "Medium", "High"]
+
+NULL = "\\N"
+
+
+# =====================================
+# COPY HELPERS
+# =====================================
+def fmt(value):
+    if value is None:
+        return NULL
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value)
+
+class CopyBuffer:
+    """Accumulates text-format COPY rows for one table and flushes in batches."""
+
+    def __init__(self, cur, table, columns, flush_rows=50000):
+        self.cur = cur
+        self.sql = f"COPY public.{table} ({', '.join(columns)}) FROM STDIN"
+        self.flush_rows = flush_rows
+        self.rows = []
+        self.total = 0
+
+    def add(self, *values):
+        self.rows.append("\t".join(map(fmt, values)))
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.cur.copy_expert(self.sql, io.StringIO("\n".join(self.rows) + "\n"))
+            self.total += len(self.rows)
+            self.rows = []
+        return self.total
+
+
+# =====================================
+# PLANNING
+# =====================================
+def tenant_sizes(companies, users, skew, min_size, rng):
+    weights = [1 / (rank ** skew) for rank in range(1, companies + 1)]
+    scale = users / sum(weights)
+    sizes = [max(min_size, round(w * scale)) for w in weights]
+    rng.shuffle(sizes)
+    return sizes
+
+def workdays(years):
+    today = date.today()
+    start = today - timedelta(days=int(365 * years))
+    days = []
+    day = start
+    while day < today:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def company_counts(users, opts, n_workdays, months):
+    teams = max(1, users // opts.team_size)
+    leads = users * opts.leads_per_user
+    projects = min(leads, teams * 2)
+    tasks = projects * opts.tasks_per_project
+
+    return {
+        "users": users,
+        "user_profile_data": users,
+        "user_roles": users - 1,
+        "user_sessions": users * opts.sessions_per_user,
+        "roles": len(ROLES),
+        "roles_features": ROLE_FEATURE_COUNT,
+        "role_permissions": ROLE_PERMISSION_COUNT,
+        "teams": teams,
+        "team_members": users - 1,
+        "attendance": users * n_workdays,
+        "leave_requests": users * opts.leaves_per_user,
+        "leads": leads,
+        "lead_interactions": leads * opts.interactions_per_lead,
+        "projects": projects,
+        "project_planning": projects,
+        "project_status_logs": projects * 2,
+        "project_tasks": tasks,
+        "task_updates": tasks * 2,
+        "company_activity_logs": users * 2,
+        "company_features": len(FEATURES),
+        "company_contacts": 1,
+        "company_subscriptions": 1,
+        "company_settings": len(COMPANY_SETTINGS),
+        "company_health_scores": 1,
+        "company_onboarding_logs": len(ONBOARDING_STEPS),
+        "company_usage_metrics": months,
+        "feature_usage_metrics": months * len(FEATURES),
+    }
+
+def build_plan(opts, rng):
+    days = workdays(opts.years)
+    months = max(1, int(opts.years * 12))
+    sizes = tenant_sizes(opts.companies, opts.users, opts.skew, opts.min_tenant_size, rng)
+
+    specs = []
+    offsets = {}
+    for index, size in enumerate(sizes):
+        counts = company_counts(size, opts, len(days), months)
+        specs.append({
+            "company_id": index + 1,
+            "users": size,
+            "counts": counts,
+            "base": {t: offsets.get(t, 0) for t in counts},
+        })
+        for table, count in counts.items():
+            offsets[table] = offsets.get(table, 0) + count
+
+    return specs, offsets, days, months
+
+
+# =====================================
+# WORKERS
+# =====================================
+_conn = None
+_opts = None
+
+def init_worker(dsn_params, opts):
+    global _conn, _opts
+    _opts = opts
+    _conn = psycopg2.connect(**dsn_params)
+    cur = _conn.cursor()
+    cur.execute("SET synchronous_commit = off")
+    if opts.fast:
+        # FK triggers off; rows are referentially valid by construction
+        cur.execute("SET session_replication_role = replica")
+    cur.close()
+    _conn.commit()
+
+def run_task(task):
+    kind = task[0]
+    cur = _conn.cursor()
+    started = time.perf_counter()
+
+    if kind == "core":
+        rows = load_company_core(cur, task[1], task[2], task[3])
+    elif kind == "attendance":
+        rows = load_attendance_slice(cur, *task[1:])
+    else:
+        rows = load_interaction_slice(cur, *task[1:])
+
+    _conn.commit()
+    cur.close()
+    return kind, rows, time.perf_counter() - started
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def ts(day, rng, start_hour=9, span_hours=9):
+    return datetime(day.year, day.month, day.day) + timedelta(
+        seconds=rng.randint(start_hour * 3600, (start_hour + span_hours) * 3600)
+    )
+
+def load_company_core(cur, spec, days, months):
+    """Everything a company owns except the bulk attendance/interaction rows."""
+    cid = spec["company_id"]
+    n = spec["users"]
+    base = spec["base"]
+    counts = spec["counts"]
+    rng = random.Random(f"{_opts.seed}:{cid}:core")
+    first_day, last_day = days[0], days[-1]
+    span = (last_day - first_day).days or 1
+    total = 0
+
+    def rand_day():
+        return first_day + timedelta(days=rng.randint(0, span))
+
+    user_ids = list(range(base["users"] + 1, base["users"] + n + 1))
+    admin_id = user_ids[0]
+    members = user_ids[1:] or user_ids
+
+    # ---- users + profiles ----
+    buf = CopyBuffer(cur, "users", [
+        "id", "company_id", "emp_id", "name", "email", "password_hash",
+        "status", "created_at", "is_company_admin"
+    ])
+    for k, uid in enumerate(user_ids, start=1):
+        status = "inactive" if k > 2 and rng.random() < 0.03 else "active"
+        buf.add(
+            uid, cid, f"E{k:06d}", person(rng), f"user{k}@c{cid}.example.com",
+            _opts.password_hash, status, ts(rand_day(), rng), k == 1
+        )
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "user_profile_data", [
+        "id", "user_id", "company_id", "phone", "city", "state", "country",
+        "emergency_contact_name", "emergency_contact_phone"
+    ])
+    for uid in user_ids:
+        buf.add(
+            uid, uid, cid, f"+91{rng.randint(7000000000, 9999999999)}",
+            rng.choice(CITIES), "MH", "India", person(rng),
+            f"+91{rng.randint(7000000000, 9999999999)}"
+        )
+    total += buf.flush()
+
+    # ---- roles ----
+    role_ids = [base["roles"] + i + 1 for i in range(len(ROLES))]
+
+    buf = CopyBuffer(cur, "roles", ["id", "company_id", "name", "description"])
+    for rid, (name, _, _, _) in zip(role_ids, ROLES):
+        buf.add(rid, cid, name, f"{name} role")
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "roles_features", ["id", "role_id", "feature_id"])
+    next_id = base["roles_features"]
+    for rid, (_, codes, _, _) in zip(role_ids, ROLES):
+        for code in codes:
+            next_id += 1
+            buf.add(next_id, rid, FEATURE_IDS[code])
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "role_permissions", ["id", "role_id", "permission_id"])
+    next_id = base["role_permissions"]
+    for rid, (_, _, perms, _) in zip(role_ids, ROLES):
+        for p in perms:
+            next_id += 1
+            buf.add(next_id, rid, p + 1)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "user_roles", ["id", "user_id", "role_id"])
+    for k, uid in enumerate(user_ids[1:]):
+        buf.add(
+            base["user_roles"] + k + 1, uid,
+            rng.choices(role_ids, weights=ROLE_WEIGHTS)[0]
+        )
+    total += buf.flush()
+
+    # ---- teams ----
+    n_teams = counts["teams"]
+    team_ids = [base["teams"] + t + 1 for t in range(n_teams)]
+    managers = [members[(t * 7) % len(members)] for t in range(n_teams)]
+
+    buf = CopyBuffer(cur, "teams", [
+        "id", "company_id", "name", "description", "manager_id", "status", "created_at"
+    ])
+    for t, tid in enumerate(team_ids):
+        buf.add(tid, cid, f"Team {t + 1}", None, managers[t], "Active", ts(first_day, rng))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "team_members", ["id", "team_id", "user_id"])
+    for k, uid in enumerate(user_ids[1:]):
+        buf.add(base["team_members"] + k + 1, team_ids[k % n_teams], uid)
+    total += buf.flush()
+
+    # ---- leads (the first `projects` leads are Won and carry a project) ----
+    n_projects = counts["projects"]
+    lead_ids = [base["leads"] + j + 1 for j in range(counts["leads"])]
+
+    buf = CopyBuffer(cur, "leads", [
+        "id", "company_id", "client_name", "contact_email", "contact_phone",
+        "status", "source", "notes", "assigned_employee_id", "created_by_user_id",
+        "next_follow_up_date", "last_interaction_at", "created_at", "updated_at",
+        "project_created"
+    ])
+    for j, lid in enumerate(lead_ids):
+        won = j < n_projects
+        owner = rng.choice(members)
+        created = ts(rand_day(), rng)
+        buf.add(
+            lid, cid, f"{rng.choice(LAST_NAMES)} {rng.choice(['Traders', 'Labs', 'Infra', 'Foods', 'Retail'])} {j}",
+            f"contact{j}@client{cid}.example.com", f"+91{rng.randint(7000000000, 9999999999)}",
+            "Won" if won else rng.choices(LEAD_STATUSES, weights=LEAD_STATUS_WEIGHTS)[0],
+            rng.choice(SOURCES), None, owner, owner,
+            last_day + timedelta(days=rng.randint(-30, 30)),
+            created + timedelta(days=rng.randint(0, 30)),
+            created, created, won
+        )
+    total += buf.flush()
+
+    # ---- projects, planning, status logs ----
+    project_ids = [base["projects"] + j + 1 for j in range(n_projects)]
+    project_status = {}
+
+    buf = CopyBuffer(cur, "projects", [
+        "id", "company_id", "lead_id", "project_name", "assigned_team_id", "status", "created_at"
+    ])
+    for j, pid in enumerate(project_ids):
+        status = rng.choice(PROJECT_STATUSES)
+        project_status[pid] = status
+        buf.add(pid, cid, lead_ids[j], f"Project {j + 1}", team_ids[j % n_teams], status, ts(rand_day(), rng))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "project_planning", [
+        "id", "project_id", "company_id", "planned_start_date", "planned_end_date",
+        "description", "milestones", "deliverables", "estimated_budget", "priority"
+    ])
+    for j, pid in enumerate(project_ids):
+        start = rand_day()
+        buf.add(
+            base["project_planning"] + j + 1, pid, cid, start,
+            start + timedelta(days=rng.randint(30, 180)), "Generated plan",
+            json.dumps([{"name": "Kickoff"}, {"name": "Delivery"}]), json.dumps([]),
+            rng.randint(10, 500) * 1000, rng.choice(PRIORITIES)
+        )
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "project_status_logs", [
+        "id", "project_id", "company_id", "old_status", "new_status", "changed_by"
+    ])
+    next_id = base["project_status_logs"]
+    for j, pid in enumerate(project_ids):
+        for old, new in (("Unassigned", "Assigned"), ("Assigned", project_status[pid])):
+            next_id += 1
+            buf.add(next_id, pid, cid, old, new, managers[j % n_teams])
+    total += buf.flush()
+
+    # ---- tasks + updates ----
+    per_project = _opts.tasks_per_project
+    buf = CopyBuffer(cur, "project_tasks", [
+        "id", "project_id", "company_id", "title", "assigned_to", "created_by",
+        "start_date", "due_date", "estimated_effort_hours", "priority", "status",
+        "dependency_task_id", "created_at"
+    ])
+    task_ids = []
+    for j, pid in enumerate(project_ids):
+        for m in range(per_project):
+            task_id = base["project_tasks"] + j * per_project + m + 1
+            task_ids.append(task_id)
+            start = rand_day()
+            buf.add(
+                task_id, pid, cid, f"Task {m + 1}", rng.choice(members), managers[j % n_teams],
+                start, start + timedelta(days=rng.randint(1, 30)), rng.randint(1, 40),
+                rng.choice(PRIORITIES), rng.choice(TASK_STATUSES),
+                task_id - 1 if m and rng.random() < 0.3 else None,
+                ts(start, rng)
+            )
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "task_updates", [
+        "id", "task_id", "company_id", "updated_by", "update_type", "old_status", "new_status"
+    ])
+    next_id = base["task_updates"]
+    for task_id in task_ids:
+        for old, new in (("Active", "In Progress"), ("In Progress", "Review")):
+            next_id += 1
+            buf.add(next_id, task_id, cid, rng.choice(members), "status_change", old, new)
+    total += buf.flush()
+
+    # ---- sessions, leave requests, activity ----
+    buf = CopyBuffer(cur, "user_sessions", [
+        "id", "user_id", "company_id", "ip_address", "user_agent", "created_at", "expires_at"
+    ])
+    next_id = base["user_sessions"]
+    for uid in user_ids:
+        for _ in range(_opts.sessions_per_user):
+            next_id += 1
+            created = ts(rand_day(), rng)
+            buf.add(
+                next_id, uid, cid, f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                "Mozilla/5.0", created, created + timedelta(minutes=30)
+            )
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "leave_requests", [
+        "id", "company_id", "user_id", "leave_type", "start_date", "end_date",
+        "total_days", "reason", "status", "applied_at", "reviewed_by", "reviewed_at"
+    ])
+    next_id = base["leave_requests"]
+    for uid in user_ids:
+        booked = set()
+        for _ in range(_opts.leaves_per_user):
+            next_id += 1
+            start = rand_day()
+            length = rng.randint(0, 4)
+            status = rng.choices(LEAVE_STATUSES, weights=LEAVE_STATUS_WEIGHTS)[0]
+
+            # leave_requests_no_overlap: a user's Pending / Approved leaves never overlap
+            days = {start + timedelta(days=d) for d in range(length + 1)}
+            if status in ("Pending", "Approved"):
+                if days & booked:
+                    status = "Rejected"
+                else:
+                    booked |= days
+            applied = ts(start - timedelta(days=rng.randint(1, 14)), rng)
+            reviewed = status in ("Approved", "Rejected")
+            buf.add(
+                next_id, cid, uid, rng.choice(LEAVE_TYPES), start,
+                start + timedelta(days=length), length + 1, "Generated", status, applied,
+                admin_id if reviewed else None,
+                applied + timedelta(hours=rng.randint(1, 48)) if reviewed else None
+            )
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_activity_logs", [
+        "id", "company_id", "user_id", "action", "metadata", "created_at"
+    ])
+    next_id = base["company_activity_logs"]
+    for uid in user_ids:
+        for action in ("LOGIN", "PROFILE_VIEWED"):
+            next_id += 1
+            buf.add(next_id, cid, uid, action, json.dumps({"source": "generator"}), ts(rand_day(), rng))
+    total += buf.flush()
+
+    # ---- per-company platform data ----
+    buf = CopyBuffer(cur, "company_features", ["id", "company_id", "feature_id", "enabled"])
+    for f in range(len(FEATURES)):
+        buf.add(base["company_features"] + f + 1, cid, f + 1, True)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_contacts", [
+        "id", "company_id", "name", "email", "phone", "designation", "is_primary"
+    ])
+    buf.add(base["company_contacts"] + 1, cid, person(rng), f"owner@c{cid}.example.com",
+            "+919800000000", "Founder", True)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_subscriptions", [
+        "id", "company_id", "plan_id", "start_date", "end_date", "status", "auto_renew"
+    ])
+    buf.add(base["company_subscriptions"] + 1, cid, rng.randint(1, len(PLANS)),
+            first_day, last_day + timedelta(days=365), "active", True)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_settings", ["id", "company_id", "setting_key", "setting_value"])
+    for i, key in enumerate(COMPANY_SETTINGS):
+        value = "Asia/Kolkata" if key == "timezone" else ["Mon", "Tue", "Wed", "Thu", "Fri"]
+        buf.add(base["company_settings"] + i + 1, cid, key, json.dumps(value))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_health_scores", ["id", "company_id", "score", "last_calculated_at"])
+    buf.add(base["company_health_scores"] + 1, cid, rng.randint(20, 100), ts(last_day, rng))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_onboarding_logs", ["id", "company_id", "step", "status", "completed_at"])
+    for i, step in enumerate(ONBOARDING_STEPS):
+        buf.add(base["company_onboarding_logs"] + i + 1, cid, step, "completed", ts(first_day, rng))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "company_usage_metrics", [
+        "id", "company_id", "metric_date", "active_users", "api_requests", "storage_used_mb"
+    ])
+    buf2 = CopyBuffer(cur, "feature_usage_metrics", [
+        "id", "company_id", "feature_id", "metric_date", "usage_count"
+    ])
+    for m in range(months):
+        metric_date = last_day - timedelta(days=30 * m)
+        buf.add(base["company_usage_metrics"] + m + 1, cid, metric_date,
+                rng.randint(1, n), rng.randint(n, n * 500), rng.randint(10, 10000))
+        for f in range(len(FEATURES)):
+            buf2.add(base["feature_usage_metrics"] + m * len(FEATURES) + f + 1,
+                     cid, f + 1, metric_date, rng.randint(0, n * 20))
+    total += buf.flush() + buf2.flush()
+
+    return total
+
+def load_attendance_slice(cur, spec, days, first_user, last_user):
+    cid = spec["company_id"]
+    base = spec["base"]
+    rng = random.Random(f"{_opts.seed}:{cid}:attendance:{first_user}")
+    admin_id = base["users"] + 1
+    n_days = len(days)
+
+    buf = CopyBuffer(cur, "attendance", [
+        "id", "company_id", "user_id", "date", "status", "marked_by", "marked_at"
+    ], flush_rows=100000)
+
+    for k in range(first_user, last_user):
+        uid = base["users"] + k + 1
+        row_base = base["attendance"] + k * n_days
+        statuses = rng.choices(ATTENDANCE_STATUSES, weights=ATTENDANCE_WEIGHTS, k=n_days)
+        for d, day in enumerate(days):
+            buf.add(row_base + d + 1, cid, uid, day, statuses[d], admin_id, f"{day} 09:30:00")
+
+    return buf.flush()
+
+def load_interaction_slice(cur, spec, first_lead, last_lead):
+    cid = spec["company_id"]
+    base = spec["base"]
+    n = spec["users"]
+    rng = random.Random(f"{_opts.seed}:{cid}:interactions:{first_lead}")
+    per_lead = _opts.interactions_per_lead
+    today = date.today()
+
+    buf = CopyBuffer(cur, "lead_interactions", [
+        "id", "lead_id", "interaction_type", "description", "logged_by_employee_id", "interaction_at"
+    ], flush_rows=100000)
+
+    for j in range(first_lead, last_lead):
+        lead_id = base["leads"] + j + 1
+        for m in range(per_lead):
+            buf.add(
+                base["lead_interactions"] + j * per_lead + m + 1, lead_id,
+                rng.choice(INTERACTION_TYPES), "Generated interaction",
+                base["users"] + rng.randint(1, n),
+                ts(today - timedelta(days=rng.randint(1, 700)), rng)
+            )
+
+    return buf.flush()
+
+
+# =====================================
+# PLATFORM (single process)
+# =====================================
+def load_platform(conn, specs, opts, days):
+    cur = conn.cursor()
+    rng = random.Random(f"{opts.seed}:platform")
+    total = 0
+
+    buf = CopyBuffer(cur, "plans", ["id", "name", "price_monthly", "price_yearly", "max_employees"])
+    for i, plan in enumerate(PLANS, start=1):
+        buf.add(i, *plan)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "features", ["id", "code", "name", "description"])
+    pages = CopyBuffer(cur, "feature_bundle_pages", ["id", "feature_id", "page_code", "page_name", "route"])
+    page_id = 0
+    for code, name, feature_pages in FEATURES:
+        buf.add(FEATURE_IDS[code], code, name, f"{name} module")
+        for page in feature_pages:
+            page_id += 1
+            pages.add(page_id, FEATURE_IDS[code], *page)
+    total += buf.flush() + pages.flush()
+
+    buf = CopyBuffer(cur, "permissions", ["id", "code", "description"])
+    for i, code in enumerate(PERMISSIONS, start=1):
+        buf.add(i, code, code.replace(".", " "))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "platform_admins", ["id", "name", "email", "password_hash", "role"])
+    buf.add(1, PLATFORM_ADMIN_NAME, "bench-admin@example.com", opts.password_hash, "SUPER_ADMIN")
+    buf.add(2, "support-1", "support-1@example.com", opts.password_hash, "SUPPORT")
+    buf.add(3, "support-2", "support-2@example.com", opts.password_hash, "SUPPORT")
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "platform_sessions", ["id", "admin_id", "ip_address", "created_at", "expires_at"])
+    for i in range(1, 31):
+        created = ts(days[-1] - timedelta(days=i), rng)
+        buf.add(i, rng.randint(1, 3), "10.0.0.1", created, created + timedelta(minutes=30))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "platform_settings", ["id", "key", "value"])
+    buf.add(1, "maintenance_mode", json.dumps(False))
+    buf.add(2, "default_plan", json.dumps("Starter"))
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "platform_revenue_metrics", [
+        "id", "metric_date", "total_revenue", "active_subscriptions", "churn_rate"
+    ])
+    day = days[0]
+    i = 0
+    while day <= days[-1]:
+        i += 1
+        buf.add(i, day, rng.randint(10000, 90000), len(specs), round(rng.uniform(0, 3), 2))
+        day += timedelta(days=1)
+    total += buf.flush()
+
+    buf = CopyBuffer(cur, "companies", [
+        "id", "company_name", "legal_name", "domain", "industry",
+        "employee_size_range", "status", "onboarding_status", "created_at"
+    ])
+    activity = CopyBuffer(cur, "platform_activity_logs", [
+        "id", "actor_type", "actor_id", "action", "target_type", "target_id", "metadata"
+    ])
+    audit = CopyBuffer(cur, "audit_logs", ["id", "entity_type", "entity_id", "action", "performed_by"])
+    for i, spec in enumerate(specs):
+        cid = spec["company_id"]
+        buf.add(
+            cid, f"Company {cid}", f"Company {cid} Pvt Ltd", f"c{cid}.example.com",
+            rng.choice(["IT", "Retail", "Manufacturing", "Finance", "Healthcare"]),
+            str(spec["users"]), "active" if rng.random() < 0.97 else "suspended",
+            "completed", ts(days[0], rng)
+        )
+        activity.add(2 * i + 1, "ADMIN", 1, "COMPANY_CREATED", "COMPANY", cid, json.dumps({"generated": True}))
+        activity.add(2 * i + 2, "ADMIN", 1, "SUBSCRIPTION_UPDATED", "COMPANY", cid, None)
+        audit.add(2 * i + 1, "COMPANY", cid, "COMPANY_CREATED", "ADMIN:1")
+        audit.add(2 * i + 2, "COMPANY", cid, "SUBSCRIPTION_ASSIGNED", "ADMIN:1")
+    total += buf.flush() + activity.flush() + audit.flush()
+
+    conn.commit()
+    cur.close()
+    return total
+
+def reset_sequences(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT table_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND column_name = 'id'
+          AND column_default LIKE 'nextval%%'
+    """)
+    for (table,) in cur.fetchall():
+        cur.execute(f"""
+            SELECT setval(
+                pg_get_serial_sequence('public.{table}', 'id'),
+                COALESCE((SELECT MAX(id) FROM public.{table}), 0) + 1,
+                false
+            )
+        """)
+    conn.commit()
+    cur.close()
+
+
+# =====================================
+# DRIVER
+# =====================================
+def bulk_tasks(specs, days, slice_rows):
+    tasks = []
+    for spec in specs:
+        users_per_slice = max(1, slice_rows // max(1, len(days)))
+        for lo in range(0, spec["users"], users_per_slice):
+            tasks.append(("attendance", spec, days, lo, min(spec["users"], lo + users_per_slice)))
+
+        leads = spec["counts"]["leads"]
+        leads_per_slice = max(1, slice_rows // max(1, spec["counts"]["lead_interactions"] // max(1, leads)))
+        for lo in range(0, leads, leads_per_slice):
+            tasks.append(("interactions", spec, lo, min(leads, lo + leads_per_slice)))
+
+    # biggest slices first keeps the tail short
+    tasks.sort(key=lambda t: -(t[-1] - t[-2]))
+    return tasks
+
+def run_phase(pool, label, tasks):
+    started = time.perf_counter()
+    rows = 0
+    for done, (_, count, _) in enumerate(pool.imap_unordered(run_task, tasks), start=1):
+        rows += count
+        if done % max(1, len(tasks) // 20) == 0 or done == len(tasks):
+            elapsed = time.perf_counter() - started
+            print(f"  {label}: {done}/{len(tasks)} tasks, {rows:,} rows, "
+                  f"{rows / elapsed if elapsed else 0:,.0f} rows/s", flush=True)
+    return rows
+
+def write_fixture(specs, database, password):
+    by_size = sorted(specs, key=lambda s: -s["users"])
+    sample = by_size[:5] + by_size[5:][::max(1, len(by_size) // 20)][:20]
+
+    tenants = []
+    for spec in sample:
+        first_project = spec["base"]["projects"] + 1
+        tenants.append({
+            "company_id": spec["company_id"],
+            "size": spec["users"],
+            "admin_emp_id": "E000001",
+            "user_emp_id": f"E{2 if spec['users'] > 1 else 1:06d}",
+            "project_ids": list(range(first_project, first_project + spec["counts"]["projects"]))[:50],
+        })
+
+    path = Path(__file__).resolve().parent / f".{database}.fixture.json"
+    path.write_text(json.dumps({
+        "password": password,
+        "platform_admin": PLATFORM_ADMIN_NAME,
+        "tenants": tenants,
+    }))
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default="host=localhost user=postgres dbname=postgres",
+                        help="DSN of a maintenance database used to create the target DB")
+    parser.add_argument("--database", default="cms_big")
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=150000, help="total employees across tenants")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for tenant sizes")
+    parser.add_argument("--min-tenant-size", type=int, default=3)
+    parser.add_argument("--years", type=float, default=1.0, help="years of daily attendance")
+    parser.add_argument("--leads-per-user", type=int, default=10)
+    parser.add_argument("--interactions-per-lead", type=int, default=3)
+    parser.add_argument("--leaves-per-user", type=int, default=4)
+    parser.add_argument("--sessions-per-user", type=int, default=3)
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--tasks-per-project", type=int, default=12)
+    parser.add_argument("--slice-rows", type=int, default=250000,
+                        help="rows per bulk COPY task")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--fast", action="store_true",
+                        help="skip FK triggers while loading (needs superuser)")
+    parser.add_argument("--seed", type=int, default=42)
+    opts = parser.parse_args(argv)
+
+    params, _ = prepare_database(opts.dsn, opts.database, reset=True)
+    opts.password_hash = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+
+    rng = random.Random(opts.seed)
+    specs, totals, days, months = build_plan(opts, rng)
+    planned = sum(totals.values())
+    print(f"{len(specs)} companies, {opts.users:,} users requested "
+          f"(largest {max(s['users'] for s in specs):,}), ~{planned:,} rows planned")
+
+    started = time.perf_counter()
+
+    conn = psycopg2.connect(**params)
+    load_schema(conn)
+    rows = load_platform(conn, specs, opts, days)
+    print(f"  platform: {rows:,} rows")
+
+    with multiprocessing.Pool(opts.workers, initializer=init_worker, initargs=(params, opts)) as pool:
+        core = [("core", spec, days, months) for spec in sorted(specs, key=lambda s: -s["users"])]
+        rows += run_phase(pool, "company core", core)
+        rows += run_phase(pool, "bulk", bulk_tasks(specs, days, opts.slice_rows))
+
+    cur = conn.cursor()
+    build_rollups(cur)
+    conn.commit()
+    cur.close()
+    print("  rollups built", flush=True)
+
+    reset_sequences(conn)
+
+    cur = conn.cursor()
+    conn.autocommit = True
+    cur.execute("ANALYZE")
+    cur.close()
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"loaded {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    print(f"fixture: {write_fixture(specs, opts.database, BENCH_PASSWORD)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
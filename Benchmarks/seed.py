@@ -0,0 +1,338 @@
+"""
+Seed a freshly loaded SQL/Schema.sql database with benchmark tenants.
+
+Tenants are described as a list of user counts, e.g. [2000, 200, 20, 20];
+every other volume (leads, attendance days, projects, tasks) scales from
+that number so a big tenant stays big across all the hot endpoints.
+"""
+import json
+import random
+from datetime import date, datetime, timedelta
+
+from passlib.context import CryptContext
+from psycopg2.extras import execute_values
+
+BENCH_PASSWORD = "bench-password"
+PLATFORM_ADMIN_NAME = "bench-admin"
+
+FEATURES = [
+    ("ATTENDANCE", "Attendance", [("attendance", "Attendance", "/attendance.html")]),
+    ("LEAVES", "Leaves", [("leaves", "Leaves", "/leaves.html")]),
+    ("SALES", "Sales", [("leads", "Leads", "/leads.html")]),
+    ("PROJECTS", "Projects", [
+        ("projects", "Projects", "/projects.html"),
+        ("tasks", "Tasks", "/tasks.html")
+    ]),
+    ("HR", "Teams & HR", [
+        ("teams_hr", "Teams & HR", "/teams_hr.html"),
+        ("user_management", "User Management", "/user_management.html")
+    ]),
+]
+
+ROLES = {
+    "Employee": ["ATTENDANCE", "LEAVES", "PROJECTS"],
+    "Sales": ["ATTENDANCE", "LEAVES", "SALES"],
+    "HR": ["ATTENDANCE", "LEAVES", "HR"],
+}
+
+LEAD_STATUSES = ["New", "Contacted", "Qualified", "Proposal", "Won", "Lost"]
+ATTENDANCE_STATUSES = ["Present"] * 17 + ["Absent"] * 2 + ["Leave"]
+TASK_STATUSES = ["Active", "In Progress", "Review", "Blocked", "Done"]
+
+
+def insert_returning(cur, sql, rows, template=None):
+    """execute_values that returns the generated ids in input order."""
+    return [r[0] for r in execute_values(
+        cur, sql, rows, template=template, page_size=5000, fetch=True
+    )]
+
+
+def seed_platform(cur):
+    hashed = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+
+    cur.execute("""
+        INSERT INTO platform_admins (name, email, role, password_hash)
+        VALUES (%s, %s, 'SUPER_ADMIN', %s)
+    """, (PLATFORM_ADMIN_NAME, "bench-admin@example.com", hashed))
+
+    cur.execute("""
+        INSERT INTO plans (name, price_monthly, price_yearly, max_employees)
+        VALUES ('Bench', 99, 999, 100000)
+        RETURNING id
+    """)
+    plan_id = cur.fetchone()[0]
+
+    feature_ids = {}
+    for code, name, pages in FEATURES:
+        cur.execute("""
+            INSERT INTO features (code, name)
+            VALUES (%s, %s)
+            RETURNING id
+        """, (code, name))
+        feature_ids[code] = cur.fetchone()[0]
+
+        execute_values(cur, """
+            INSERT INTO feature_bundle_pages (feature_id, page_code, page_name, route)
+            VALUES %s
+        """, [(feature_ids[code], *page) for page in pages])
+
+    return plan_id, feature_ids, hashed
+
+
+def seed_tenant(cur, rng, index, size, plan_id, feature_ids, password_hash,
+                attendance_days, leads_per_user):
+    today = date.today()
+
+    cur.execute("""
+        INSERT INTO companies (company_name, industry, employee_size_range, status)
+        VALUES (%s, 'Benchmark', %s, 'active')
+        RETURNING id
+    """, (f"Bench Tenant {index}", str(size)))
+    company_id = cur.fetchone()[0]
+
+    cur.execute("""
+        INSERT INTO company_subscriptions (company_id, plan_id, start_date, end_date)
+        VALUES (%s, %s, %s, %s)
+    """, (company_id, plan_id, today, today + timedelta(days=365)))
+
+    execute_values(cur, """
+        INSERT INTO company_features (company_id, feature_id)
+        VALUES %s
+    """, [(company_id, fid) for fid in feature_ids.values()])
+
+    # ---- roles ----
+    role_ids = {}
+    for role_name, codes in ROLES.items():
+        cur.execute("""
+            INSERT INTO roles (company_id, name)
+            VALUES (%s, %s)
+            RETURNING id
+        """, (company_id, role_name))
+        role_ids[role_name] = cur.fetchone()[0]
+
+        execute_values(cur, """
+            INSERT INTO roles_features (role_id, feature_id)
+            VALUES %s
+        """, [(role_ids[role_name], feature_ids[c]) for c in codes])
+
+    # ---- users (first one is the company admin) ----
+    user_ids = insert_returning(cur, """
+        INSERT INTO users
+        (company_id, emp_id, name, email, password_hash, is_company_admin)
+        VALUES %s
+        RETURNING id
+    """, [
+        (
+            company_id,
+            f"E{n:06d}",
+            f"Employee {n}",
+            f"employee{n}@tenant{index}.example.com",
+            password_hash,
+            n == 1
+        )
+        for n in range(1, size + 1)
+    ])
+
+    members = user_ids[1:] or user_ids
+    role_names = list(role_ids)
+
+    execute_values(cur, """
+        INSERT INTO user_roles (user_id, role_id)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+    """, [
+        (uid, role_ids[role_names[i % len(role_names)]])
+        for i, uid in enumerate(members)
+    ], page_size=5000)
+
+    # ---- teams ----
+    team_count = max(1, size // 10)
+    team_ids = insert_returning(cur, """
+        INSERT INTO teams (company_id, name, manager_id)
+        VALUES %s
+        RETURNING id
+    """, [
+        (company_id, f"Team {t}", members[t % len(members)])
+        for t in range(team_count)
+    ])
+
+    execute_values(cur, """
+        INSERT INTO team_members (team_id, user_id)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+    """, [
+        (team_ids[i % team_count], uid)
+        for i, uid in enumerate(members)
+    ], page_size=5000)
+
+    # ---- leads + interactions ----
+    lead_rows = []
+    for _ in range(size * leads_per_user):
+        created = datetime.utcnow() - timedelta(days=rng.randint(0, 365))
+        owner = rng.choice(members)
+        lead_rows.append((
+            company_id,
+            f"Client {rng.randint(1, 10 ** 6)}",
+            f"client{rng.randint(1, 10 ** 6)}@example.com",
+            rng.choice(LEAD_STATUSES),
+            rng.choice(["Website", "Referral", "Cold Call", "Event"]),
+            owner,
+            owner,
+            today + timedelta(days=rng.randint(-5, 20)),
+            created
+        ))
+
+    lead_ids = insert_returning(cur, """
+        INSERT INTO leads
+        (company_id, client_name, contact_email, status, source,
+         assigned_employee_id, created_by_user_id, next_follow_up_date, created_at)
+        VALUES %s
+        RETURNING id
+    """, lead_rows)
+
+    execute_values(cur, """
+        INSERT INTO lead_interactions
+        (lead_id, interaction_type, description, logged_by_employee_id)
+        VALUES %s
+    """, [
+        (lead_id, "Call", "Benchmark follow-up", row[5])
+        for lead_id, row in zip(lead_ids, lead_rows)
+    ], page_size=5000)
+
+    # ---- attendance ----
+    attendance_rows = []
+    for offset in range(attendance_days):
+        day = today - timedelta(days=offset)
+        for uid in user_ids:
+            attendance_rows.append((
+                company_id, uid, day,
+                rng.choice(ATTENDANCE_STATUSES),
+                user_ids[0]
+            ))
+
+    execute_values(cur, """
+        INSERT INTO attendance (company_id, user_id, date, status, marked_by)
+        VALUES %s
+    """, attendance_rows, page_size=10000)
+
+    # ---- leave requests ----
+    leave_rows = []
+    for uid in members:
+        start = today - timedelta(days=rng.randint(0, 180))
+        length = rng.randint(0, 4)
+        leave_rows.append((
+            company_id, uid, rng.choice(["Sick", "Casual", "Earned"]),
+            start, start + timedelta(days=length), length + 1,
+            rng.choice(["Pending", "Approved", "Rejected"])
+        ))
+
+    execute_values(cur, """
+        INSERT INTO leave_requests
+        (company_id, user_id, leave_type, start_date, end_date, total_days, status)
+        VALUES %s
+    """, leave_rows, page_size=5000)
+
+    # ---- projects + tasks (one per team, from the first leads) ----
+    project_ids = insert_returning(cur, """
+        INSERT INTO projects (company_id, lead_id, project_name, assigned_team_id, status)
+        VALUES %s
+        RETURNING id
+    """, [
+        (company_id, lead_ids[t % len(lead_ids)], f"Project {t}", team_id, "In Progress")
+        for t, team_id in enumerate(team_ids)
+    ])
+
+    execute_values(cur, """
+        INSERT INTO project_planning
+        (project_id, company_id, planned_start_date, planned_end_date, description, milestones)
+        VALUES %s
+    """, [
+        (pid, company_id, today, today + timedelta(days=90), "Benchmark plan", json.dumps([]))
+        for pid in project_ids
+    ])
+
+    execute_values(cur, """
+        INSERT INTO project_tasks
+        (project_id, company_id, title, assigned_to, created_by, due_date, priority, status)
+        VALUES %s
+    """, [
+        (
+            pid, company_id, f"Task {k}",
+            rng.choice(members), members[0],
+            today + timedelta(days=rng.randint(1, 60)),
+            rng.choice(["Low", "Medium", "High"]),
+            rng.choice(TASK_STATUSES)
+        )
+        for pid in project_ids
+        for k in range(20)
+    ], page_size=5000)
+
+    return {
+        "company_id": company_id,
+        "size": size,
+        "admin_emp_id": "E000001",
+        "user_emp_id": f"E{2 if size > 1 else 1:06d}",
+        "project_ids": project_ids,
+    }
+
+
+def build_rollups(cur):
+    """Fill the tables the app keeps up to date incrementally (attendance rollups)."""
+    cur.execute("""
+        INSERT INTO attendance_monthly (company_id, user_id, month, present, absent, leave)
+        SELECT
+            company_id,
+            user_id,
+            date_trunc('month', date)::date,
+            COUNT(*) FILTER (WHERE status = 'Present'),
+            COUNT(*) FILTER (WHERE status = 'Absent'),
+            COUNT(*) FILTER (WHERE status = 'Leave')
+        FROM attendance
+        GROUP BY company_id, user_id, date_trunc('month', date)
+    """)
+
+    cur.execute("""
+        INSERT INTO attendance_daily (company_id, date, present, absent, leave, total_active)
+        SELECT
+            a.company_id,
+            a.date,
+            COUNT(*) FILTER (WHERE a.status = 'Present'),
+            COUNT(*) FILTER (WHERE a.status = 'Absent'),
+            COUNT(*) FILTER (WHERE a.status = 'Leave'),
+            MAX(h.active)
+        FROM attendance a
+        JOIN (
+            SELECT company_id, COUNT(*) AS active
+            FROM users
+            WHERE status = 'active'
+            GROUP BY company_id
+        ) h ON h.company_id = a.company_id
+        GROUP BY a.company_id, a.date
+    """)
+
+
+def seed(conn, tenant_sizes, attendance_days=60, leads_per_user=5, seed=42):
+    """Seed the database and return the fixture the benchmark logs in with."""
+    rng = random.Random(seed)
+    cur = conn.cursor()
+
+    plan_id, feature_ids, password_hash = seed_platform(cur)
+
+    tenants = [
+        seed_tenant(
+            cur, rng, index, size, plan_id, feature_ids, password_hash,
+            attendance_days, leads_per_user
+        )
+        for index, size in enumerate(tenant_sizes, start=1)
+    ]
+
+    build_rollups(cur)
+
+    conn.commit()
+    cur.close()
+
+    return {
+        "password": BENCH_PASSWORD,
+        "platform_admin": PLATFORM_ADMIN_NAME,
+        "tenants": tenants,
+    }
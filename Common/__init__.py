@@ -0,0 +1,5 @@
+"""
+Plumbing shared by the Company and Super-Admin backends: the psycopg2
+pool, per-route metrics, the bcrypt process pool and the user_access
+refresh statement.
+"""
@@ -0,0 +1,36 @@
+# Materialised feature set per user (user_access). Rows are recomputed
+# for just the users a write affects; /company/me fills in a missing row
+# on first use, so users created elsewhere need no extra bookkeeping.
+USER_ACCESS_REFRESH_SQL = """
+    INSERT INTO user_access (user_id, feature_ids, refreshed_at)
+    SELECT
+        u.id,
+        ARRAY(
+            SELECT cf.feature_id
+            FROM company_features cf
+            WHERE cf.company_id = u.company_id
+              AND cf.enabled = TRUE
+              AND (
+                  u.is_company_admin
+                  OR EXISTS (
+                      SELECT 1
+                      FROM user_roles ur
+                      JOIN roles r ON r.id = ur.role_id
+                      JOIN roles_features rf ON rf.role_id = r.id
+                      WHERE ur.user_id = u.id
+                        AND r.company_id = u.company_id
+                        AND rf.feature_id = cf.feature_id
+                  )
+              )
+            ORDER BY cf.feature_id
+        ),
+        CURRENT_TIMESTAMP
+    FROM users u
+    WHERE {where}
+    ON CONFLICT (user_id) DO UPDATE
+    SET feature_ids = EXCLUDED.feature_ids,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+def refresh_user_access(cur, where, params):
+    cur.execute(USER_ACCESS_REFRESH_SQL.format(where=where), params)
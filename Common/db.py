@@ -0,0 +1,190 @@
+"""
+Bounded psycopg2 pool and the per-request connection dependency built on
+it. _last_used is only touched under the pool lock: putconn runs from
+many request threads at once.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import ThreadedConnectionPool
+from fastapi import HTTPException
+
+from .metrics import request_stats
+
+class PoolTimeout(Exception):
+    pass
+
+class DatabasePool:
+    """
+    Bounded psycopg2 pool shared by every request of this worker.
+
+    Checkout blocks up to `timeout` seconds for a free slot, and a
+    connection that sat idle longer than `check_after` seconds is pinged
+    before it is handed out (dead ones are replaced transparently).
+    """
+
+    def __init__(self, minconn, maxconn, timeout, check_after, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self.connect_kwargs = connect_kwargs
+
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._replaced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def open(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn, **self.connect_kwargs
+                )
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._last_used.clear()
+
+        if pool is not None:
+            pool.closeall()
+
+    def getconn(self):
+        self.open()
+        started = time.monotonic()
+
+        with self._lock:
+            self._waiting += 1
+
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self._waiting -= 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if not acquired:
+                self._timeouts += 1
+
+        if not acquired:
+            raise PoolTimeout(f"no connection available after {self.timeout}s")
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+
+        return conn
+
+    def putconn(self, conn):
+        discard = bool(conn.closed)
+
+        if not discard and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                if discard:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._pool._pool) if self._pool else 0,
+                "waiting": self._waiting,
+                "acquired_total": self._acquired,
+                "timeouts_total": self._timeouts,
+                "replaced_total": self._replaced,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6)
+            }
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+
+        with self._lock:
+            idle_since = self._last_used.get(id(conn))
+
+        stale = (
+            idle_since is not None
+            and time.monotonic() - idle_since > self.check_after
+        )
+
+        if conn.closed or (stale and not self._ping(conn)):
+            self._pool.putconn(conn, close=True)
+            with self._lock:
+                self._last_used.pop(id(conn), None)
+                self._replaced += 1
+            conn = self._pool.getconn()
+
+        return conn
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+def pool_dependency(pool):
+    """FastAPI dependency: one pooled connection per request, shared by auth and the handler."""
+
+    def get_db():
+        stats = request_stats.get()
+        started = time.perf_counter()
+
+        try:
+            conn = pool.getconn()
+        except PoolTimeout:
+            raise HTTPException(status_code=503, detail="Database busy, try again")
+        finally:
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - started
+
+        try:
+            yield conn
+        finally:
+            pool.putconn(conn)
+
+    return get_db
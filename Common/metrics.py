@@ -0,0 +1,187 @@
+"""
+Per-route request counts, latency / DB-time histograms and pool wait,
+rendered in Prometheus text format. Counters are per worker process;
+scrape each worker when running several.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+import time
+
+import psycopg2
+from fastapi.responses import PlainTextResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    """DB work charged to the request currently being served."""
+    __slots__ = ("scope", "queries", "db_seconds", "pool_wait")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+
+    def record(self, query, params, elapsed):
+        self.queries += 1
+        self.db_seconds += elapsed
+
+request_stats = ContextVar("request_stats", default=None)
+
+def record_query(query, params, started):
+    elapsed = time.perf_counter() - started
+    stats = request_stats.get()
+    if stats is not None:
+        stats.record(query, params, elapsed)
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, vars, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, None, started)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class RouteMetrics:
+    """All series of one (method, route) pair; the label text is built once."""
+    __slots__ = ("labels", "statuses", "latency", "db_time", "queries", "pool_wait")
+
+    def __init__(self, method, route):
+        self.labels = f'method="{method}",route="{route}"'
+        self.statuses = [0] * 6
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.queries = 0
+        self.pool_wait = 0.0
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware overhead). Requests are
+    labelled by route template, so /projects/1 and /projects/2 share one
+    series; anything that did not match an API route is "<other>".
+
+    Each app passes its own `route_metrics` dict and RequestStats class,
+    so two apps loaded in one process (Benchmarks/bench.py) stay apart.
+    `count_header` adds an X-Query-Count header to every response.
+    """
+
+    def __init__(self, app, route_metrics, stats_class=RequestStats, count_header=False):
+        self.app = app
+        self.route_metrics = route_metrics
+        self.stats_class = stats_class
+        self.count_header = count_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = self.stats_class(scope)
+        token = request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.count_header:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-query-count", str(stats.queries).encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "<other>")
+
+            metrics = self.route_metrics.get(key)
+            if metrics is None:
+                metrics = self.route_metrics[key] = RouteMetrics(*key)
+
+            metrics.statuses[min(status // 100, 5)] += 1
+            metrics.latency.observe(elapsed)
+            metrics.db_time.observe(stats.db_seconds)
+            metrics.queries += stats.queries
+            metrics.pool_wait += stats.pool_wait
+
+def render_histogram(lines, name, help_text, routes, attr):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+
+    for metrics in routes:
+        hist = getattr(metrics, attr)
+        cumulative = 0
+        for bound, count in zip(hist.bounds, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{metrics.labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{metrics.labels},le="+Inf"}} {hist.count}')
+        lines.append(f"{name}_sum{{{metrics.labels}}} {hist.sum:.6f}")
+        lines.append(f"{name}_count{{{metrics.labels}}} {hist.count}")
+
+def render_stats(lines, prefix, stats):
+    for key, value in stats.items():
+        kind = "counter" if key.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {prefix}_{key} {kind}")
+        lines.append(f"{prefix}_{key} {value}")
+
+def render_route_metrics(route_metrics):
+    """The per-route series; callers append their own render_stats."""
+    routes = list(route_metrics.values())
+
+    lines = [
+        "# HELP http_requests_total Requests by route and status class.",
+        "# TYPE http_requests_total counter"
+    ]
+    for m in routes:
+        for code, count in enumerate(m.statuses):
+            if count:
+                lines.append(f'http_requests_total{{{m.labels},status="{code}xx"}} {count}')
+
+    render_histogram(lines, "http_request_duration_seconds",
+                     "Wall time per request.", routes, "latency")
+    render_histogram(lines, "http_request_db_seconds",
+                     "Time spent executing SQL per request.", routes, "db_time")
+
+    lines.append("# TYPE http_request_db_queries_total counter")
+    for m in routes:
+        lines.append(f"http_request_db_queries_total{{{m.labels}}} {m.queries}")
+
+    lines.append("# TYPE http_request_pool_wait_seconds_total counter")
+    for m in routes:
+        lines.append(f"http_request_pool_wait_seconds_total{{{m.labels}}} {m.pool_wait:.6f}")
+
+    return lines
+
+def metrics_response(lines):
+    return PlainTextResponse(
+        "\n".join(lines) + "\n",
+        media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,113 @@
+"""bcrypt on a bounded process pool, awaited by the password routes."""
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import threading
+import time
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _hash_in_worker(plain):
+    return pwd_context.hash(plain)
+
+def _verify_in_worker(plain, hashed):
+    return pwd_context.verify(plain, hashed)
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool.
+
+    At most `queue_limit` hash/verify calls may be pending or running at
+    once; past that the request is refused with a 503 so a login burst
+    saturates the hashing workers instead of the API workers. Callers
+    await the result, so no API thread is parked while bcrypt runs.
+
+    Workers come from a forkserver rather than fork(): forking a worker
+    that already runs listener threads and holds DB sockets would copy
+    them, locks included, into the child. They only import this module.
+    """
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+
+        self._depth = 0
+        self._depth_max = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._seconds_total = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver")
+                )
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def hash(self, plain):
+        return await self._run(_hash_in_worker, plain)
+
+    async def verify(self, plain, hashed):
+        return await self._run(_verify_in_worker, plain, hashed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "queue_depth": self._depth,
+                "queue_depth_max": self._depth_max,
+                "completed_total": self._completed,
+                "failed_total": self._failed,
+                "rejected_total": self._rejected,
+                "seconds_total": round(self._seconds_total, 6)
+            }
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many password operations in flight, try again"
+            )
+
+        with self._lock:
+            self._depth += 1
+            self._depth_max = max(self._depth_max, self._depth)
+
+        started = time.monotonic()
+        failed = True
+
+        try:
+            self.start()
+            result = await asyncio.wrap_future(self._executor.submit(fn, *args))
+            failed = False
+            return result
+
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._depth -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                self._seconds_total += elapsed
+            self._slots.release()
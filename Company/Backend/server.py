@@ -5,12 +5,45 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta, date
 from jose import jwt
-from passlib.context import CryptContext
 import psycopg2
+from psycopg2.errors import ExclusionViolation
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+import base64
+import csv
+import io
+import json
+import logging
+import queue
+import re
+import select
+import sys
+import threading
+import time
 import os
+import numpy as np
 from dotenv import load_dotenv
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+# Common/ (pool, metrics, password hashing) is shared with Super-Admin
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from Common import metrics as common_metrics
+from Common.access import refresh_user_access
+from Common.db import DatabasePool, pool_dependency
+from Common.metrics import (
+    InstrumentedCursor,
+    MetricsMiddleware,
+    record_query,
+    render_route_metrics,
+    render_stats,
+    metrics_response,
+    request_stats
+)
+from Common.passwords import PasswordHasher
 
 
 # =====================================
@@ -24,12 +57,56 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))
+
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CHANNEL = "session_invalidation"
+
+TYPEAHEAD_MAX_ENTRIES = int(os.getenv("TYPEAHEAD_MAX_ENTRIES", "500000"))
+TYPEAHEAD_TTL = float(os.getenv("TYPEAHEAD_TTL", "600"))
+
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "5000"))
+
+ETAGS_ENABLED = os.getenv("ETAGS_ENABLED", "true").lower() == "true"
+ETAG_CACHE_TTL = float(os.getenv("ETAG_CACHE_TTL", "60"))
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "10000"))
+
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+DB_ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", "20"))
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXP_MINUTES = int(os.getenv("JWT_EXP_MINUTES", "30"))
 
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")
 
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+PAGE_MAX = int(os.getenv("PAGE_MAX", "200"))
+
+ATTENDANCE_BATCH_MAX = int(os.getenv("ATTENDANCE_BATCH_MAX", "5000"))
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", "366"))
+EXPORT_FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "2000"))
+
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "366"))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "64"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "off").lower()
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000"))
+SLOW_QUERY_EXPLAIN_LOCK_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_LOCK_TIMEOUT_MS", "500"))
+
 # =====================================
 # APP SETUP
 # =====================================
@@ -43,24 +120,1386 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# =====================================
+# METRICS
+# =====================================
+# Per-route request counts, latency / DB-time histograms and pool wait,
+# exposed in Prometheus text format on /metrics (see Common/metrics.py).
+# This backend's RequestStats also feeds the slow-query log and the
+# query budgets.
+class RequestStats(common_metrics.RequestStats):
+    """DB work charged to the request currently being served."""
+    __slots__ = ("company_id", "shapes", "slow_entries")
+
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.company_id = None
+        self.shapes = {}
+        self.slow_entries = []
+
+    def attribute(self, company_id):
+        """Set the tenant, including on slow entries logged before auth."""
+        self.company_id = company_id
+        for entry in self.slow_entries:
+            entry["company_id"] = company_id
+
+    def record(self, query, params, elapsed):
+        super().record(query, params, elapsed)
+
+        if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_query_log.record(self, query, params, elapsed)
+
+        if QUERY_DEBUG != "off":
+            check_query(self, query)
+
+route_metrics = {}
+
+app.add_middleware(
+    MetricsMiddleware,
+    route_metrics=route_metrics,
+    stats_class=RequestStats,
+    count_header=QUERY_DEBUG != "off"
+)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    lines = render_route_metrics(route_metrics)
+
+    render_stats(lines, "db_pool", db_pool.stats())
+    if DB_ASYNC:
+        render_stats(lines, "db_async_pool", async_db_pool.get_stats())
+    render_stats(lines, "password_hasher", password_hasher.stats())
+    render_stats(lines, "session_cache", {
+        "entries": len(session_cache._entries),
+        "hits_total": session_cache.hits,
+        "misses_total": session_cache.misses
+    })
+    render_stats(lines, "typeahead", typeahead_index.stats())
+    render_stats(lines, "working_calendar", working_calendar.stats())
+    render_stats(lines, "etag_versions", etag_versions.stats())
+    render_stats(lines, "attendance_analytics", analytics_cache.stats())
+
+    return metrics_response(lines)
+
+# =====================================
+# QUERY BUDGETS (QUERY_DEBUG=warn|strict)
+# =====================================
+# Dev/test guard rail. Statements are grouped per request by their SQL
+# text (parameters travel separately, so that is the statement shape).
+# A shape repeated N_PLUS_ONE_THRESHOLD times, or a route going over its
+# @query_budget, is logged in "warn" mode and raises QueryBudgetExceeded
+# in "strict" mode, which fails the request and any TestClient test.
+# Responses carry an X-Query-Count header while either mode is on.
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def query_budget(limit):
+    """Max statements a route may run per request, auth lookup included."""
+    def mark(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return mark
+
+def statement_shape(query):
+    if isinstance(query, bytes):
+        query = query.decode()
+    return " ".join(str(query).split())
+
+def check_query(stats, query):
+    shape = statement_shape(query)
+    seen = stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+
+    route = stats.scope.get("route")
+    name = f'{stats.scope["method"]} {route.path if route is not None else stats.scope["path"]}'
+    budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+
+    problem = None
+
+    if budget is not None and stats.queries == budget + 1:
+        problem = f"{name} exceeded its query budget of {budget}: {shape[:200]}"
+    elif seen == N_PLUS_ONE_THRESHOLD:
+        problem = f"possible N+1 in {name}: same statement ran {seen} times: {shape[:200]}"
+
+    if problem is None:
+        return
+
+    if QUERY_DEBUG == "strict":
+        raise QueryBudgetExceeded(problem)
+
+    logger.warning(problem)
+
 # =====================================
 # DATABASE
 # =====================================
-def get_db():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+db_pool = DatabasePool(
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_POOL_TIMEOUT,
+    DB_POOL_CHECK_AFTER,
+    host=DB_HOST,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    cursor_factory=InstrumentedCursor
+)
+
+@app.on_event("startup")
+def open_db_pool():
+    db_pool.open()
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db_pool.close()
+
+# One pooled connection per request, shared by auth and the handler
+get_db = pool_dependency(db_pool)
+
+# =====================================
+# SESSION CACHE
+# =====================================
+class SessionCache:
+    """
+    TTL + LRU cache of validated sessions.
+
+    Entries are keyed by session id and remember the (user_id, company_id)
+    they were validated for, so a token carrying a different pair is
+    treated as a miss. A user index lets update_user drop every session
+    of that user at once.
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id, user_id, company_id):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(session_id)
+
+            if (
+                entry is None
+                or entry[0] != user_id
+                or entry[1] != company_id
+            ):
+                self.misses += 1
+                return None
+
+            if entry[3] <= now:
+                self._drop(session_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, session_id, user_id, company_id, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+
+        if ttl <= 0:
+            return
+
+        expires = time.monotonic() + ttl
+
+        with self._lock:
+            self._drop(session_id)
+            self._entries[session_id] = (user_id, company_id, value, expires)
+            self._by_user.setdefault(user_id, set()).add(session_id)
+
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def discard(self, session_id=None, user_id=None):
+        with self._lock:
+            if session_id is not None:
+                self._drop(session_id)
+
+            if user_id is not None:
+                for sid in list(self._by_user.get(user_id, ())):
+                    self._drop(sid)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+
+        sessions = self._by_user.get(entry[0])
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._by_user[entry[0]]
+
+session_cache = SessionCache(SESSION_CACHE_TTL, SESSION_CACHE_SIZE)
+
+# Tags the notifications this process sends so it can skip its own. PIDs
+# repeat across hosts and containers (often pid 1 everywhere), so a
+# random id is drawn per process instead.
+WORKER_ID = os.urandom(8).hex()
+
+def notify_session_change(cur, session_id=None, user_id=None):
+    """
+    Queue a cross-worker invalidation on the current transaction.
+
+    Postgres only delivers the NOTIFY once the transaction commits, so
+    other workers never drop entries for a change that was rolled back.
+    The caller still discards its own entries right after commit.
+    """
+    if session_id is not None:
+        cur.execute(
+            "SELECT pg_notify(%s, %s)",
+            (SESSION_CHANNEL, f"session:{session_id}")
+        )
+
+    if user_id is not None:
+        cur.execute(
+            "SELECT pg_notify(%s, %s)",
+            (SESSION_CHANNEL, f"user:{user_id}")
+        )
+
+def apply_session_notification(payload):
+    kind, _, ident = payload.partition(":")
+
+    if kind == "version":
+        # version:<scope>:<ident>, from every worker including this one
+        scope, _, ident = ident.partition(":")
+        if ident.isdigit():
+            etag_versions.discard((scope, int(ident)))
+        return
+
+    ident, _, origin = ident.partition(":")
+
+    try:
+        ident = int(ident)
+    except ValueError:
+        return
+
+    if kind == "session":
+        session_cache.discard(session_id=ident)
+    elif kind == "user":
+        session_cache.discard(user_id=ident)
+    elif kind == "typeahead" and origin != WORKER_ID:
+        # The sending worker already updated its own index in place
+        typeahead_index.discard(ident)
+    elif kind == "calendar" and origin != WORKER_ID:
+        working_calendar.discard(ident)
+
+class SessionInvalidationListener(threading.Thread):
+    """
+    Background LISTEN loop on a dedicated connection (outside the pool).
+
+    If the connection drops, notifications may have been missed, so the
+    whole cache is cleared before listening again. Staleness is bounded
+    by the cache TTL even while the listener is reconnecting.
+    """
+
+    def __init__(self):
+        super().__init__(name="session-invalidation", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**db_pool.connect_kwargs)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {SESSION_CHANNEL}")
+                cur.close()
+                session_cache.clear()
+                typeahead_index.clear()
+                working_calendar.clear()
+                etag_versions.clear()
+
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        apply_session_notification(notify.payload)
+
+            except psycopg2.Error:
+                session_cache.clear()
+                typeahead_index.clear()
+                working_calendar.clear()
+                etag_versions.clear()
+                self._stop_event.wait(1.0)
+
+            finally:
+                if conn is not None:
+                    conn.close()
+
+session_listener = SessionInvalidationListener()
+
+@app.on_event("startup")
+def start_session_listener():
+    if SESSION_CACHE_TTL > 0 or TYPEAHEAD_MAX_ENTRIES > 0 or ETAGS_ENABLED:
+        session_listener.start()
+
+@app.on_event("shutdown")
+def stop_session_listener():
+    session_listener.stop()
+
+# =====================================
+# TYPEAHEAD INDEX
+# =====================================
+TYPEAHEAD_KINDS = ("user", "lead")
+
+def typeahead_keys(kind, record):
+    """Every word of the name, the whole name and (users) the emp_id."""
+    words = (record["name"] if kind == "user" else record["client_name"]).lower().split()
+    keys = set(words)
+    keys.add(" ".join(words))
+    if kind == "user":
+        keys.add(record["emp_id"].lower())
+    return keys
+
+class TenantTypeahead:
+    """Sorted (key, id) arrays per kind and the records they point at."""
+    __slots__ = ("keys", "records", "built_at")
+
+    def __init__(self, rows_by_kind):
+        self.keys = {}
+        self.records = {}
+        self.built_at = time.monotonic()
+
+        for kind, records in rows_by_kind.items():
+            self.records[kind] = {r["id"]: r for r in records}
+            self.keys[kind] = sorted(
+                (key, r["id"]) for r in records for key in typeahead_keys(kind, r)
+            )
+
+    def size(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+    def put(self, kind, record):
+        self.remove(kind, record["id"])
+        self.records[kind][record["id"]] = record
+        for key in typeahead_keys(kind, record):
+            insort(self.keys[kind], (key, record["id"]))
+
+    def remove(self, kind, record_id):
+        record = self.records[kind].pop(record_id, None)
+        if record is None:
+            return
+
+        keys = self.keys[kind]
+        for key in typeahead_keys(kind, record):
+            i = bisect_left(keys, (key, record_id))
+            if i < len(keys) and keys[i] == (key, record_id):
+                del keys[i]
+
+    def search(self, kind, words, limit):
+        """Prefix-match the first word, then require every other word too."""
+        keys = self.keys[kind]
+        records = self.records[kind]
+        first, rest = words[0], words[1:]
+
+        found = []
+        seen = set()
+        i = bisect_left(keys, (first,))
+
+        while i < len(keys) and keys[i][0].startswith(first) and len(found) < limit:
+            record_id = keys[i][1]
+            i += 1
+
+            if record_id in seen:
+                continue
+            seen.add(record_id)
+
+            record = records[record_id]
+            if rest:
+                tokens = typeahead_keys(kind, record)
+                if not all(any(t.startswith(w) for t in tokens) for w in rest):
+                    continue
+
+            found.append(record)
+
+        return found
+
+class TypeaheadIndex:
+    """
+    Per-company prefix index over users and leads, built on first use.
+
+    Tenants are kept in LRU order and evicted whole once the total number
+    of keys passes max_entries. A tenant older than ttl is rebuilt, which
+    bounds drift from writes made outside this API; writes made through
+    it update the index in place and tell other workers to drop theirs.
+
+    A build reads the tenant while writes may be committing. Writes this
+    worker puts meanwhile are queued in _pending and replayed onto the
+    new index; a discard or clear meanwhile means the build may have
+    missed another worker's write, so its result is used once and not kept.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tenants = OrderedDict()
+        self._build_locks = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def search(self, conn, company_id, kind, q, limit):
+        words = q.lower().split()
+        if not words:
+            return []
+
+        tenant = self._tenant(conn, company_id)
+
+        with self._lock:
+            return tenant.search(kind, words, limit)
+
+    def put(self, company_id, kind, record):
+        with self._lock:
+            pending = self._pending.get(company_id)
+            if pending is not None:
+                pending.append((kind, record))
+
+            tenant = self._tenants.get(company_id)
+            if tenant is not None:
+                tenant.put(kind, record)
+                self._evict()
+
+    def discard(self, company_id):
+        with self._lock:
+            self._tenants.pop(company_id, None)
+            if company_id in self._pending:
+                self._pending[company_id] = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tenants": len(self._tenants),
+                "entries": sum(t.size() for t in self._tenants.values())
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+            for company_id in self._pending:
+                self._pending[company_id] = None
+
+    def _fresh(self, company_id):
+        tenant = self._tenants.get(company_id)
+        if tenant is not None and time.monotonic() - tenant.built_at < self.ttl:
+            self._tenants.move_to_end(company_id)
+            return tenant
+        return None
+
+    def _tenant(self, conn, company_id):
+        with self._lock:
+            tenant = self._fresh(company_id)
+            if tenant is not None:
+                return tenant
+            build_lock = self._build_locks.setdefault(company_id, threading.Lock())
+
+        # One build per tenant at a time; late arrivals reuse its result
+        with build_lock:
+            with self._lock:
+                tenant = self._fresh(company_id)
+            if tenant is not None:
+                return tenant
+
+            with self._lock:
+                self._pending[company_id] = []
+
+            try:
+                tenant = self._build(conn, company_id)
+            finally:
+                with self._lock:
+                    pending = self._pending.pop(company_id)
+
+            with self._lock:
+                if pending is not None:
+                    for kind, record in pending:
+                        tenant.put(kind, record)
+                    self._tenants[company_id] = tenant
+                self._build_locks.pop(company_id, None)
+                self._evict()
+
+        return tenant
+
+    def _evict(self):
+        total = sum(t.size() for t in self._tenants.values())
+        while total > self.max_entries and len(self._tenants) > 1:
+            _, tenant = self._tenants.popitem(last=False)
+            total -= tenant.size()
+
+    @staticmethod
+    def _build(conn, company_id):
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT id, emp_id, name, status
+            FROM users
+            WHERE company_id = %s
+        """, (company_id,))
+        users = [
+            {"id": r[0], "emp_id": r[1], "name": r[2], "status": r[3]}
+            for r in cur.fetchall()
+        ]
+
+        cur.execute("""
+            SELECT id, client_name, status
+            FROM leads
+            WHERE company_id = %s
+        """, (company_id,))
+        leads = [
+            {"id": r[0], "client_name": r[1], "status": r[2]}
+            for r in cur.fetchall()
+        ]
+
+        cur.close()
+        return TenantTypeahead({"user": users, "lead": leads})
+
+typeahead_index = TypeaheadIndex(TYPEAHEAD_MAX_ENTRIES, TYPEAHEAD_TTL)
+
+def notify_typeahead_change(cur, company_id):
+    """Other workers drop the tenant's index once this transaction commits."""
+    cur.execute(
+        "SELECT pg_notify(%s, %s)",
+        (SESSION_CHANNEL, f"typeahead:{company_id}:{WORKER_ID}")
+    )
+
+# =====================================
+# ETAGS
+# =====================================
+# Version counters behind the ETags of read-mostly endpoints, kept in
+# resource_versions so every worker (and every restart) builds the same
+# tag. Keys are (scope, id) pairs such as ("company", 3) or ("user", 17);
+# writers bump them inside their own transaction, so a tag changes exactly
+# when the change commits. A key never written is at version 0.
+#
+# Each worker keeps the versions it has read in etag_versions, so
+# a conditional GET normally runs no query. Every bump NOTIFYs
+# version:<scope>:<ident> on SESSION_CHANNEL (delivered on commit, like
+# the session invalidations), which drops the key on every worker; the
+# writing worker also drops it right after its commit. Super-Admin's
+# notify_company_change sends the same notifications.
+BUMP_RESOURCE_VERSIONS_SQL = """
+    WITH bumped AS (
+        INSERT INTO resource_versions AS v (scope, ident)
+        SELECT *
+        FROM unnest(%s::text[], %s::int[])
+        ORDER BY 1, 2
+        ON CONFLICT (scope, ident)
+        DO UPDATE SET version = v.version + 1
+        RETURNING v.scope, v.ident
+    )
+    SELECT pg_notify(%s, 'version:' || scope || ':' || ident)
+    FROM bumped
+"""
+
+RESOURCE_VERSIONS_SQL = """
+    SELECT v.scope, v.ident, v.version
+    FROM resource_versions v
+    JOIN unnest(%s::text[], %s::int[]) AS k(scope, ident)
+      ON k.scope = v.scope AND k.ident = v.ident
+"""
+
+class ResourceVersionCache:
+    """
+    resource_versions rows this worker has read, in LRU order.
+
+    A read that raced with an invalidation must not store what it read:
+    lookup() returns the current generation, every discard bumps it, and
+    store() drops its rows when the generation moved in between. Entries
+    also expire after ttl, which bounds staleness while the listener is
+    reconnecting.
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, keys):
+        """(cached versions, keys to read from the DB, generation)."""
+        now = time.monotonic()
+        found, missing = {}, []
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self._generation
+
+    def store(self, versions, generation):
+        if self.ttl <= 0:
+            return
+
+        expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            for key, version in versions.items():
+                self._entries[key] = (version, expires)
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits_total": self.hits,
+                "misses_total": self.misses
+            }
+
+etag_versions = ResourceVersionCache(ETAG_CACHE_TTL, ETAG_CACHE_SIZE)
+
+def bump_resource_versions(cur, *keys):
+    """
+    Expire the ETags of `keys` when the current transaction commits. The
+    caller drops them from etag_versions right after its commit, as
+    with session_cache.
+    """
+    keys = sorted(set(keys))
+    cur.execute(BUMP_RESOURCE_VERSIONS_SQL, (
+        [scope for scope, _ in keys],
+        [ident for _, ident in keys],
+        SESSION_CHANNEL
+    ))
+
+def etag_check(request: Request, response: Response, conn, *keys):
+    """
+    Tag `response` with the current ETag of `keys`. Returns the 304 to
+    send instead when If-None-Match already names that tag, else None.
+    """
+    if not ETAGS_ENABLED:
+        return None
+
+    versions, missing, generation = etag_versions.lookup(keys)
+
+    if missing:
+        cur = conn.cursor()
+        cur.execute(RESOURCE_VERSIONS_SQL, (
+            [scope for scope, _ in missing],
+            [ident for _, ident in missing]
+        ))
+        read = {(r[0], r[1]): r[2] for r in cur.fetchall()}
+        cur.close()
+
+        read = {key: read.get(key, 0) for key in missing}
+        etag_versions.store(read, generation)
+        versions.update(read)
+
+    etag = '"{}"'.format("-".join(
+        f"{scope}{ident}.{versions[(scope, ident)]}"
+        for scope, ident in keys
+    ))
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization"
+    }
+
+    candidates = {
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("if-none-match", "").split(",")
+    }
+    if etag in candidates:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+# =====================================
+# WORKING CALENDAR
+# =====================================
+# Weekly offs are ISO weekdays (1 = Monday ... 7 = Sunday); companies
+# without a company_calendars row get DEFAULT_WEEKLY_OFFS.
+DEFAULT_WEEKLY_OFFS = (6, 7)
+
+WORKING_CALENDAR_SQL = """
+    SELECT
+        (SELECT weekly_offs FROM company_calendars WHERE company_id = %s),
+        ARRAY(
+            SELECT date
+            FROM company_holidays
+            WHERE company_id = %s
+              AND date >= %s
+              AND date < %s
+        )
+"""
+
+def year_bitmap(year, weekly_offs, holidays):
+    """Bit n set <=> day n (0 = Jan 1) of `year` is a working day."""
+    first = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first).days
+    # An empty array is a seven-day week; only a missing row means default
+    offs = set(DEFAULT_WEEKLY_OFFS if weekly_offs is None else weekly_offs)
+
+    bitmap = 0
+    for n in range(days):
+        if (first.isoweekday() + n - 1) % 7 + 1 not in offs:
+            bitmap |= 1 << n
+
+    for holiday in holidays:
+        bitmap &= ~(1 << (holiday - first).days)
+
+    return bitmap
+
+class WorkingCalendar:
+    """
+    Per-company working days, one bitmap per (company, year), built from
+    a single query on first use and kept in LRU order. Range counts and
+    day lists are then bit operations with no further DB access. Calendar
+    edits drop the company here and, through SESSION_CHANNEL, on every
+    other worker.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._years = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            bitmap = self._years.get(key)
+            if bitmap is not None:
+                self._years.move_to_end(key)
+            return bitmap
+
+    def _store(self, key, bitmap):
+        with self._lock:
+            self._years[key] = bitmap
+            while len(self._years) > self.size:
+                self._years.popitem(last=False)
+        return bitmap
+
+    def year(self, cur, company_id, year):
+        bitmap = self._cached((company_id, year))
+        if bitmap is not None:
+            return bitmap
+
+        cur.execute(WORKING_CALENDAR_SQL, (
+            company_id, company_id, date(year, 1, 1), date(year + 1, 1, 1)
+        ))
+        return self._store((company_id, year), year_bitmap(year, *cur.fetchone()))
+
+    async def year_async(self, cur, company_id, year):
+        bitmap = self._cached((company_id, year))
+        if bitmap is not None:
+            return bitmap
+
+        await cur.execute(WORKING_CALENDAR_SQL, (
+            company_id, company_id, date(year, 1, 1), date(year + 1, 1, 1)
+        ))
+        return self._store((company_id, year), year_bitmap(year, *(await cur.fetchone())))
+
+    def working_days(self, cur, company_id, start, end):
+        """Working dates in start..end (inclusive), in order."""
+        days = []
+        for year in range(start.year, end.year + 1):
+            bitmap = self.year(cur, company_id, year)
+            first = date(year, 1, 1)
+            lo = (max(start, first) - first).days
+            hi = (min(end, date(year, 12, 31)) - first).days
+
+            days.extend(
+                first + timedelta(days=n)
+                for n in range(lo, hi + 1)
+                if bitmap >> n & 1
+            )
+        return days
+
+    def count(self, cur, company_id, start, end):
+        total = 0
+        for year in range(start.year, end.year + 1):
+            bitmap = self.year(cur, company_id, year)
+            first = date(year, 1, 1)
+            lo = (max(start, first) - first).days
+            hi = (min(end, date(year, 12, 31)) - first).days
+            total += bin(bitmap >> lo & ((1 << (hi - lo + 1)) - 1)).count("1")
+        return total
+
+    def discard(self, company_id):
+        with self._lock:
+            for key in [k for k in self._years if k[0] == company_id]:
+                del self._years[key]
+
+    def clear(self):
+        with self._lock:
+            self._years.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"years": len(self._years)}
+
+working_calendar = WorkingCalendar(CALENDAR_CACHE_SIZE)
+
+def is_working_day(bitmap, day):
+    return bool(bitmap >> (day - date(day.year, 1, 1)).days & 1)
+
+def notify_calendar_change(cur, company_id):
+    """Other workers drop the company's bitmaps once this transaction commits."""
+    cur.execute(
+        "SELECT pg_notify(%s, %s)",
+        (SESSION_CHANNEL, f"calendar:{company_id}:{WORKER_ID}")
+    )
+
+# =====================================
+# ATTENDANCE ANALYTICS
+# =====================================
+# A tenant's attendance for a date range is loaded once into a user x day
+# int8 matrix (0 unmarked, 1 Present, 2 Absent, 3 Leave); every figure is
+# then a whole-array reduction. Results are cached per (company, range)
+# for ANALYTICS_CACHE_TTL, so they may trail fresh markings by that much.
+ANALYTICS_ANOMALY_Z = 2.0
+ANALYTICS_MIN_ABSENCES = 3
+ANALYTICS_STREAK_DAYS = 5
+ANALYTICS_MON_FRI_SHARE = 0.6
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+ANALYTICS_ATTENDANCE_SQL = """
+    SELECT
+        user_id,
+        date - %s,
+        CASE status WHEN 'Present' THEN 1 WHEN 'Absent' THEN 2 ELSE 3 END
+    FROM attendance
+    WHERE company_id = %s
+      AND date >= %s
+      AND date < %s
+"""
+
+def load_attendance_matrix(conn, company_id, start, days):
+    """Return (users, teams, matrix); rows of matrix follow users (by id)."""
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT id, emp_id, name
+        FROM users
+        WHERE company_id = %s
+        ORDER BY id
+    """, (company_id,))
+    users = cur.fetchall()
+
+    cur.execute("""
+        SELECT t.id, t.name, tm.user_id
+        FROM teams t
+        JOIN team_members tm ON tm.team_id = t.id
+        WHERE t.company_id = %s
+        ORDER BY t.id
+    """, (company_id,))
+    teams = cur.fetchall()
+
+    # COPY keeps the (user, day, code) triples out of Python objects;
+    # loadtxt parses them straight into an array
+    buf = io.StringIO()
+    query = cur.mogrify(
+        ANALYTICS_ATTENDANCE_SQL,
+        (start, company_id, start, start + timedelta(days=days))
+    ).decode()
+    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buf)
+    cur.close()
+
+    ids = np.array([u[0] for u in users], dtype=np.int64)
+    matrix = np.zeros((len(users), days), dtype=np.int8)
+
+    if buf.tell() and len(ids):
+        buf.seek(0)
+        cells = np.loadtxt(buf, delimiter=",", dtype=np.int64, ndmin=2)
+        rows = np.minimum(np.searchsorted(ids, cells[:, 0]), len(ids) - 1)
+        known = ids[rows] == cells[:, 0]
+        matrix[rows[known], cells[known, 1]] = cells[known, 2]
+
+    return users, teams, matrix
+
+def rates(numerator, denominator):
+    """Elementwise numerator / denominator, NaN where nothing was marked."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=np.asarray(denominator) > 0)
+    return out
+
+def rate_values(values):
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+def longest_runs(mask):
+    """Longest run of True in each row."""
+    n, days = mask.shape
+    padded = np.zeros((n, days + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+
+    # The zero columns on both sides keep runs from crossing rows
+    edges = np.diff(padded.ravel())
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, starts // (days + 2), ends - starts)
+    return longest
+
+def trailing_runs(mask):
+    """Length of the run of True that ends on the last day, per row."""
+    reverse = mask[:, ::-1]
+    return np.where(reverse.all(axis=1), mask.shape[1], reverse.argmin(axis=1))
+
+def attendance_analytics(users, teams, matrix, start):
+    days = matrix.shape[1]
+    present = matrix == 1
+    absent = matrix == 2
+
+    present_count = present.sum(axis=1)
+    absent_count = absent.sum(axis=1)
+    leave_count = (matrix == 3).sum(axis=1)
+    marked_count = present_count + absent_count + leave_count
+
+    user_rates = rates(present_count, marked_count)
+    absence_rates = rates(absent_count, marked_count)
+    present_streaks = trailing_runs(present)
+    absence_streaks = longest_runs(absent)
+
+    # ---- per team: memberships as (team slot, user row) pairs ----
+    team_ids = sorted({t[0] for t in teams})
+    team_names = {t[0]: t[1] for t in teams}
+    user_ids = np.array([u[0] for u in users], dtype=np.int64)
+
+    member_team = np.searchsorted(team_ids, [t[0] for t in teams]).astype(np.int64)
+    member_ids = np.array([t[2] for t in teams], dtype=np.int64)
+
+    # A member missing from `users` (e.g. added between the two queries)
+    # would otherwise be charged to whichever user sorts next
+    member_row = np.minimum(np.searchsorted(user_ids, member_ids), max(len(user_ids) - 1, 0))
+    known = user_ids[member_row] == member_ids if len(user_ids) else np.zeros(len(member_ids), bool)
+    member_team, member_row = member_team[known], member_row[known]
+
+    team_members = np.bincount(member_team, minlength=len(team_ids))
+    team_rates = rates(
+        np.bincount(member_team, weights=present_count[member_row], minlength=len(team_ids)),
+        np.bincount(member_team, weights=marked_count[member_row], minlength=len(team_ids))
+    )
+
+    # ---- weekday heatmap ----
+    weekdays = (start.weekday() + np.arange(days)) % 7
+    day_present = present.sum(axis=0)
+    day_marked = (matrix > 0).sum(axis=0)
+
+    weekday_rates = rates(
+        np.bincount(weekdays, weights=day_present, minlength=7),
+        np.bincount(weekdays, weights=day_marked, minlength=7)
+    )
+
+    lead = start.weekday()
+    grid = np.full(-(-(lead + days) // 7) * 7, np.nan)
+    grid[lead:lead + days] = rates(day_present, day_marked)
+    grid = grid.reshape(-1, 7)
+    first_monday = start - timedelta(days=lead)
+
+    # ---- absence-pattern anomalies ----
+    valid = ~np.isnan(absence_rates)
+    z_scores = np.zeros(len(users))
+    if valid.any():
+        spread = absence_rates[valid].std()
+        if spread > 0:
+            z_scores[valid] = (absence_rates[valid] - absence_rates[valid].mean()) / spread
+
+    mon_fri = absent[:, (weekdays == 0) | (weekdays == 4)].sum(axis=1)
+    mon_fri_share = rates(mon_fri, absent_count)
+    enough = absent_count >= ANALYTICS_MIN_ABSENCES
+
+    flags = {
+        "absence_rate": enough & (z_scores >= ANALYTICS_ANOMALY_Z),
+        "monday_friday": enough & (np.nan_to_num(mon_fri_share) >= ANALYTICS_MON_FRI_SHARE),
+        "absence_streak": absence_streaks >= ANALYTICS_STREAK_DAYS,
+    }
+    flagged = np.flatnonzero(np.logical_or.reduce(list(flags.values())))
+
+    return {
+        "from": start.isoformat(),
+        "to": (start + timedelta(days=days - 1)).isoformat(),
+        "days": days,
+        "company": {
+            "attendance_rate": rate_values(rates([present_count.sum()], [marked_count.sum()]))[0],
+            "weekday_rates": dict(zip(WEEKDAY_NAMES, rate_values(weekday_rates))),
+            "heatmap": {
+                "weeks": [
+                    (first_monday + timedelta(weeks=w)).isoformat()
+                    for w in range(grid.shape[0])
+                ],
+                "rates": [rate_values(week) for week in grid]
+            }
+        },
+        "users": [
+            {
+                "user_id": user[0],
+                "emp_id": user[1],
+                "name": user[2],
+                "present": int(p),
+                "absent": int(a),
+                "leave": int(l),
+                "attendance_rate": r,
+                "current_present_streak": int(ps),
+                "longest_absence_streak": int(ab)
+            }
+            for user, p, a, l, r, ps, ab in zip(
+                users, present_count, absent_count, leave_count,
+                rate_values(user_rates), present_streaks, absence_streaks
+            )
+        ],
+        "teams": [
+            {
+                "team_id": team_id,
+                "name": team_names[team_id],
+                "members": int(members),
+                "attendance_rate": r
+            }
+            for team_id, members, r in zip(team_ids, team_members, rate_values(team_rates))
+        ],
+        "anomalies": [
+            {
+                "user_id": users[i][0],
+                "emp_id": users[i][1],
+                "name": users[i][2],
+                "reasons": [reason for reason, mask in flags.items() if mask[i]],
+                "absence_rate": rate_values(absence_rates[i:i + 1])[0],
+                "z_score": round(float(z_scores[i]), 2)
+            }
+            for i in flagged
+        ]
+    }
+
+class AnalyticsCache:
+    """LRU of computed analytics keyed by (company_id, start, days)."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits_total": self.hits,
+                "misses_total": self.misses
+            }
+
+analytics_cache = AnalyticsCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL)
+
+# =====================================
+# SLOW QUERY LOG
+# =====================================
+# Writes, data-modifying CTEs included, and row-locking clauses
+# (FOR [NO KEY] UPDATE already match UPDATE)
+WRITE_STATEMENT = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(KEY\s+)?SHARE\b",
+    re.IGNORECASE
+)
+FUNCTION_CALL = re.compile(r"\b([a-z_][a-z0-9_]*)\s*\(", re.IGNORECASE)
+PLACEHOLDER = re.compile(r"%%|%s|%\((\w+)\)s")
+
+def redact_params(params):
+    """Keep parameter types and non-text values; never keep text."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: redact_params(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact_param(p) for p in params]
+    return redact_param(params)
+
+def redact_param(value):
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return f"<array:{len(value)}>"
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f"<{type(value).__name__}>"
+
+class SlowQueryLog:
+    """
+    Ring buffer of statements slower than SLOW_QUERY_MS.
+
+    The request only pays for appending an entry; plans are captured by
+    SlowQueryExplainer on its own connection. A statement shape is
+    explained at most once per SLOW_QUERY_EXPLAIN_INTERVAL and later
+    entries reuse that plan.
+
+    Entries are listed per tenant. Statements run before read_token are
+    attributed once it runs; those from unauthenticated routes (login,
+    signup) never get a company_id and are not listed anywhere.
+    """
+
+    def __init__(self, size, explain_interval):
+        self.explain_interval = explain_interval
+        self.pending = queue.Queue(maxsize=64)
+        self._entries = deque(maxlen=size)
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def record(self, stats, query, params, elapsed):
+        shape = statement_shape(query)
+        route = stats.scope.get("route")
+
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "company_id": stats.company_id,
+            "route": f'{stats.scope["method"]} {route.path if route is not None else stats.scope["path"]}',
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": shape,
+            "params": redact_params(params),
+            "plan": None
+        }
+
+        with self._lock:
+            self._entries.append(entry)
+
+        if stats.company_id is None:
+            stats.slow_entries.append(entry)
+
+        entry["plan"] = self.cached_plan(shape)
+        if entry["plan"] is not None:
+            return
+
+        try:
+            self.pending.put_nowait((entry, query, params))
+        except queue.Full:
+            entry["plan"] = "not captured: explain queue full"
+
+    def cached_plan(self, shape):
+        with self._lock:
+            cached = self._plans.get(shape)
+
+        if cached and time.monotonic() - cached[0] < self.explain_interval:
+            return cached[1]
+        return None
+
+    def remember_plan(self, shape, plan):
+        with self._lock:
+            self._plans[shape] = (time.monotonic(), plan)
+            if len(self._plans) > self._entries.maxlen:
+                self._plans.pop(next(iter(self._plans)))
+
+    def for_company(self, company_id, limit):
+        with self._lock:
+            entries = [e for e in self._entries if e["company_id"] == company_id]
+        return entries[::-1][:limit]
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_LOG_SIZE, SLOW_QUERY_EXPLAIN_INTERVAL)
+
+def generic_statement(query, params):
+    """
+    Rewrite psycopg2 placeholders as $n so the statement can be PREPAREd,
+    and return the parameter values in $n order.
+    """
+    names = {}
+    values = []
+
+    def placeholder(match):
+        if match.group(0) == "%%":
+            return "%"
+
+        name = match.group(1)
+        if name is None:
+            values.append(None if params is None else params[len(values)])
+            return f"${len(values)}"
+
+        if name not in names:
+            values.append(None if params is None else params[name])
+            names[name] = len(values)
+        return f"${names[name]}"
+
+    return PLACEHOLDER.sub(placeholder, query), values
+
+# Any of these called by name rules out ANALYZE (nextval, setval,
+# random, functions that write, ...); keywords followed by "(" never match
+VOLATILE_FUNCTIONS_SQL = """
+    SELECT EXISTS (
+        SELECT 1
+        FROM pg_proc
+        WHERE proname = ANY(%s)
+          AND provolatile = 'v'
     )
+"""
+
+def can_analyze(cur, query, params):
+    """
+    EXPLAIN ANALYZE runs the statement, so only plain reads qualify: no
+    write, no locking clause, no volatile function call, and parameters
+    to run it with (executemany logs none).
+    """
+    if params is None or WRITE_STATEMENT.search(query):
+        return False
+
+    names = sorted({name.lower() for name in FUNCTION_CALL.findall(query)})
+    if not names:
+        return True
+
+    cur.execute(VOLATILE_FUNCTIONS_SQL, (names,))
+    return not cur.fetchone()[0]
+
+def explain_statement(conn, query, params):
+    """
+    Explain the statement as a generic plan, so the plan text shows $n
+    instead of the request's values. Reads get EXPLAIN (ANALYZE, BUFFERS);
+    everything else only a plain EXPLAIN (can_analyze). Either way it runs
+    in a READ ONLY transaction, which Postgres refuses to write or lock
+    rows in, under statement and lock timeouts, and is rolled back.
+    """
+    if isinstance(query, bytes):
+        query = query.decode()
+
+    text, values = generic_statement(query, params)
+    args = ", ".join(["%s"] * len(values))
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SET TRANSACTION READ ONLY")
+        cur.execute("SET LOCAL statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+        cur.execute("SET LOCAL lock_timeout = %s", (SLOW_QUERY_EXPLAIN_LOCK_TIMEOUT_MS,))
+        cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+
+        options = "ANALYZE, BUFFERS" if can_analyze(cur, query, params) else "COSTS"
+        cur.execute(f"PREPARE slow_query_explain AS {text}")
+        cur.execute(
+            f"EXPLAIN ({options}) EXECUTE slow_query_explain" + (f"({args})" if values else ""),
+            values
+        )
+        return "\n".join(r[0] for r in cur.fetchall())
+    finally:
+        cur.close()
+        conn.rollback()
+
+        # Prepared statements outlive the rollback
+        cur = conn.cursor()
+        cur.execute("DEALLOCATE ALL")
+        cur.close()
+        conn.commit()
+
+class SlowQueryExplainer(threading.Thread):
+    """Background EXPLAIN loop on a dedicated connection (outside the pool)."""
+
+    def __init__(self):
+        super().__init__(name="slow-query-explainer", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        conn = None
+
+        while not self._stop_event.is_set():
+            try:
+                entry, query, params = slow_query_log.pending.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            plan = slow_query_log.cached_plan(entry["statement"])
+
+            if plan is None:
+                try:
+                    if conn is None or conn.closed:
+                        conn = psycopg2.connect(**db_pool.connect_kwargs)
+                    plan = explain_statement(conn, query, params)
+                    slow_query_log.remember_plan(entry["statement"], plan)
+                except psycopg2.Error as e:
+                    plan = f"not captured: {str(e).strip()}"
+
+            entry["plan"] = plan
+
+        if conn is not None:
+            conn.close()
+
+slow_query_explainer = SlowQueryExplainer()
+
+@app.on_event("startup")
+def start_slow_query_explainer():
+    if SLOW_QUERY_MS > 0:
+        slow_query_explainer.start()
+
+@app.on_event("shutdown")
+def stop_slow_query_explainer():
+    slow_query_explainer.stop()
 
 # =====================================
 # SECURITY HELPERS
 # =====================================
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT)
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+async def hash_password(plain):
+    return await password_hasher.hash(plain)
 
-def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+async def verify_password(plain, hashed):
+    return await password_hasher.verify(plain, hashed)
 
 def create_token(data: dict):
     expire = datetime.utcnow() + timedelta(minutes=JWT_EXP_MINUTES)
@@ -135,6 +1574,16 @@ class MarkAttendance(BaseModel):
     user_id: int
     date: date
     status: str
+    remarks: Optional[str] = None
+
+class AttendanceEntry(BaseModel):
+    user_id: int
+    status: str
+    remarks: Optional[str] = None
+
+class BulkAttendance(BaseModel):
+    date: date
+    entries: List[AttendanceEntry]
 
 class ApplyLeave(BaseModel):
     leave_type: str
@@ -146,11 +1595,39 @@ class ReviewLeave(BaseModel):
     status: str   # Approved | Rejected
     review_notes: Optional[str] = None
 
-class TeamCreate(BaseModel):
-    name: str
-    description: Optional[str] = None
-    manager_id: Optional[int] = None
-    member_ids: List[int] = []
+class BulkReviewLeave(BaseModel):
+    leave_ids: List[int]
+    status: str   # Approved | Rejected
+    review_notes: Optional[str] = None
+
+class LeavePolicyUpsert(BaseModel):
+    leave_type: str
+    annual_days: float
+    accrual_period: str = "month"   # month | year
+    user_id: Optional[int] = None   # per-user override
+    allow_negative: bool = False    # approvals may overdraw the balance
+
+class LeaveAccrualRun(BaseModel):
+    period: Optional[str] = None   # YYYY-MM, defaults to this month
+
+class LeaveAdjustment(BaseModel):
+    user_id: int
+    leave_type: str
+    amount: float
+    note: Optional[str] = None
+
+class WeeklyOffsUpdate(BaseModel):
+    weekly_offs: List[int]   # ISO weekdays, 1 = Monday
+
+class HolidayCreate(BaseModel):
+    date: date
+    name: str
+
+class TeamCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    manager_id: Optional[int] = None
+    member_ids: List[int] = []
 
 class TeamUpdate(BaseModel):
     name: str
@@ -229,9 +1706,21 @@ class ApproveTask(BaseModel):
 # =====================================
 # AUTH DEPENDENCY
 # =====================================
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-):
+# Session + user in one round-trip; expired sessions never match.
+# Served by idx_user_sessions_auth (id, user_id, company_id, expires_at).
+AUTH_LOOKUP_SQL = """
+    SELECT u.status, u.is_company_admin, s.expires_at
+    FROM user_sessions s
+    JOIN users u
+      ON u.id = s.user_id
+     AND u.company_id = s.company_id
+    WHERE s.id = %s
+      AND s.user_id = %s
+      AND s.company_id = %s
+      AND s.expires_at > %s
+"""
+
+def read_token(credentials: HTTPAuthorizationCredentials):
     token = credentials.credentials
     payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
 
@@ -246,34 +1735,40 @@ def get_current_user(
     if not user_id or not company_id or not session_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    conn = get_db()
-    cur = conn.cursor()
+    # Lets the slow-query log attribute statements to a tenant
+    stats = request_stats.get()
+    if stats is not None:
+        stats.attribute(company_id)
 
-    cur.execute("""
-        SELECT id
-        FROM user_sessions
-        WHERE id = %s AND user_id = %s AND company_id = %s
-    """, (session_id, user_id, company_id))
+    return user_id, company_id, session_id
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    conn=Depends(get_db)
+):
+    user_id, company_id, session_id = read_token(credentials)
 
-    session = cur.fetchone()
+    user = session_cache.get(session_id, user_id, company_id)
 
-    if not session:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=401)
+    if user is None:
+        now = datetime.utcnow()
+        cur = conn.cursor()
 
-    cur.execute("""
-        SELECT status, is_company_admin
-        FROM users
-        WHERE id = %s AND company_id = %s
-    """, (user_id, company_id))
+        cur.execute(AUTH_LOOKUP_SQL, (session_id, user_id, company_id, now))
 
-    user = cur.fetchone()
+        user = cur.fetchone()
 
-    cur.close()
-    conn.close()
+        cur.close()
+
+        if not user:
+            raise HTTPException(status_code=401)
+
+        session_cache.put(
+            session_id, user_id, company_id, user,
+            ttl=(user[2] - now).total_seconds()
+        )
 
-    if not user or user[0] != "active":
+    if user[0] != "active":
         raise HTTPException(status_code=403)
 
     return {
@@ -360,18 +1855,241 @@ def get_task_and_project(conn, task_id, current):
     cur.close()
     return task_status, project_status, is_leader, is_assignee, is_admin
 
+def encode_cursor(*values):
+    """Opaque keyset cursor: the sort key of the last row on a page."""
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return values
+
+def page_limit(limit):
+    return min(max(limit, 1), PAGE_MAX)
+
+def keyset_page(rows, limit, *key_columns):
+    """
+    Split a LIMIT page_limit(limit) + 1 result into the page and the
+    cursor for the next one (None on the last page).
+    """
+    limit = page_limit(limit)
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*(items[-1][c] for c in key_columns))
+
+    return items, next_cursor
+
+
+# =====================================
+# ASYNC REQUEST PATH (DB_ASYNC=true)
+# =====================================
+# The hottest read endpoints get native async twins backed by psycopg 3,
+# which keeps the same %s placeholders so the SQL is shared with the sync
+# handlers. The router is included before the sync routes are declared,
+# so in async mode these take precedence for their method + path; every
+# other endpoint keeps running on the threadpool with the sync pool.
+# psycopg 3 is imported only in async mode; sync deployments need not
+# install it.
+if DB_ASYNC:
+    from psycopg import AsyncCursor
+    from psycopg.conninfo import make_conninfo
+    from psycopg_pool import AsyncConnectionPool, PoolTimeout as AsyncPoolTimeout
+
+    class AsyncInstrumentedCursor(AsyncCursor):
+        async def execute(self, query, params=None, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().execute(query, params, **kwargs)
+            finally:
+                record_query(query, params, started)
+
+    async_db_pool = AsyncConnectionPool(
+        conninfo=make_conninfo(
+            host=DB_HOST,
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD
+        ),
+        min_size=DB_POOL_MIN,
+        max_size=DB_ASYNC_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        kwargs={"cursor_factory": AsyncInstrumentedCursor},
+        check=AsyncConnectionPool.check_connection,
+        open=False
+    )
+
+async_router = APIRouter()
+
+@app.on_event("startup")
+async def open_async_db_pool():
+    if DB_ASYNC:
+        await async_db_pool.open()
+
+@app.on_event("shutdown")
+async def close_async_db_pool():
+    if DB_ASYNC:
+        await async_db_pool.close()
+
+async def get_async_db():
+    """
+    A pooled connection for the request. The pool's connection() context
+    commits when the handler returns and rolls back when it raises, so no
+    transaction is left open on a returned connection.
+    """
+    stats = request_stats.get()
+    started = time.perf_counter()
+
+    def charge_wait():
+        if stats is not None:
+            stats.pool_wait += time.perf_counter() - started
+
+    try:
+        async with async_db_pool.connection() as conn:
+            charge_wait()
+            yield conn
+    except AsyncPoolTimeout:
+        charge_wait()
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    conn=Depends(get_async_db)
+):
+    user_id, company_id, session_id = read_token(credentials)
+
+    user = session_cache.get(session_id, user_id, company_id)
+
+    if user is None:
+        now = datetime.utcnow()
+
+        async with conn.cursor() as cur:
+            await cur.execute(AUTH_LOOKUP_SQL, (session_id, user_id, company_id, now))
+            user = await cur.fetchone()
+
+        if not user:
+            raise HTTPException(status_code=401)
+
+        session_cache.put(
+            session_id, user_id, company_id, user,
+            ttl=(user[2] - now).total_seconds()
+        )
+
+    if user[0] != "active":
+        raise HTTPException(status_code=403)
+
+    return {
+        "user_id": user_id,
+        "company_id": company_id,
+        "session_id": session_id,
+        "is_company_admin": user[1]
+    }
+
+@async_router.get("/company/attendance")
+@query_budget(2)
+async def get_attendance_async(
+    date: date,
+    current=Depends(get_current_user_async),
+    conn=Depends(get_async_db)
+):
+    async with conn.cursor() as cur:
+        await cur.execute(
+            ATTENDANCE_DAY_SQL,
+            (date, current["company_id"], current["company_id"])
+        )
+        rows = await cur.fetchall()
+
+    return [
+        {
+            "user_id": r[0],
+            "emp_id": r[1],
+            "name": r[2],
+            "status": r[3],
+            "marked_by": r[4]
+        }
+        for r in rows
+    ]
+
+@async_router.get("/company/attendance/summary")
+@query_budget(4)
+async def attendance_summary_async(
+    date: date,
+    current=Depends(get_current_user_async),
+    conn=Depends(get_async_db)
+):
+    async with conn.cursor() as cur:
+        await cur.execute(ATTENDANCE_DAILY_SQL, (current["company_id"], date))
+        row = await cur.fetchone()
+
+        if row is None:
+            await cur.execute(ACTIVE_USERS_COUNT_SQL, (current["company_id"],))
+            row = (0, 0, 0, (await cur.fetchone())[0])
+
+        bitmap = await working_calendar.year_async(cur, current["company_id"], date.year)
+
+    return {
+        "present": row[0],
+        "absent": row[1],
+        "leave": row[2],
+        "total_employees": row[3],
+        "working_day": is_working_day(bitmap, date)
+    }
+
+@async_router.get("/sales/leads")
+@query_budget(2)
+async def get_all_leads_async(
+    status: Optional[str] = None,
+    assigned_employee_id: Optional[int] = None,
+    source: Optional[str] = None,
+    follow_up_from: Optional[date] = None,
+    follow_up_to: Optional[date] = None,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    user=Depends(get_current_user_async),
+    conn=Depends(get_async_db)
+):
+    async with conn.cursor() as cur:
+        await cur.execute(*leads_page_query(
+            user["company_id"], status, assigned_employee_id, source,
+            follow_up_from, follow_up_to, after, limit
+        ))
+        rows = await cur.fetchall()
+
+    return leads_page(rows, limit)
+
+@async_router.get("/sales/leads/today")
+@query_budget(2)
+async def todays_followups_async(
+    user=Depends(get_current_user_async),
+    conn=Depends(get_async_db)
+):
+    async with conn.cursor() as cur:
+        await cur.execute(FOLLOWUPS_TODAY_SQL, (
+            user["company_id"],
+            user["user_id"]
+        ))
+        return await cur.fetchall()
+
+if DB_ASYNC:
+    app.include_router(async_router)
+
 
 # ===============================================================
 # ===============================================================
 # ===============================================================
-@app.post("/company/login")
-def company_login(data: CompanyLogin, request: Request):
-    conn = get_db()
+# Password routes are async so bcrypt is awaited off the threadpool; their
+# psycopg2 work still runs on the threadpool through these helpers.
+def find_login_user(conn, data):
     cur = conn.cursor()
 
-    if not data.emp_id and not data.email:
-        raise HTTPException(status_code=400, detail="Either emp_id or email is required")
-
     cur.execute("""
         SELECT status
         FROM companies
@@ -382,7 +2100,6 @@ def company_login(data: CompanyLogin, request: Request):
 
     if not company or company[0].lower().strip() != "active":
         cur.close()
-        conn.close()
         raise HTTPException(status_code=403, detail="Company not active")
 
     if data.emp_id:
@@ -399,20 +2116,12 @@ def company_login(data: CompanyLogin, request: Request):
         """, (data.company_id, data.email))
 
     user = cur.fetchone()
+    cur.close()
 
-    if not user:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    user_id, password_hash, status = user
-
-    if status != "active" or not verify_password(data.password, password_hash):
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return user
 
-    expires_at = datetime.utcnow() + timedelta(minutes=JWT_EXP_MINUTES)
+def open_user_session(conn, user_id, company_id, request):
+    cur = conn.cursor()
 
     cur.execute("""
         INSERT INTO user_sessions
@@ -421,16 +2130,37 @@ def company_login(data: CompanyLogin, request: Request):
         RETURNING id
     """, (
         user_id,
-        data.company_id,
+        company_id,
         request.client.host,
         request.headers.get("user-agent"),
-        expires_at
+        datetime.utcnow() + timedelta(minutes=JWT_EXP_MINUTES)
     ))
 
     session_id = cur.fetchone()[0]
     conn.commit()
     cur.close()
-    conn.close()
+
+    return session_id
+
+@app.post("/company/login")
+async def company_login(data: CompanyLogin, request: Request, conn=Depends(get_db)):
+
+    if not data.emp_id and not data.email:
+        raise HTTPException(status_code=400, detail="Either emp_id or email is required")
+
+    user = await run_in_threadpool(find_login_user, conn, data)
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    user_id, password_hash, status = user
+
+    if status != "active" or not await verify_password(data.password, password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    session_id = await run_in_threadpool(
+        open_user_session, conn, user_id, data.company_id, request
+    )
 
     token = create_token({
         "sub": str(user_id),
@@ -441,8 +2171,7 @@ def company_login(data: CompanyLogin, request: Request):
     return {"access_token": token}
 
 @app.post("/company/logout")
-def company_logout(current=Depends(get_current_user)):
-    conn = get_db()
+def company_logout(current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -450,88 +2179,85 @@ def company_logout(current=Depends(get_current_user)):
         WHERE id = %s AND user_id = %s
     """, (current["session_id"], current["user_id"]))
 
+    notify_session_change(cur, session_id=current["session_id"])
+
     conn.commit()
     cur.close()
-    conn.close()
+
+    session_cache.discard(session_id=current["session_id"])
 
     return {"message": "Logged out successfully"}
 
+COMPANY_HOME_SQL = """
+    SELECT
+        u.emp_id,
+        u.name,
+        u.email,
+        u.is_company_admin,
+        c.company_name,
+        ua.feature_ids,
+        ARRAY(
+            SELECT r.name
+            FROM user_roles ur
+            JOIN roles r ON r.id = ur.role_id
+            WHERE ur.user_id = u.id AND NOT u.is_company_admin
+        ),
+        COALESCE((
+            SELECT json_agg(json_build_object('code', f.code, 'name', f.name) ORDER BY f.id)
+            FROM features f
+            WHERE f.id = ANY(ua.feature_ids)
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'code', p.page_code, 'name', p.page_name, 'route', p.route
+            ) ORDER BY p.page_name)
+            FROM (
+                SELECT DISTINCT page_code, page_name, route
+                FROM feature_bundle_pages
+                WHERE feature_id = ANY(ua.feature_ids)
+            ) p
+        ), '[]')
+    FROM users u
+    JOIN companies c ON c.id = u.company_id
+    LEFT JOIN user_access ua ON ua.user_id = u.id
+    WHERE u.id = %s AND u.company_id = %s
+"""
+
 @app.get("/company/me")
-def get_company_home(current=Depends(get_current_user)):
-    conn = get_db()
-    cur = conn.cursor()
+@query_budget(5)
+def get_company_home(
+    request: Request,
+    response: Response,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    not_modified = etag_check(
+        request, response, conn,
+        ("company", current["company_id"]),
+        ("user", current["user_id"])
+    )
+    if not_modified:
+        return not_modified
 
-    # ---- USER INFO ----
-    cur.execute("""
-        SELECT 
-            u.emp_id,
-            u.name,
-            u.email,
-            u.is_company_admin,
-            c.company_name
-        FROM users u
-        JOIN companies c ON c.id = u.company_id
-        WHERE u.id = %s AND u.company_id = %s
-    """, (current["user_id"], current["company_id"]))
+    cur = conn.cursor()
 
+    params = (current["user_id"], current["company_id"])
+    cur.execute(COMPANY_HOME_SQL, params)
     row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=404)
-
-    emp_id, name, email, is_admin, company_name = row
 
-    # ---- FEATURES RESOLUTION ----
-    if is_admin:
-        # Admin → all enabled company features
-        cur.execute("""
-            SELECT f.id, f.code, f.name
-            FROM company_features cf
-            JOIN features f ON f.id = cf.feature_id
-            WHERE cf.company_id = %s AND cf.enabled = TRUE
-        """, (current["company_id"],))
-    else:
-        # Normal user → roles → features (filtered by company_features)
-        cur.execute("""
-            SELECT DISTINCT f.id, f.code, f.name
-            FROM user_roles ur
-            JOIN roles r ON r.id = ur.role_id
-            JOIN roles_features rf ON rf.role_id = r.id
-            JOIN features f ON f.id = rf.feature_id
-            JOIN company_features cf ON cf.feature_id = f.id
-            WHERE ur.user_id = %s
-              AND r.company_id = %s
-              AND cf.enabled = TRUE
-        """, (current["user_id"], current["company_id"]))
+    # First visit since user_access was introduced / the user was created
+    if row and row[5] is None:
+        refresh_user_access(cur, "u.id = %s", (current["user_id"],))
+        conn.commit()
+        cur.execute(COMPANY_HOME_SQL, params)
+        row = cur.fetchone()
 
-    features = cur.fetchall()
-    feature_ids = [f[0] for f in features]
+    cur.close()
 
-    # ---- PAGES FROM FEATURES ----
-    pages = []
-    if feature_ids:
-        cur.execute("""
-            SELECT DISTINCT page_code, page_name, route
-            FROM feature_bundle_pages
-            WHERE feature_id = ANY(%s)
-            ORDER BY page_name
-        """, (feature_ids,))
-        pages = cur.fetchall()
-
-    # ---- ROLES (ONLY FOR NON-ADMIN) ----
-    roles = []
-    if not is_admin:
-        cur.execute("""
-            SELECT r.name
-            FROM user_roles ur
-            JOIN roles r ON r.id = ur.role_id
-            WHERE ur.user_id = %s
-        """, (current["user_id"],))
-        roles = [r[0] for r in cur.fetchall()]
+    if not row:
+        raise HTTPException(status_code=404)
 
-    cur.close()
-    conn.close()
+    emp_id, name, email, is_admin, company_name, _, roles, features, pages = row
 
     return {
         "user": {
@@ -543,54 +2269,121 @@ def get_company_home(current=Depends(get_current_user)):
             "is_company_admin": is_admin
         },
         "roles": roles,
-        "features": [
-            {"code": f[1], "name": f[2]} for f in features
-        ],
-        "pages": [
-            {"code": p[0], "name": p[1], "route": p[2]} for p in pages
-        ]
+        "features": features,
+        "pages": pages
     }
 
-@app.get("/company/users")
-def list_users(current=Depends(get_current_user)):
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
-    conn = get_db()
+@app.get("/company/users")
+@query_budget(3)
+def list_users(
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    include_roles: bool = False,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Newest users first, one keyset page at a time. `q` matches a name
+    substring (idx_users_name_trgm) or an emp_id / email prefix
+    (idx_users_company_emp_id_prefix / idx_users_company_email_prefix).
+    Roles are aggregated for the returned page only.
+    """
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT 
-            u.id, u.emp_id, u.name, u.email, u.status,
-            u.is_company_admin,
-            COALESCE(array_agg(r.name) FILTER (WHERE r.name IS NOT NULL), '{}')
+    query = """
+        SELECT u.id, u.emp_id, u.name, u.email, u.status, u.is_company_admin, u.created_at
         FROM users u
-        LEFT JOIN user_roles ur ON ur.user_id = u.id
-        LEFT JOIN roles r ON r.id = ur.role_id
         WHERE u.company_id = %s
-        GROUP BY u.id
-        ORDER BY u.created_at DESC
-    """, (current["company_id"],))
+    """
+    params = [current["company_id"]]
+
+    if q and q.strip():
+        term = like_escape(q.strip().lower())
+        query += """
+            AND (
+                u.name ILIKE %s
+                OR lower(u.emp_id) LIKE %s
+                OR lower(u.email) LIKE %s
+            )
+        """
+        params.extend([f"%{term}%", f"{term}%", f"{term}%"])
+
+    if status:
+        query += " AND u.status = %s"
+        params.append(status)
+
+    if after:
+        created_at, user_id = decode_cursor(after, 2)
+        query += " AND (u.created_at, u.id) < (%s, %s)"
+        params.extend([created_at, user_id])
+
+    query += " ORDER BY u.created_at DESC, u.id DESC LIMIT %s"
+    params.append(page_limit(limit) + 1)
+
+    cur.execute(query, params)
+    users, next_cursor = keyset_page(cur.fetchall(), limit, 6, 0)
+
+    roles = {}
+    if include_roles and users:
+        cur.execute("""
+            SELECT ur.user_id, array_agg(r.name ORDER BY r.name)
+            FROM user_roles ur
+            JOIN roles r ON r.id = ur.role_id
+            WHERE ur.user_id = ANY(%s)
+            GROUP BY ur.user_id
+        """, ([u[0] for u in users],))
+        roles = dict(cur.fetchall())
 
-    users = cur.fetchall()
     cur.close()
-    conn.close()
 
-    return [
-        {
+    items = []
+    for u in users:
+        item = {
             "id": u[0],
             "emp_id": u[1],
             "name": u[2],
             "email": u[3],
             "status": u[4],
-            "is_company_admin": u[5],
-            "roles": u[6]
+            "is_company_admin": u[5]
         }
-        for u in users
-    ]
+        if include_roles:
+            item["roles"] = roles.get(u[0], [])
+        items.append(item)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/company/typeahead")
+@query_budget(3)
+def typeahead(
+    q: str,
+    kind: str = "user",
+    limit: int = 10,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Name / emp_id prefix lookup for pickers, served from this worker's
+    TypeaheadIndex. Only the first lookup for a tenant touches the DB.
+    """
+    if kind not in TYPEAHEAD_KINDS:
+        raise HTTPException(status_code=400, detail="kind must be 'user' or 'lead'")
+
+    return typeahead_index.search(
+        conn, current["company_id"], kind, q, max(1, min(limit, 50))
+    )
 
 @app.post("/company/users")
-def add_user(data: CreateUserWithRoles, current=Depends(get_current_user)):
+@query_budget(6)
+async def add_user(data: CreateUserWithRoles, current=Depends(get_current_user), conn=Depends(get_db)):
+    password_hash = await hash_password(data.password)
+    return await run_in_threadpool(create_user, conn, current, data, password_hash)
 
-    conn = get_db()
+def create_user(conn, current, data, password_hash):
     cur = conn.cursor()
 
     cur.execute("""
@@ -603,7 +2396,7 @@ def add_user(data: CreateUserWithRoles, current=Depends(get_current_user)):
         data.emp_id,
         data.name,
         data.email,
-        pwd_context.hash(data.password),
+        password_hash,
         data.is_company_admin
     ))
 
@@ -611,28 +2404,54 @@ def add_user(data: CreateUserWithRoles, current=Depends(get_current_user)):
 
     # Assign roles ONLY if not admin
     if not data.is_company_admin and data.role_ids:
-        for role_id in data.role_ids:
-            cur.execute("""
-                INSERT INTO user_roles (user_id, role_id)
-                VALUES (%s, %s)
-            """, (user_id, role_id))
+        cur.execute("""
+            INSERT INTO user_roles (user_id, role_id)
+            SELECT %s, unnest(%s::int[])
+        """, (user_id, data.role_ids))
+
+    refresh_user_access(cur, "u.id = %s", (user_id,))
+    adjust_active_headcount(cur, current["company_id"], 1)
+    notify_typeahead_change(cur, current["company_id"])
 
     conn.commit()
     cur.close()
-    conn.close()
+
+    typeahead_index.put(current["company_id"], "user", {
+        "id": user_id,
+        "emp_id": data.emp_id,
+        "name": data.name,
+        "status": "active"
+    })
 
     return {"message": "User created successfully"}
 
 @app.put("/company/users/{user_id}")
+@query_budget(11)
 def update_user(
     user_id: int,
     data: UpdateUserWithRoles,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
 
-    conn = get_db()
     cur = conn.cursor()
 
+    # Locked like upsert_attendance does; the old status drives headcounts
+    cur.execute("""
+        SELECT status
+        FROM users
+        WHERE id = %s AND company_id = %s
+        FOR NO KEY UPDATE
+    """, (user_id, current["company_id"]))
+
+    row = cur.fetchone()
+    if not row:
+        cur.close()
+        raise HTTPException(status_code=404)
+
+    old_status = row[0]
+    was_active = old_status == "active"
+
     cur.execute("""
         UPDATE users
         SET name = %s,
@@ -640,6 +2459,7 @@ def update_user(
             status = %s,
             is_company_admin = %s
         WHERE id = %s AND company_id = %s
+        RETURNING emp_id
     """, (
         data.name,
         data.email,
@@ -649,33 +2469,57 @@ def update_user(
         current["company_id"]
     ))
 
-    if cur.rowcount == 0:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=404)
+    emp_id = cur.fetchone()[0]
+
+    if was_active != (data.status == "active"):
+        adjust_active_headcount(cur, current["company_id"], -1 if was_active else 1)
+
+    # Lets a rollup rebuild recount past headcounts (REBUILD_ATTENDANCE_DAILY_SQL)
+    if data.status != old_status:
+        cur.execute("""
+            INSERT INTO user_status_history
+                (company_id, user_id, previous_status, status, changed_by)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (current["company_id"], user_id, old_status, data.status, current["user_id"]))
 
     # 🔴 IMPORTANT PART
     # Always reset roles
     cur.execute("DELETE FROM user_roles WHERE user_id = %s", (user_id,))
 
     # Reassign roles only if NOT admin
-    if not data.is_company_admin:
-        for role_id in data.role_ids:
-            cur.execute("""
-                INSERT INTO user_roles (user_id, role_id)
-                VALUES (%s, %s)
-            """, (user_id, role_id))
+    if not data.is_company_admin and data.role_ids:
+        cur.execute("""
+            INSERT INTO user_roles (user_id, role_id)
+            SELECT %s, unnest(%s::int[])
+        """, (user_id, data.role_ids))
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    refresh_user_access(cur, "u.id = %s", (user_id,))
 
-    return {"message": "User updated successfully"}
+    # Status / admin flag are cached per session
+    notify_session_change(cur, user_id=user_id)
+    notify_typeahead_change(cur, current["company_id"])
 
-@app.get("/company/user-sessions")
-def get_all_user_sessions(current=Depends(get_current_user)):
+    # /company/me of this user; team listings show manager names
+    changed = (("user", user_id), ("teams", current["company_id"]))
+    bump_resource_versions(cur, *changed)
+
+    conn.commit()
+    cur.close()
+
+    session_cache.discard(user_id=user_id)
+    etag_versions.discard(*changed)
+    typeahead_index.put(current["company_id"], "user", {
+        "id": user_id,
+        "emp_id": emp_id,
+        "name": data.name,
+        "status": data.status
+    })
+
+    return {"message": "User updated successfully"}
+
+@app.get("/company/user-sessions")
+def get_all_user_sessions(current=Depends(get_current_user), conn=Depends(get_db)):
 
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -695,7 +2539,6 @@ def get_all_user_sessions(current=Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -711,9 +2554,8 @@ def get_all_user_sessions(current=Depends(get_current_user)):
     ]
 
 @app.delete("/company/user-sessions/{session_id}")
-def terminate_user_session(session_id: int, current=Depends(get_current_user)):
+def terminate_user_session(session_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
 
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -726,19 +2568,36 @@ def terminate_user_session(session_id: int, current=Depends(get_current_user)):
 
     if cur.rowcount == 0:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404)
 
+    notify_session_change(cur, session_id=session_id)
+
     conn.commit()
     cur.close()
-    conn.close()
+
+    session_cache.discard(session_id=session_id)
 
     return {"message": "Session terminated"}
 
+@app.get("/company/slow-queries")
+def list_slow_queries(limit: int = 50, current=Depends(get_current_user)):
+
+    if not current["is_company_admin"]:
+        raise HTTPException(status_code=403)
+
+    return slow_query_log.for_company(current["company_id"], min(limit, 500))
+
 @app.get("/company/roles")
-def list_roles(current=Depends(get_current_user)):
+def list_roles(
+    request: Request,
+    response: Response,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    not_modified = etag_check(request, response, conn, ("company", current["company_id"]))
+    if not_modified:
+        return not_modified
 
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -757,7 +2616,6 @@ def list_roles(current=Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -770,9 +2628,9 @@ def list_roles(current=Depends(get_current_user)):
     ]
 
 @app.post("/company/roles")
-def create_role(data: CreateRole, current=Depends(get_current_user)):
+@query_budget(5)
+def create_role(data: CreateRole, current=Depends(get_current_user), conn=Depends(get_db)):
 
-    conn = get_db()
     cur = conn.cursor()
 
     # Validate features belong to company subscription
@@ -786,7 +2644,6 @@ def create_role(data: CreateRole, current=Depends(get_current_user)):
 
     if not set(data.feature_ids).issubset(allowed_features):
         cur.close()
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="One or more features are not enabled for this company"
@@ -806,22 +2663,26 @@ def create_role(data: CreateRole, current=Depends(get_current_user)):
     role_id = cur.fetchone()[0]
 
     # Assign features to role
-    for feature_id in data.feature_ids:
-        cur.execute("""
-            INSERT INTO roles_features (role_id, feature_id)
-            VALUES (%s, %s)
-        """, (role_id, feature_id))
+    cur.execute("""
+        INSERT INTO roles_features (role_id, feature_id)
+        SELECT %s, unnest(%s::int[])
+    """, (role_id, data.feature_ids))
+
+    # No user holds the new role yet, so user_access is unaffected
+
+    bump_resource_versions(cur, ("company", current["company_id"]))
 
     conn.commit()
     cur.close()
-    conn.close()
+
+    etag_versions.discard(("company", current["company_id"]))
 
     return {"message": "Role created successfully"}
 
 @app.put("/company/roles/{role_id}")
-def update_role(role_id: int, data: UpdateRole, current=Depends(get_current_user)):
+@query_budget(8)
+def update_role(role_id: int, data: UpdateRole, current=Depends(get_current_user), conn=Depends(get_db)):
 
-    conn = get_db()
     cur = conn.cursor()
 
     # Ensure role belongs to company
@@ -832,7 +2693,6 @@ def update_role(role_id: int, data: UpdateRole, current=Depends(get_current_user
 
     if not cur.fetchone():
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Role not found")
 
     # Validate features
@@ -846,7 +2706,6 @@ def update_role(role_id: int, data: UpdateRole, current=Depends(get_current_user
 
     if not set(data.feature_ids).issubset(allowed_features):
         cur.close()
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Invalid feature assignment"
@@ -867,22 +2726,29 @@ def update_role(role_id: int, data: UpdateRole, current=Depends(get_current_user
     # Reset role features
     cur.execute("DELETE FROM roles_features WHERE role_id = %s", (role_id,))
 
-    for feature_id in data.feature_ids:
-        cur.execute("""
-            INSERT INTO roles_features (role_id, feature_id)
-            VALUES (%s, %s)
-        """, (role_id, feature_id))
+    cur.execute("""
+        INSERT INTO roles_features (role_id, feature_id)
+        SELECT %s, unnest(%s::int[])
+    """, (role_id, data.feature_ids))
+
+    refresh_user_access(
+        cur,
+        "u.id IN (SELECT user_id FROM user_roles WHERE role_id = %s)",
+        (role_id,)
+    )
+
+    bump_resource_versions(cur, ("company", current["company_id"]))
 
     conn.commit()
     cur.close()
-    conn.close()
+
+    etag_versions.discard(("company", current["company_id"]))
 
     return {"message": "Role updated successfully"}
 
 @app.delete("/company/roles/{role_id}")
-def delete_role(role_id: int, current=Depends(get_current_user)):
+def delete_role(role_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
 
-    conn = get_db()
     cur = conn.cursor()
 
     # Prevent deleting role in use
@@ -892,7 +2758,6 @@ def delete_role(role_id: int, current=Depends(get_current_user)):
 
     if cur.fetchone():
         cur.close()
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Role is assigned to users"
@@ -905,19 +2770,28 @@ def delete_role(role_id: int, current=Depends(get_current_user)):
 
     if cur.rowcount == 0:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404)
 
+    bump_resource_versions(cur, ("company", current["company_id"]))
+
     conn.commit()
     cur.close()
-    conn.close()
+
+    etag_versions.discard(("company", current["company_id"]))
 
     return {"message": "Role deleted successfully"}
 
 @app.get("/company/feature-bundles")
-def get_company_feature_bundles(current=Depends(get_current_user)):
+def get_company_feature_bundles(
+    request: Request,
+    response: Response,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    not_modified = etag_check(request, response, conn, ("company", current["company_id"]))
+    if not_modified:
+        return not_modified
 
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -931,7 +2805,6 @@ def get_company_feature_bundles(current=Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -943,11 +2816,12 @@ def get_company_feature_bundles(current=Depends(get_current_user)):
     ]
 
 @app.get("/company/users/{user_id}/profile")
+@query_budget(7)
 def get_employee_profile(
     user_id: int,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     # ---- FETCH TARGET USER ----
@@ -968,7 +2842,6 @@ def get_employee_profile(
     user = cur.fetchone()
     if not user:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="User not found")
 
     (
@@ -1042,7 +2915,6 @@ def get_employee_profile(
     last_login = cur.fetchone()[0]
 
     cur.close()
-    conn.close()
 
     return {
         "basic": {
@@ -1087,9 +2959,9 @@ def get_employee_profile(
 @app.put("/company/users/me/profile")
 def update_my_profile(
     data: UpdateUserProfile,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     # Ensure profile row exists
@@ -1139,19 +3011,12 @@ def update_my_profile(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Profile updated successfully"}
 
-@app.put("/company/users/me/password")
-def change_my_password(
-    data: ChangePassword,
-    current=Depends(get_current_user)
-):
-    conn = get_db()
+def find_password_hash(conn, current):
     cur = conn.cursor()
 
-    # Fetch current password hash
     cur.execute("""
         SELECT password_hash
         FROM users
@@ -1159,60 +3024,73 @@ def change_my_password(
     """, (current["user_id"], current["company_id"]))
 
     row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=404)
-
-    password_hash = row[0]
+    cur.close()
 
-    # Verify old password
-    if not verify_password(data.current_password, password_hash):
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=400, detail="Incorrect current password")
+    return row[0] if row else None
 
-    # Update password
-    new_hash = pwd_context.hash(data.new_password)
+def set_password_hash(conn, current, password_hash):
+    cur = conn.cursor()
 
     cur.execute("""
         UPDATE users
         SET password_hash = %s
         WHERE id = %s AND company_id = %s
-    """, (new_hash, current["user_id"], current["company_id"]))
+    """, (password_hash, current["user_id"], current["company_id"]))
 
     conn.commit()
     cur.close()
-    conn.close()
+
+@app.put("/company/users/me/password")
+async def change_my_password(
+    data: ChangePassword,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    password_hash = await run_in_threadpool(find_password_hash, conn, current)
+
+    if password_hash is None:
+        raise HTTPException(status_code=404)
+
+    # Verify old password
+    if not await verify_password(data.current_password, password_hash):
+        raise HTTPException(status_code=400, detail="Incorrect current password")
+
+    # Update password
+    new_hash = await hash_password(data.new_password)
+    await run_in_threadpool(set_password_hash, conn, current, new_hash)
 
     return {"message": "Password updated successfully"}
 
+ATTENDANCE_DAY_SQL = """
+    SELECT
+        u.id,
+        u.emp_id,
+        u.name,
+        COALESCE(a.status, 'Unmarked') AS status,
+        a.marked_by
+    FROM users u
+    LEFT JOIN attendance a
+      ON a.user_id = u.id
+     AND a.date = %s
+     AND a.company_id = %s
+    WHERE u.company_id = %s
+      AND u.status = 'active'
+    ORDER BY u.emp_id
+"""
+
 @app.get("/company/attendance")
-def get_attendance(date: date, current=Depends(get_current_user)):
-    conn = get_db()
+@query_budget(2)
+def get_attendance(date: date, current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            u.id,
-            u.emp_id,
-            u.name,
-            COALESCE(a.status, 'Unmarked') AS status,
-            a.marked_by
-        FROM users u
-        LEFT JOIN attendance a
-          ON a.user_id = u.id
-         AND a.date = %s
-         AND a.company_id = %s
-        WHERE u.company_id = %s
-          AND u.status = 'active'
-        ORDER BY u.emp_id
-    """, (date, current["company_id"], current["company_id"]))
+    cur.execute(
+        ATTENDANCE_DAY_SQL,
+        (date, current["company_id"], current["company_id"])
+    )
 
     rows = cur.fetchall()
 
     cur.close()
-    conn.close()
 
     return [
         {
@@ -1225,122 +3103,594 @@ def get_attendance(date: date, current=Depends(get_current_user)):
         for r in rows
     ]
 
-@app.post("/company/attendance")
-def mark_attendance(data: MarkAttendance, current=Depends(get_current_user)):
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("""
+ATTENDANCE_STATUSES = ("Present", "Absent", "Leave")
+
+LOCK_ATTENDANCE_USERS_SQL = """
+    SELECT id
+    FROM users
+    WHERE id = ANY(%s) AND company_id = %s
+    ORDER BY id
+    FOR NO KEY UPDATE
+"""
+
+# `previous` is read in the same snapshot the upsert runs in; holding the
+# users' row locks (LOCK_ATTENDANCE_USERS_SQL) keeps it exact, so the
+# rollup deltas below never drift under concurrent marking.
+UPSERT_ATTENDANCE_SQL = """
+    WITH input AS (
+        SELECT *
+        FROM unnest(%s::int[], %s::date[], %s::text[], %s::text[], %s::int[])
+            AS e(user_id, date, status, remarks, leave_request_id)
+    ),
+    previous AS (
+        SELECT a.user_id, a.date, a.status
+        FROM attendance a
+        JOIN input i ON i.user_id = a.user_id AND i.date = a.date
+        WHERE a.company_id = %s
+    ),
+    written AS (
         INSERT INTO attendance
-            (company_id, user_id, date, status, marked_by, marked_at)
-        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            (company_id, user_id, date, status, remarks, marked_by, marked_at, leave_request_id)
+        SELECT %s, user_id, date, status, remarks, %s, CURRENT_TIMESTAMP, leave_request_id
+        FROM input
         ON CONFLICT (company_id, user_id, date)
         DO UPDATE SET
             status = EXCLUDED.status,
+            remarks = COALESCE(EXCLUDED.remarks, attendance.remarks),
             marked_by = EXCLUDED.marked_by,
-            marked_at = CURRENT_TIMESTAMP
-    """, (
-        current["company_id"],
-        data.user_id,
-        data.date,
-        data.status,
-        current["user_id"]
+            marked_at = CURRENT_TIMESTAMP,
+            leave_request_id = EXCLUDED.leave_request_id
+        RETURNING user_id, date, status
+    ),
+    changes AS (
+        SELECT w.user_id, w.date, p.status AS old_status, w.status AS new_status
+        FROM written w
+        LEFT JOIN previous p ON p.user_id = w.user_id AND p.date = w.date
+    ),
+    monthly AS (
+        INSERT INTO attendance_monthly AS m
+            (company_id, user_id, month, present, absent, leave)
+        SELECT
+            %s,
+            user_id,
+            date_trunc('month', date)::date,
+            COUNT(*) FILTER (WHERE new_status = 'Present')
+                - COUNT(*) FILTER (WHERE old_status = 'Present'),
+            COUNT(*) FILTER (WHERE new_status = 'Absent')
+                - COUNT(*) FILTER (WHERE old_status = 'Absent'),
+            COUNT(*) FILTER (WHERE new_status = 'Leave')
+                - COUNT(*) FILTER (WHERE old_status = 'Leave')
+        FROM changes
+        GROUP BY user_id, date_trunc('month', date)
+        ON CONFLICT (company_id, user_id, month)
+        DO UPDATE SET
+            present = m.present + EXCLUDED.present,
+            absent = m.absent + EXCLUDED.absent,
+            leave = m.leave + EXCLUDED.leave
+    ),
+    daily AS (
+        INSERT INTO attendance_daily AS d
+            (company_id, date, present, absent, leave, total_active)
+        SELECT
+            %s,
+            date,
+            COUNT(*) FILTER (WHERE new_status = 'Present')
+                - COUNT(*) FILTER (WHERE old_status = 'Present'),
+            COUNT(*) FILTER (WHERE new_status = 'Absent')
+                - COUNT(*) FILTER (WHERE old_status = 'Absent'),
+            COUNT(*) FILTER (WHERE new_status = 'Leave')
+                - COUNT(*) FILTER (WHERE old_status = 'Leave'),
+            (
+                SELECT COUNT(*)
+                FROM users
+                WHERE company_id = %s AND status = 'active'
+            )
+        FROM changes
+        GROUP BY date
+        ON CONFLICT (company_id, date)
+        DO UPDATE SET
+            present = d.present + EXCLUDED.present,
+            absent = d.absent + EXCLUDED.absent,
+            leave = d.leave + EXCLUDED.leave
+    )
+    SELECT user_id, date
+    FROM changes
+"""
+
+def upsert_attendance(cur, company_id, marked_by, rows):
+    """
+    Write (user_id, date, status, remarks, leave_request_id) rows and keep
+    attendance_monthly and attendance_daily in step, in one statement after
+    locking the users involved. Returns
+    the (user_id, date) pairs written; rows for users outside the company
+    are skipped and a (user_id, date) pair must not repeat.
+
+    leave_request_id is set only by leave approval; any other write of the
+    day clears it, so the day is no longer undone if that leave is cancelled.
+    """
+    if not rows:
+        return set()
+
+    cur.execute(LOCK_ATTENDANCE_USERS_SQL, (list({r[0] for r in rows}), company_id))
+    members = {r[0] for r in cur.fetchall()}
+
+    rows = [r for r in rows if r[0] in members]
+    if not rows:
+        return set()
+
+    user_ids, dates, statuses, remarks, leave_ids = (list(c) for c in zip(*rows))
+
+    cur.execute(UPSERT_ATTENDANCE_SQL, (
+        user_ids, dates, statuses, remarks, leave_ids,
+        company_id,
+        company_id, marked_by,
+        company_id,
+        company_id, company_id
     ))
 
+    return {(r[0], r[1]) for r in cur.fetchall()}
+
+# A day's total_active is the headcount when its row was created; user
+# status changes move it for today and later only (adjust_active_headcount).
+# A rebuild recounts it per date: users created by the end of that day
+# whose status then was active. Status spans come from user_status_history;
+# a user with no recorded change has held their current status throughout.
+REBUILD_ATTENDANCE_DAILY_SQL = """
+    WITH changes AS (
+        SELECT
+            h.user_id,
+            h.changed_at AS since,
+            h.status,
+            h.id AS ord,
+            first_value(h.previous_status) OVER (
+                PARTITION BY h.user_id ORDER BY h.changed_at, h.id
+            ) AS initial_status
+        FROM user_status_history h
+        WHERE h.company_id = %s
+    ),
+    events AS (
+        SELECT
+            u.id AS user_id,
+            COALESCE(u.created_at, '-infinity') AS since,
+            COALESCE(
+                (SELECT c.initial_status FROM changes c WHERE c.user_id = u.id LIMIT 1),
+                u.status
+            ) AS status,
+            0 AS ord
+        FROM users u
+        WHERE u.company_id = %s
+
+        UNION ALL
+
+        SELECT user_id, since, status, ord
+        FROM changes
+    ),
+    active_spans AS (
+        SELECT since, until
+        FROM (
+            SELECT
+                status,
+                since,
+                lead(since) OVER (PARTITION BY user_id ORDER BY since, ord) AS until
+            FROM events
+        ) e
+        WHERE status = 'active'
+    )
+    INSERT INTO attendance_daily (company_id, date, present, absent, leave, total_active)
+    SELECT
+        a.company_id,
+        a.date,
+        COUNT(*) FILTER (WHERE a.status = 'Present'),
+        COUNT(*) FILTER (WHERE a.status = 'Absent'),
+        COUNT(*) FILTER (WHERE a.status = 'Leave'),
+        (
+            SELECT COUNT(*)
+            FROM active_spans s
+            WHERE s.since < a.date + 1
+              AND (s.until IS NULL OR s.until >= a.date + 1)
+        )
+    FROM attendance a
+    WHERE a.company_id = %s
+    GROUP BY a.company_id, a.date
+"""
+
+def adjust_active_headcount(cur, company_id, delta):
+    cur.execute("""
+        UPDATE attendance_daily
+        SET total_active = total_active + %s
+        WHERE company_id = %s AND date >= CURRENT_DATE
+    """, (delta, company_id))
+
+REBUILD_ATTENDANCE_MONTHLY_SQL = """
+    INSERT INTO attendance_monthly (company_id, user_id, month, present, absent, leave)
+    SELECT
+        company_id,
+        user_id,
+        date_trunc('month', date)::date,
+        COUNT(*) FILTER (WHERE status = 'Present'),
+        COUNT(*) FILTER (WHERE status = 'Absent'),
+        COUNT(*) FILTER (WHERE status = 'Leave')
+    FROM attendance
+    WHERE company_id = %s
+    GROUP BY company_id, user_id, date_trunc('month', date)
+"""
+
+def month_range(month):
+    """'YYYY-MM' -> [first day, first day of the next month)."""
+    try:
+        start = datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+
+    return start, date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+@app.post("/company/attendance")
+@query_budget(3)
+def mark_attendance(data: MarkAttendance, current=Depends(get_current_user), conn=Depends(get_db)):
+    if data.status not in ATTENDANCE_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid attendance status")
+
+    cur = conn.cursor()
+
+    written = upsert_attendance(
+        cur,
+        current["company_id"],
+        current["user_id"],
+        [(data.user_id, data.date, data.status, data.remarks, None)]
+    )
+
+    if not written:
+        cur.close()
+        raise HTTPException(status_code=404, detail="User not found")
+
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Attendance updated"}
 
+@app.post("/company/attendance/bulk")
+@query_budget(3)
+def mark_attendance_bulk(data: BulkAttendance, current=Depends(get_current_user), conn=Depends(get_db)):
+    """
+    Mark a whole day in one statement. Every entry gets a result:
+    marked, unknown_user, invalid_status, or superseded when a later
+    entry in the same request targets the same user.
+    """
+    if len(data.entries) > ATTENDANCE_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {ATTENDANCE_BATCH_MAX} entries per request"
+        )
+
+    results = [None] * len(data.entries)
+    latest = {}
+
+    for i, entry in enumerate(data.entries):
+        if entry.status not in ATTENDANCE_STATUSES:
+            results[i] = "invalid_status"
+            continue
+
+        if entry.user_id in latest:
+            results[latest[entry.user_id]] = "superseded"
+        latest[entry.user_id] = i
+
+    cur = conn.cursor()
+
+    written = upsert_attendance(
+        cur,
+        current["company_id"],
+        current["user_id"],
+        [
+            (user_id, data.date, data.entries[i].status, data.entries[i].remarks, None)
+            for user_id, i in latest.items()
+        ]
+    )
+
+    conn.commit()
+    cur.close()
+
+    for user_id, i in latest.items():
+        results[i] = "marked" if (user_id, data.date) in written else "unknown_user"
+
+    return {
+        "date": data.date,
+        "marked": len(written),
+        "results": [
+            {"user_id": entry.user_id, "result": result}
+            for entry, result in zip(data.entries, results)
+        ]
+    }
+
+ATTENDANCE_DAILY_SQL = """
+    SELECT present, absent, leave, total_active
+    FROM attendance_daily
+    WHERE company_id = %s AND date = %s
+"""
+
+ACTIVE_USERS_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM users
+    WHERE company_id = %s AND status = 'active'
+"""
+
 @app.get("/company/attendance/summary")
-def attendance_summary(date: date, current=Depends(get_current_user)):
-    conn = get_db()
+@query_budget(4)
+def attendance_summary(date: date, current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT status, COUNT(*)
-        FROM attendance
-        WHERE company_id = %s AND date = %s
-        GROUP BY status
-    """, (current["company_id"], date))
+    cur.execute(ATTENDANCE_DAILY_SQL, (current["company_id"], date))
+    row = cur.fetchone()
+
+    # Nothing marked that day yet: no counters row, current headcount
+    if row is None:
+        cur.execute(ACTIVE_USERS_COUNT_SQL, (current["company_id"],))
+        row = (0, 0, 0, cur.fetchone()[0])
+
+    bitmap = working_calendar.year(cur, current["company_id"], date.year)
 
-    counts = {r[0]: r[1] for r in cur.fetchall()}
+    cur.close()
+
+    return {
+        "present": row[0],
+        "absent": row[1],
+        "leave": row[2],
+        "total_employees": row[3],
+        "working_day": is_working_day(bitmap, date)
+    }
+
+@app.post("/company/attendance/rollups/rebuild")
+def rebuild_attendance_rollups(current=Depends(get_current_user), conn=Depends(get_db)):
+    """Recompute this company's attendance_monthly / attendance_daily rows."""
+    if not current["is_company_admin"]:
+        raise HTTPException(status_code=403)
+
+    cur = conn.cursor()
 
+    # Same locks as upsert_attendance, so no marking runs half-counted
     cur.execute("""
-        SELECT COUNT(*)
+        SELECT id
         FROM users
-        WHERE company_id = %s AND status = 'active'
+        WHERE company_id = %s
+        ORDER BY id
+        FOR NO KEY UPDATE
     """, (current["company_id"],))
 
-    total = cur.fetchone()[0]
+    cur.execute(
+        "DELETE FROM attendance_monthly WHERE company_id = %s",
+        (current["company_id"],)
+    )
+    cur.execute(REBUILD_ATTENDANCE_MONTHLY_SQL, (current["company_id"],))
+    monthly = cur.rowcount
+
+    cur.execute(
+        "DELETE FROM attendance_daily WHERE company_id = %s",
+        (current["company_id"],)
+    )
+    cur.execute(
+        REBUILD_ATTENDANCE_DAILY_SQL,
+        (current["company_id"], current["company_id"], current["company_id"])
+    )
+    daily = cur.rowcount
 
+    conn.commit()
     cur.close()
-    conn.close()
 
-    return {
-        "present": counts.get("Present", 0),
-        "absent": counts.get("Absent", 0),
-        "leave": counts.get("Leave", 0),
-        "total_employees": total
-    }
+    return {"attendance_monthly": monthly, "attendance_daily": daily}
+
+# One row per employee; the lateral subquery walks that user's slice of
+# attendance_company_id_user_id_date_key, so rows come out already
+# grouped and nothing is sorted or buffered server-side.
+ATTENDANCE_EXPORT_SQL = """
+    SELECT u.emp_id, u.name, a.offsets, a.statuses
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT
+            array_agg(date - %s) AS offsets,
+            array_agg(status) AS statuses
+        FROM attendance
+        WHERE company_id = u.company_id
+          AND user_id = u.id
+          AND date >= %s
+          AND date < %s
+    ) a ON TRUE
+    WHERE u.company_id = %s
+    ORDER BY u.emp_id
+"""
+
+def attendance_matrix_rows(conn, company_id, start, days):
+    """
+    Yield (emp_id, name, [status or None per day]) from a named cursor on
+    the request's connection, EXPORT_FETCH_ROWS at a time. get_db only
+    hands that connection back to the pool once the response has been
+    sent (FastAPI runs the exit code of yield dependencies after
+    streaming bodies), so an export holds one connection, not two. The
+    cursor is closed and its transaction ended however the stream stops.
+    """
+    cur = conn.cursor(name="attendance_export")
+    cur.itersize = EXPORT_FETCH_ROWS
+
+    try:
+        cur.execute(ATTENDANCE_EXPORT_SQL, (
+            start, start, start + timedelta(days=days), company_id
+        ))
+
+        for emp_id, name, offsets, statuses in cur:
+            cells = [None] * days
+            for offset, status in zip(offsets or (), statuses or ()):
+                cells[offset] = status
+            yield emp_id, name, cells
+    finally:
+        cur.close()
+        conn.rollback()
+
+def stream_attendance_csv(rows, start, days):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    writer.writerow(
+        ["emp_id", "name"]
+        + [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    )
+
+    for emp_id, name, cells in rows:
+        writer.writerow([emp_id, name] + [c or "" for c in cells])
+
+        if buf.tell() >= 65536:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue()
+
+def stream_attendance_json(rows, start, days):
+    header = json.dumps({
+        "start": start.isoformat(),
+        "days": [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    })
+    yield header[:-1] + ', "employees": ['
+
+    separator = ""
+    for emp_id, name, cells in rows:
+        yield separator + json.dumps({"emp_id": emp_id, "name": name, "statuses": cells})
+        separator = ","
+
+    yield "]}"
+
+@app.get("/company/attendance/export")
+def export_attendance(
+    date_from: date,
+    date_to: date,
+    format: str = "csv",
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Company x day attendance matrix for date_from..date_to (inclusive),
+    streamed as CSV or JSON. Memory stays flat in the number of employees.
+    """
+    if not current["is_company_admin"] and "HR" not in get_user_roles(conn, current["user_id"]):
+        raise HTTPException(status_code=403)
+
+    if format not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="format must be csv or json")
+
+    days = (date_to - date_from).days + 1
+    if days < 1 or days > EXPORT_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range must cover 1 to {EXPORT_MAX_DAYS} days"
+        )
+
+    rows = attendance_matrix_rows(conn, current["company_id"], date_from, days)
+    filename = f"attendance_{date_from}_{date_to}.{format}"
+
+    if format == "csv":
+        body, media_type = stream_attendance_csv(rows, date_from, days), "text/csv"
+    else:
+        body, media_type = stream_attendance_json(rows, date_from, days), "application/json"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/company/attendance/analytics")
+@query_budget(4)
+def attendance_analytics_report(
+    date_from: date,
+    date_to: date,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Attendance rates per employee and team, streaks, absence-pattern
+    anomalies and a weekday heatmap for date_from..date_to (inclusive).
+    """
+    if not current["is_company_admin"] and "HR" not in get_user_roles(conn, current["user_id"]):
+        raise HTTPException(status_code=403)
+
+    days = (date_to - date_from).days + 1
+    if days < 1 or days > ANALYTICS_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range must cover 1 to {ANALYTICS_MAX_DAYS} days"
+        )
+
+    key = (current["company_id"], date_from, days)
+    result = analytics_cache.get(key)
+
+    if result is None:
+        users, teams, matrix = load_attendance_matrix(
+            conn, current["company_id"], date_from, days
+        )
+        result = attendance_analytics(users, teams, matrix, date_from)
+        analytics_cache.put(key, result)
+
+    return result
 
 @app.get("/company/attendance/user/{user_id}/summary")
+@query_budget(3)
 def employee_attendance_summary(
     user_id: int,
     month: str,   # YYYY-MM
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
+    start, end = month_range(month)
+
     cur = conn.cursor()
 
     cur.execute("""
-        SELECT status, COUNT(*)
-        FROM attendance
+        SELECT present, absent, leave
+        FROM attendance_monthly
         WHERE company_id = %s
           AND user_id = %s
-          AND TO_CHAR(date, 'YYYY-MM') = %s
-        GROUP BY status
-    """, (current["company_id"], user_id, month))
-
-    counts = {r[0]: r[1] for r in cur.fetchall()}
+          AND month = %s
+    """, (current["company_id"], user_id, start))
 
-    present = counts.get("Present", 0)
-    absent = counts.get("Absent", 0)
-    leave = counts.get("Leave", 0)
+    present, absent, leave = cur.fetchone() or (0, 0, 0)
     total = present + absent + leave
 
+    working_days = working_calendar.count(
+        cur, current["company_id"], start, end - timedelta(days=1)
+    )
+
     cur.close()
-    conn.close()
 
     return {
         "present": present,
         "absent": absent,
         "leave": leave,
+        "working_days": working_days,
         "attendance_percentage": round((present / total) * 100, 2) if total else 0
     }
 
 @app.get("/company/attendance/user/{user_id}")
+@query_budget(2)
 def employee_attendance_records(
     user_id: int,
     month: str,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
+    start, end = month_range(month)
+
     cur = conn.cursor()
 
+    # Half-open range: served by attendance_company_id_user_id_date_key
     cur.execute("""
         SELECT date, status, marked_by, marked_at
         FROM attendance
         WHERE company_id = %s
           AND user_id = %s
-          AND TO_CHAR(date, 'YYYY-MM') = %s
+          AND date >= %s
+          AND date < %s
         ORDER BY date DESC
-    """, (current["company_id"], user_id, month))
+    """, (current["company_id"], user_id, start, end))
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -1355,54 +3705,104 @@ def employee_attendance_records(
 @app.post("/company/leaves")
 def apply_leave(
     data: ApplyLeave,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     # Basic validation
     if data.end_date < data.start_date:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=400, detail="Invalid date range")
 
-    # Calculate total days (simple version)
-    total_days = (data.end_date - data.start_date).days + 1
+    # Working days only: weekly offs and holidays are not charged
+    total_days = working_calendar.count(
+        cur, current["company_id"], data.start_date, data.end_date
+    )
+
+    if total_days == 0:
+        cur.close()
+        raise HTTPException(status_code=400, detail="No working days in this range")
 
-    cur.execute("""
-        INSERT INTO leave_requests (
-            company_id,
-            user_id,
-            leave_type,
-            start_date,
-            end_date,
+    # leave_requests_no_overlap rejects a range overlapping the user's own
+    # Pending or Approved leaves; the GiST index makes that one probe
+    try:
+        cur.execute("""
+            INSERT INTO leave_requests (
+                company_id,
+                user_id,
+                leave_type,
+                start_date,
+                end_date,
+                total_days,
+                reason,
+                status
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 'Pending')
+        """, (
+            current["company_id"],
+            current["user_id"],
+            data.leave_type,
+            data.start_date,
+            data.end_date,
             total_days,
-            reason,
-            status
+            data.reason
+        ))
+    except ExclusionViolation:
+        conn.rollback()
+        cur.close()
+        raise HTTPException(
+            status_code=409,
+            detail="Leave overlaps a pending or approved leave"
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, 'Pending')
-    """, (
-        current["company_id"],
-        current["user_id"],
-        data.leave_type,
-        data.start_date,
-        data.end_date,
-        total_days,
-        data.reason
-    ))
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Leave request submitted"}
 
+def leave_list_tail(query, params, date_from, date_to, leave_type, after, limit):
+    """
+    Filters shared by the leave listings plus the keyset tail: newest
+    applied_at first, continuing strictly after the previous page's
+    (applied_at, id). date_from / date_to select leaves overlapping the range.
+    """
+    if date_from:
+        query += " AND lr.end_date >= %s"
+        params.append(date_from)
+
+    if date_to:
+        query += " AND lr.start_date <= %s"
+        params.append(date_to)
+
+    if leave_type:
+        query += " AND lr.leave_type = %s"
+        params.append(leave_type)
+
+    if after:
+        applied_at, leave_id = decode_cursor(after, 2)
+        query += " AND (lr.applied_at, lr.id) < (%s, %s)"
+        params.extend([applied_at, leave_id])
+
+    query += " ORDER BY lr.applied_at DESC, lr.id DESC LIMIT %s"
+    params.append(page_limit(limit) + 1)
+
+    return query
+
 @app.get("/company/leaves/me")
-def get_my_leaves(current=Depends(get_current_user)):
-    conn = get_db()
+def get_my_leaves(
+    status: Optional[str] = None,
+    leave_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
     cur = conn.cursor()
 
-    cur.execute("""
+    query = """
         SELECT
             lr.id,
             lr.leave_type,
@@ -1418,14 +3818,20 @@ def get_my_leaves(current=Depends(get_current_user)):
         LEFT JOIN users u ON u.id = lr.reviewed_by
         WHERE lr.company_id = %s
         AND lr.user_id = %s
-        ORDER BY lr.applied_at DESC
-    """, (current["company_id"], current["user_id"]))
-
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    """
+    params = [current["company_id"], current["user_id"]]
 
-    return [
+    if status:
+        query += " AND lr.status = %s"
+        params.append(status)
+
+    query = leave_list_tail(query, params, date_from, date_to, leave_type, after, limit)
+
+    cur.execute(query, params)
+    rows, next_cursor = keyset_page(cur.fetchall(), limit, 6, 0)
+    cur.close()
+
+    items = [
         {
             "id": r[0],
             "leave_type": r[1],
@@ -1441,243 +3847,1101 @@ def get_my_leaves(current=Depends(get_current_user)):
         for r in rows
     ]
 
-@app.put("/company/leaves/{leave_id}/cancel")
-def cancel_my_leave(
-    leave_id: int,
-    current=Depends(get_current_user)
-):
-    conn = get_db()
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.put("/company/leaves/{leave_id}/cancel")
+def cancel_my_leave(
+    leave_id: int,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Cancel a Pending leave, or an Approved one that has not started yet.
+    The latter drops its Leave marks and credits back the days it was
+    debited; leaves approved before the ledger existed were never debited
+    and get no credit.
+    """
+    cur = conn.cursor()
+
+    # Same lock order as review_pending_leaves: the leave, then the user
+    cur.execute("""
+        SELECT status, leave_type, start_date, end_date, total_days
+        FROM leave_requests
+        WHERE id = %s
+          AND company_id = %s
+          AND user_id = %s
+        FOR UPDATE
+    """, (
+        leave_id,
+        current["company_id"],
+        current["user_id"]
+    ))
+
+    row = cur.fetchone()
+
+    if row is None or not (
+        row[0] == "Pending" or (row[0] == "Approved" and row[2] > date.today())
+    ):
+        cur.close()
+        raise HTTPException(
+            status_code=400,
+            detail="Leave cannot be cancelled"
+        )
+
+    status, leave_type, start_date, end_date, total_days = row
+
+    cur.execute("""
+        UPDATE leave_requests
+        SET status = 'Cancelled'
+        WHERE id = %s
+    """, (leave_id,))
+
+    if status == "Approved":
+        cur.execute(LOCK_ATTENDANCE_USERS_SQL, ([current["user_id"]], current["company_id"]))
+        cur.execute(CLEAR_LEAVE_ATTENDANCE_SQL, (
+            current["company_id"], current["user_id"], start_date, end_date, leave_id,
+            current["company_id"],
+            current["company_id"]
+        ))
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM leave_ledger
+                WHERE leave_request_id = %s
+                  AND entry_type = 'debit'
+            )
+        """, (leave_id,))
+
+        if cur.fetchone()[0]:
+            post_leave_ledger(cur, current["company_id"], current["user_id"], [
+                (current["user_id"], leave_type, "credit", total_days, leave_id, None)
+            ])
+
+    conn.commit()
+    cur.close()
+
+    return {"message": "Leave cancelled"}
+
+@app.get("/company/leaves")
+def get_all_leaves(
+    status: Optional[str] = None,
+    user_id: Optional[int] = None,
+    leave_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    cur = conn.cursor()
+
+    query = """
+        SELECT
+            lr.id,
+            u.id AS user_id,
+            u.emp_id,
+            u.name,
+            lr.leave_type,
+            lr.start_date,
+            lr.end_date,
+            lr.total_days,
+            lr.reason,
+            lr.status,
+            lr.applied_at
+        FROM leave_requests lr
+        JOIN users u ON u.id = lr.user_id
+        WHERE lr.company_id = %s
+    """
+    params = [current["company_id"]]
+
+    if status:
+        query += " AND lr.status = %s"
+        params.append(status)
+
+    if user_id:
+        query += " AND lr.user_id = %s"
+        params.append(user_id)
+
+    query = leave_list_tail(query, params, date_from, date_to, leave_type, after, limit)
+
+    cur.execute(query, params)
+    rows, next_cursor = keyset_page(cur.fetchall(), limit, 10, 0)
+
+    cur.close()
+
+    items = [
+        {
+            "leave_id": r[0],
+            "user_id": r[1],
+            "emp_id": r[2],
+            "name": r[3],
+            "leave_type": r[4],
+            "start_date": r[5],
+            "end_date": r[6],
+            "total_days": r[7],
+            "reason": r[8],
+            "status": r[9],
+            "applied_at": r[10]
+        }
+        for r in rows
+    ]
+
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/company/leaves/calendar")
+@query_budget(2)
+def leave_calendar(
+    date_from: date,
+    date_to: date,
+    include_pending: bool = False,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Who is off between date_from and date_to (inclusive), by start date.
+    The status predicate repeats leave_requests_no_overlap's so the range
+    test is answered from that GiST index.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+
+    query = """
+        SELECT
+            lr.id,
+            lr.user_id,
+            u.emp_id,
+            u.name,
+            lr.leave_type,
+            lr.start_date,
+            lr.end_date,
+            lr.status
+        FROM leave_requests lr
+        JOIN users u ON u.id = lr.user_id
+        WHERE lr.company_id = %s
+          AND lr.period && daterange(%s, %s, '[]')
+          AND lr.status IN ('Pending', 'Approved')
+    """
+    params = [current["company_id"], date_from, date_to]
+
+    if not include_pending:
+        query += " AND lr.status = 'Approved'"
+
+    if after:
+        start_date, leave_id = decode_cursor(after, 2)
+        query += " AND (lr.start_date, lr.id) > (%s, %s)"
+        params.extend([start_date, leave_id])
+
+    query += " ORDER BY lr.start_date, lr.id LIMIT %s"
+    params.append(page_limit(limit) + 1)
+
+    cur = conn.cursor()
+    cur.execute(query, params)
+    rows, next_cursor = keyset_page(cur.fetchall(), limit, 5, 0)
+    cur.close()
+
+    items = [
+        {
+            "id": r[0],
+            "user_id": r[1],
+            "emp_id": r[2],
+            "name": r[3],
+            "leave_type": r[4],
+            "start_date": r[5],
+            "end_date": r[6],
+            "status": r[7]
+        }
+        for r in rows
+    ]
+
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/company/leaves/{leave_id}")
+def get_leave_detail(
+    leave_id: int,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT
+            lr.id,
+            u.id AS user_id,
+            u.emp_id,
+            u.name,
+            lr.leave_type,
+            lr.start_date,
+            lr.end_date,
+            lr.total_days,
+            lr.reason,
+            lr.status,
+            lr.applied_at,
+            lr.reviewed_by,
+            lr.reviewed_at,
+            lr.review_notes
+        FROM leave_requests lr
+        JOIN users u ON u.id = lr.user_id
+        WHERE lr.id = %s
+          AND lr.company_id = %s
+    """, (leave_id, current["company_id"]))
+
+    row = cur.fetchone()
+
+    if not row:
+        cur.close()
+        raise HTTPException(status_code=404, detail="Leave request not found")
+
+    cur.close()
+
+    return {
+        "leave_id": row[0],
+        "user_id": row[1],
+        "emp_id": row[2],
+        "name": row[3],
+        "leave_type": row[4],
+        "start_date": row[5],
+        "end_date": row[6],
+        "total_days": row[7],
+        "reason": row[8],
+        "status": row[9],
+        "applied_at": row[10],
+        "reviewed_by": row[11],
+        "reviewed_at": row[12],
+        "review_notes": row[13]
+    }
+
+# Balances live in leave_balances, one row per (user, leave_type), and only
+# ever move by the amounts posted to leave_ledger in the same statement, so
+# reading a balance never touches history. Callers hold the users' row
+# locks (LOCK_ATTENDANCE_USERS_SQL) so concurrent postings queue per user.
+POST_LEAVE_LEDGER_SQL = """
+    WITH input AS (
+        SELECT *
+        FROM unnest(
+            %s::int[], %s::text[], %s::text[], %s::numeric[], %s::int[], %s::text[]
+        ) WITH ORDINALITY AS e(user_id, leave_type, entry_type, amount, leave_request_id, note, ord)
+    ),
+    balances AS (
+        INSERT INTO leave_balances AS b (company_id, user_id, leave_type, balance)
+        SELECT %s, user_id, leave_type, SUM(amount)
+        FROM input
+        GROUP BY user_id, leave_type
+        ON CONFLICT (user_id, leave_type)
+        DO UPDATE SET
+            balance = b.balance + EXCLUDED.balance,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING user_id, leave_type, balance
+    )
+    INSERT INTO leave_ledger
+        (company_id, user_id, leave_type, entry_type, amount, balance_after,
+         leave_request_id, note, created_by)
+    SELECT
+        %s,
+        i.user_id,
+        i.leave_type,
+        i.entry_type,
+        i.amount,
+        -- the new balance less whatever this batch posts after this entry
+        b.balance - COALESCE(SUM(i.amount) OVER (
+            PARTITION BY i.user_id, i.leave_type
+            ORDER BY i.ord
+            ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+        ), 0),
+        i.leave_request_id,
+        i.note,
+        %s
+    FROM input i
+    JOIN balances b ON b.user_id = i.user_id AND b.leave_type = i.leave_type
+    ORDER BY i.ord
+"""
+
+def post_leave_ledger(cur, company_id, created_by, entries):
+    """
+    Post (user_id, leave_type, entry_type, amount, leave_request_id, note)
+    entries and move the matching leave_balances rows by the same amounts.
+    """
+    if not entries:
+        return
+
+    user_ids, leave_types, entry_types, amounts, leave_ids, notes = (
+        list(c) for c in zip(*entries)
+    )
+
+    cur.execute(POST_LEAVE_LEDGER_SQL, (
+        user_ids, leave_types, entry_types, amounts, leave_ids, notes,
+        company_id,
+        company_id, created_by
+    ))
+
+# Effective policy per active user and leave type (a user's own policy
+# beats the company default), credited once per elapsed period since
+# accrued_through; periods missed by earlier runs are caught up. With no
+# accrued_through yet, crediting starts at the later of the user joining
+# and the policy being created.
+ACCRUE_LEAVE_SQL = """
+    WITH policies AS (
+        SELECT DISTINCT ON (u.id, p.leave_type)
+            u.id AS user_id,
+            p.leave_type,
+            p.annual_days,
+            p.accrual_period,
+            GREATEST(u.created_at, p.created_at) AS starts_at
+        FROM users u
+        JOIN leave_policies p
+          ON p.company_id = u.company_id
+         AND (p.user_id IS NULL OR p.user_id = u.id)
+        WHERE u.company_id = %s
+          AND u.status = 'active'
+        ORDER BY u.id, p.leave_type, p.user_id NULLS LAST
+    ),
+    due AS (
+        SELECT
+            p.user_id,
+            p.leave_type,
+            p.accrual_period,
+            date_trunc(p.accrual_period, %s::date)::date AS period,
+            -- the last period already credited
+            COALESCE(
+                b.accrued_through,
+                (
+                    date_trunc(p.accrual_period, COALESCE(p.starts_at, %s::date))
+                    - ('1 ' || p.accrual_period)::interval
+                )::date
+            ) AS since,
+            p.annual_days / CASE p.accrual_period WHEN 'year' THEN 1 ELSE 12 END AS per_period
+        FROM policies p
+        LEFT JOIN leave_balances b
+          ON b.user_id = p.user_id
+         AND b.leave_type = p.leave_type
+    ),
+    credits AS (
+        SELECT
+            user_id,
+            leave_type,
+            period,
+            round((per_period * CASE accrual_period
+                WHEN 'year' THEN
+                    date_part('year', period) - date_part('year', since)
+                ELSE
+                    (date_part('year', period) - date_part('year', since)) * 12
+                    + date_part('month', period) - date_part('month', since)
+            END)::numeric, 2) AS amount
+        FROM due
+        WHERE since < period
+    ),
+    balances AS (
+        INSERT INTO leave_balances AS b
+            (company_id, user_id, leave_type, balance, accrued_through)
+        SELECT %s, user_id, leave_type, amount, period
+        FROM credits
+        ON CONFLICT (user_id, leave_type)
+        DO UPDATE SET
+            balance = b.balance + EXCLUDED.balance,
+            accrued_through = EXCLUDED.accrued_through,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING user_id, leave_type, balance
+    )
+    INSERT INTO leave_ledger
+        (company_id, user_id, leave_type, entry_type, amount, balance_after, note, created_by)
+    SELECT %s, c.user_id, c.leave_type, 'accrual', c.amount, b.balance, c.period::text, %s
+    FROM credits c
+    JOIN balances b ON b.user_id = c.user_id AND b.leave_type = c.leave_type
+"""
+
+# Undo the Leave marks an approved leave wrote, rollups included. Days
+# marked by hand since then no longer carry its leave_request_id and stay.
+CLEAR_LEAVE_ATTENDANCE_SQL = """
+    WITH removed AS (
+        DELETE FROM attendance
+        WHERE company_id = %s
+          AND user_id = %s
+          AND date BETWEEN %s AND %s
+          AND leave_request_id = %s
+          AND status = 'Leave'
+        RETURNING user_id, date
+    ),
+    monthly AS (
+        UPDATE attendance_monthly m
+        SET leave = m.leave - r.days
+        FROM (
+            SELECT user_id, date_trunc('month', date)::date AS month, COUNT(*) AS days
+            FROM removed
+            GROUP BY user_id, date_trunc('month', date)
+        ) r
+        WHERE m.company_id = %s
+          AND m.user_id = r.user_id
+          AND m.month = r.month
+    ),
+    daily AS (
+        UPDATE attendance_daily d
+        SET leave = d.leave - r.days
+        FROM (
+            SELECT date, COUNT(*) AS days
+            FROM removed
+            GROUP BY date
+        ) r
+        WHERE d.company_id = %s
+          AND d.date = r.date
+    )
+    SELECT COUNT(*)
+    FROM removed
+"""
+
+# Pending leaves among the ids whose approval would take a balance below
+# zero under the user's effective policy. Leave types with no policy are
+# not metered and never overdraw, so tenants that never set one up keep
+# approving as before. Leaves of one user and type reviewed together are
+# judged on their combined days. Locks the leaves, then their users
+# (cancel_my_leave's order), so the balances read here cannot move before
+# the debit.
+OVERDRAWN_LEAVES_SQL = """
+    WITH pending AS (
+        SELECT id, user_id, leave_type, total_days
+        FROM leave_requests
+        WHERE id = ANY(%s)
+          AND company_id = %s
+          AND status = 'Pending'
+        ORDER BY id
+        FOR UPDATE
+    ),
+    locked AS (
+        SELECT id
+        FROM users
+        WHERE id IN (SELECT user_id FROM pending)
+        ORDER BY id
+        FOR NO KEY UPDATE
+    ),
+    requested AS (
+        SELECT
+            p.id,
+            p.user_id,
+            p.leave_type,
+            SUM(p.total_days) OVER (PARTITION BY p.user_id, p.leave_type) AS days
+        FROM pending p
+        JOIN locked l ON l.id = p.user_id
+    )
+    SELECT r.id
+    FROM requested r
+    LEFT JOIN LATERAL (
+        SELECT lp.allow_negative
+        FROM leave_policies lp
+        WHERE lp.company_id = %s
+          AND lp.leave_type = r.leave_type
+          AND (lp.user_id IS NULL OR lp.user_id = r.user_id)
+        ORDER BY lp.user_id NULLS LAST
+        LIMIT 1
+    ) p ON TRUE
+    LEFT JOIN leave_balances b
+      ON b.user_id = r.user_id
+     AND b.leave_type = r.leave_type
+    WHERE NOT COALESCE(p.allow_negative, TRUE)
+      AND COALESCE(b.balance, 0) < r.days
+"""
+
+def review_pending_leaves(cur, company_id, reviewer_id, leave_ids, status, review_notes):
+    """
+    Review whichever of `leave_ids` are still Pending. Returns the reviewed
+    ids and, for approvals, the ids left Pending because they would
+    overdraw the balance (OVERDRAWN_LEAVES_SQL).
+
+    Approval marks every covered day as Leave with one upsert_attendance
+    call, skipping weekly offs and holidays; days shared by overlapping
+    leaves of the same user are written once. Each approved leave is
+    debited from its balance by total_days.
+    """
+    overdrawn = []
+
+    if status == "Approved":
+        cur.execute(OVERDRAWN_LEAVES_SQL, (leave_ids, company_id, company_id))
+        overdrawn = [r[0] for r in cur.fetchall()]
+        leave_ids = [i for i in leave_ids if i not in overdrawn]
+
+    cur.execute("""
+        UPDATE leave_requests
+        SET
+            status = %s,
+            reviewed_by = %s,
+            reviewed_at = CURRENT_TIMESTAMP,
+            review_notes = %s
+        WHERE id = ANY(%s)
+          AND company_id = %s
+          AND status = 'Pending'
+        RETURNING id, user_id, start_date, end_date, leave_type, total_days
+    """, (status, reviewer_id, review_notes, leave_ids, company_id))
+
+    reviewed = cur.fetchall()
+
+    if status == "Approved":
+        days = {
+            (user_id, day): leave_id
+            for leave_id, user_id, start_date, end_date, _, _ in reviewed
+            for day in working_calendar.working_days(cur, company_id, start_date, end_date)
+        }
+        upsert_attendance(
+            cur,
+            company_id,
+            reviewer_id,
+            [
+                (user_id, day, "Leave", None, leave_id)
+                for (user_id, day), leave_id in days.items()
+            ]
+        )
+        post_leave_ledger(cur, company_id, reviewer_id, [
+            (user_id, leave_type, "debit", -total_days, leave_id, None)
+            for leave_id, user_id, _, _, leave_type, total_days in reviewed
+        ])
+
+    return [r[0] for r in reviewed], overdrawn
+
+@app.put("/company/leaves/{leave_id}/review")
+@query_budget(7)
+def review_leave(
+    leave_id: int,
+    data: ReviewLeave,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    if data.status not in ("Approved", "Rejected"):
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    cur = conn.cursor()
+
+    # Only a Pending leave is updated, so concurrent reviews cannot both win
+    reviewed, overdrawn = review_pending_leaves(
+        cur,
+        current["company_id"],
+        current["user_id"],
+        [leave_id],
+        data.status,
+        data.review_notes
+    )
+
+    if overdrawn:
+        cur.close()
+        raise HTTPException(status_code=400, detail="Insufficient leave balance")
+
+    if not reviewed:
+        cur.execute("""
+            SELECT 1
+            FROM leave_requests
+            WHERE id = %s
+              AND company_id = %s
+        """, (leave_id, current["company_id"]))
+
+        exists = cur.fetchone()
+        cur.close()
+
+        if not exists:
+            raise HTTPException(status_code=404, detail="Leave not found")
+
+        raise HTTPException(
+            status_code=400,
+            detail="Leave already reviewed"
+        )
+
+    conn.commit()
+    cur.close()
+
+    return {"message": f"Leave {data.status.lower()} successfully"}
+
+@app.post("/company/leaves/review")
+@query_budget(8)
+def review_leaves_bulk(
+    data: BulkReviewLeave,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """
+    Approve or reject many leaves in one transaction. Every id gets a
+    result: approved / rejected, insufficient_balance, already_reviewed
+    or not_found.
+    """
+    if data.status not in ("Approved", "Rejected"):
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    if len(data.leave_ids) > PAGE_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {PAGE_MAX} leaves per request"
+        )
+
+    cur = conn.cursor()
+
+    reviewed, overdrawn = review_pending_leaves(
+        cur,
+        current["company_id"],
+        current["user_id"],
+        list(set(data.leave_ids)),
+        data.status,
+        data.review_notes
+    )
+    reviewed, overdrawn = set(reviewed), set(overdrawn)
+
+    existing = set()
+    missed = [i for i in set(data.leave_ids) if i not in reviewed and i not in overdrawn]
+    if missed:
+        cur.execute("""
+            SELECT id
+            FROM leave_requests
+            WHERE id = ANY(%s)
+              AND company_id = %s
+        """, (missed, current["company_id"]))
+        existing = {r[0] for r in cur.fetchall()}
+
+    conn.commit()
+    cur.close()
+
+    def result(leave_id):
+        if leave_id in reviewed:
+            return data.status.lower()
+        if leave_id in overdrawn:
+            return "insufficient_balance"
+        if leave_id in existing:
+            return "already_reviewed"
+        return "not_found"
+
+    return {
+        "reviewed": len(reviewed),
+        "results": [
+            {"leave_id": leave_id, "result": result(leave_id)}
+            for leave_id in data.leave_ids
+        ]
+    }
+
+def require_hr(conn, current):
+    if not current["is_company_admin"] and "HR" not in get_user_roles(conn, current["user_id"]):
+        raise HTTPException(status_code=403)
+
+@app.get("/company/leave-balances")
+@query_budget(3)
+def get_leave_balances(
+    user_id: Optional[int] = None,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """One row per leave type; another user's balances need admin or HR."""
+    if user_id is None:
+        user_id = current["user_id"]
+    elif user_id != current["user_id"]:
+        require_hr(conn, current)
+
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT leave_type, balance, accrued_through, updated_at
+        FROM leave_balances
+        WHERE user_id = %s
+          AND company_id = %s
+        ORDER BY leave_type
+    """, (user_id, current["company_id"]))
+
+    rows = cur.fetchall()
+    cur.close()
+
+    return [
+        {
+            "leave_type": r[0],
+            "balance": r[1],
+            "accrued_through": r[2],
+            "updated_at": r[3]
+        }
+        for r in rows
+    ]
+
+@app.get("/company/leave-ledger")
+@query_budget(3)
+def get_leave_ledger(
+    user_id: Optional[int] = None,
+    leave_type: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """Newest entries first, keyset-paginated on id."""
+    if user_id is None:
+        user_id = current["user_id"]
+    elif user_id != current["user_id"]:
+        require_hr(conn, current)
+
+    query = """
+        SELECT
+            id,
+            leave_type,
+            entry_type,
+            amount,
+            balance_after,
+            leave_request_id,
+            note,
+            created_at
+        FROM leave_ledger
+        WHERE user_id = %s
+          AND company_id = %s
+    """
+    params = [user_id, current["company_id"]]
+
+    if leave_type:
+        query += " AND leave_type = %s"
+        params.append(leave_type)
+
+    if after:
+        (last_id,) = decode_cursor(after, 1)
+        query += " AND id < %s"
+        params.append(last_id)
+
+    query += " ORDER BY id DESC LIMIT %s"
+    params.append(page_limit(limit) + 1)
+
+    cur = conn.cursor()
+    cur.execute(query, params)
+    rows, next_cursor = keyset_page(cur.fetchall(), limit, 0)
+    cur.close()
+
+    items = [
+        {
+            "id": r[0],
+            "leave_type": r[1],
+            "entry_type": r[2],
+            "amount": r[3],
+            "balance_after": r[4],
+            "leave_request_id": r[5],
+            "note": r[6],
+            "created_at": r[7]
+        }
+        for r in rows
+    ]
+
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/company/leave-policies")
+def get_leave_policies(current=Depends(get_current_user), conn=Depends(get_db)):
+    require_hr(conn, current)
+
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT p.id, p.leave_type, p.annual_days, p.accrual_period, p.user_id, u.name,
+               p.allow_negative
+        FROM leave_policies p
+        LEFT JOIN users u ON u.id = p.user_id
+        WHERE p.company_id = %s
+        ORDER BY p.leave_type, p.user_id NULLS FIRST
+    """, (current["company_id"],))
+
+    rows = cur.fetchall()
+    cur.close()
+
+    return [
+        {
+            "id": r[0],
+            "leave_type": r[1],
+            "annual_days": r[2],
+            "accrual_period": r[3],
+            "user_id": r[4],
+            "user_name": r[5],
+            "allow_negative": r[6]
+        }
+        for r in rows
+    ]
+
+@app.put("/company/leave-policies")
+def upsert_leave_policy(
+    data: LeavePolicyUpsert,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """Company default for a leave type, or a per-user override with user_id."""
+    require_hr(conn, current)
+
+    if data.accrual_period not in ("month", "year"):
+        raise HTTPException(status_code=400, detail="accrual_period must be month or year")
+
+    if data.annual_days < 0:
+        raise HTTPException(status_code=400, detail="annual_days cannot be negative")
+
+    cur = conn.cursor()
+
+    if data.user_id is None:
+        cur.execute("""
+            INSERT INTO leave_policies
+                (company_id, leave_type, annual_days, accrual_period, allow_negative)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (company_id, leave_type) WHERE user_id IS NULL
+            DO UPDATE SET
+                annual_days = EXCLUDED.annual_days,
+                accrual_period = EXCLUDED.accrual_period,
+                allow_negative = EXCLUDED.allow_negative
+            RETURNING id
+        """, (
+            current["company_id"], data.leave_type, data.annual_days,
+            data.accrual_period, data.allow_negative
+        ))
+    else:
+        cur.execute("""
+            INSERT INTO leave_policies
+                (company_id, user_id, leave_type, annual_days, accrual_period, allow_negative)
+            SELECT company_id, id, %s, %s, %s, %s
+            FROM users
+            WHERE id = %s AND company_id = %s
+            ON CONFLICT (company_id, user_id, leave_type) WHERE user_id IS NOT NULL
+            DO UPDATE SET
+                annual_days = EXCLUDED.annual_days,
+                accrual_period = EXCLUDED.accrual_period,
+                allow_negative = EXCLUDED.allow_negative
+            RETURNING id
+        """, (
+            data.leave_type, data.annual_days, data.accrual_period, data.allow_negative,
+            data.user_id, current["company_id"]
+        ))
+
+    row = cur.fetchone()
+
+    if row is None:
+        cur.close()
+        raise HTTPException(status_code=404, detail="User not found")
+
+    conn.commit()
+    cur.close()
+
+    return {"id": row[0]}
+
+@app.delete("/company/leave-policies/{policy_id}")
+def delete_leave_policy(policy_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
+    """Stops future accruals; balances and the ledger are left as they are."""
+    require_hr(conn, current)
+
     cur = conn.cursor()
 
     cur.execute("""
-        UPDATE leave_requests
-        SET status = 'Cancelled'
-        WHERE id = %s
-          AND company_id = %s
-          AND user_id = %s
-          AND status = 'Pending'
-    """, (
-        leave_id,
-        current["company_id"],
-        current["user_id"]
-    ))
+        DELETE FROM leave_policies
+        WHERE id = %s AND company_id = %s
+    """, (policy_id, current["company_id"]))
 
     if cur.rowcount == 0:
         cur.close()
-        conn.close()
-        raise HTTPException(
-            status_code=400,
-            detail="Leave cannot be cancelled"
-        )
+        raise HTTPException(status_code=404, detail="Policy not found")
 
     conn.commit()
     cur.close()
-    conn.close()
 
-    return {"message": "Leave cancelled"}
+    return {"message": "Policy deleted"}
 
-@app.get("/company/leaves")
-def get_all_leaves(
-    status: Optional[str] = None,
-    current=Depends(get_current_user)
+@app.post("/company/leave-accruals")
+def run_leave_accruals(
+    data: LeaveAccrualRun,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
+    """
+    Credit every active employee for the periods elapsed up to `period`
+    (YYYY-MM, default this month; later months are clamped to this one).
+    Safe to re-run: a period is credited once.
+    """
+    require_hr(conn, current)
+
+    period = date.today()
+    if data.period:
+        period = min(month_range(data.period)[0], period)
+
     cur = conn.cursor()
 
-    query = """
-        SELECT
-            lr.id,
-            u.id AS user_id,
-            u.emp_id,
-            u.name,
-            lr.leave_type,
-            lr.start_date,
-            lr.end_date,
-            lr.total_days,
-            lr.reason,
-            lr.status,
-            lr.applied_at
-        FROM leave_requests lr
-        JOIN users u ON u.id = lr.user_id
-        WHERE lr.company_id = %s
-    """
-    params = [current["company_id"]]
+    cur.execute("""
+        SELECT id
+        FROM users
+        WHERE company_id = %s
+        ORDER BY id
+        FOR NO KEY UPDATE
+    """, (current["company_id"],))
 
-    if status:
-        query += " AND lr.status = %s"
-        params.append(status)
+    cur.execute(ACCRUE_LEAVE_SQL, (
+        current["company_id"],
+        period, period,
+        current["company_id"],
+        current["company_id"], current["user_id"]
+    ))
+    credited = cur.rowcount
 
-    query += " ORDER BY lr.applied_at DESC"
+    conn.commit()
+    cur.close()
 
-    cur.execute(query, params)
-    rows = cur.fetchall()
+    return {"period": period.strftime("%Y-%m"), "credited": credited}
 
+@app.post("/company/leave-adjustments")
+@query_budget(4)
+def adjust_leave_balance(
+    data: LeaveAdjustment,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    """Manual +/- correction, e.g. opening balances or carried-over days."""
+    require_hr(conn, current)
+
+    if data.amount == 0:
+        raise HTTPException(status_code=400, detail="amount cannot be zero")
+
+    cur = conn.cursor()
+
+    cur.execute(LOCK_ATTENDANCE_USERS_SQL, ([data.user_id], current["company_id"]))
+
+    if cur.fetchone() is None:
+        cur.close()
+        raise HTTPException(status_code=404, detail="User not found")
+
+    post_leave_ledger(cur, current["company_id"], current["user_id"], [
+        (data.user_id, data.leave_type, "adjustment", data.amount, None, data.note)
+    ])
+
+    conn.commit()
     cur.close()
-    conn.close()
 
-    return [
-        {
-            "leave_id": r[0],
-            "user_id": r[1],
-            "emp_id": r[2],
-            "name": r[3],
-            "leave_type": r[4],
-            "start_date": r[5],
-            "end_date": r[6],
-            "total_days": r[7],
-            "reason": r[8],
-            "status": r[9],
-            "applied_at": r[10]
-        }
-        for r in rows
-    ]
+    return {"message": "Balance adjusted"}
 
-@app.get("/company/leaves/{leave_id}")
-def get_leave_detail(
-    leave_id: int,
-    current=Depends(get_current_user)
+@app.get("/company/calendar")
+@query_budget(4)
+def get_working_calendar(
+    year: Optional[int] = None,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
+    year = year or date.today().year
+
     cur = conn.cursor()
 
     cur.execute("""
-        SELECT
-            lr.id,
-            u.id AS user_id,
-            u.emp_id,
-            u.name,
-            lr.leave_type,
-            lr.start_date,
-            lr.end_date,
-            lr.total_days,
-            lr.reason,
-            lr.status,
-            lr.applied_at,
-            lr.reviewed_by,
-            lr.reviewed_at,
-            lr.review_notes
-        FROM leave_requests lr
-        JOIN users u ON u.id = lr.user_id
-        WHERE lr.id = %s
-          AND lr.company_id = %s
-    """, (leave_id, current["company_id"]))
-
+        SELECT weekly_offs
+        FROM company_calendars
+        WHERE company_id = %s
+    """, (current["company_id"],))
     row = cur.fetchone()
 
-    if not row:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=404, detail="Leave request not found")
+    cur.execute("""
+        SELECT id, date, name
+        FROM company_holidays
+        WHERE company_id = %s
+          AND date >= %s
+          AND date < %s
+        ORDER BY date
+    """, (current["company_id"], date(year, 1, 1), date(year + 1, 1, 1)))
+    holidays = cur.fetchall()
+
+    working_days = working_calendar.count(
+        cur, current["company_id"], date(year, 1, 1), date(year, 12, 31)
+    )
 
     cur.close()
-    conn.close()
 
     return {
-        "leave_id": row[0],
-        "user_id": row[1],
-        "emp_id": row[2],
-        "name": row[3],
-        "leave_type": row[4],
-        "start_date": row[5],
-        "end_date": row[6],
-        "total_days": row[7],
-        "reason": row[8],
-        "status": row[9],
-        "applied_at": row[10],
-        "reviewed_by": row[11],
-        "reviewed_at": row[12],
-        "review_notes": row[13]
+        "year": year,
+        "weekly_offs": row[0] if row else list(DEFAULT_WEEKLY_OFFS),
+        "holidays": [{"id": h[0], "date": h[1], "name": h[2]} for h in holidays],
+        "working_days": working_days
     }
 
-@app.put("/company/leaves/{leave_id}/review")
-def review_leave(
-    leave_id: int,
-    data: ReviewLeave,
-    current=Depends(get_current_user)
+@app.put("/company/calendar/weekly-offs")
+def update_weekly_offs(
+    data: WeeklyOffsUpdate,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    if data.status not in ("Approved", "Rejected"):
-        raise HTTPException(status_code=400, detail="Invalid status")
+    """
+    Applies to leaves applied for or approved from now on; existing
+    requests keep their total_days and attendance marks.
+    """
+    require_hr(conn, current)
+
+    offs = sorted(set(data.weekly_offs))
+    if any(d < 1 or d > 7 for d in offs) or len(offs) == 7:
+        raise HTTPException(
+            status_code=400,
+            detail="weekly_offs must be ISO weekdays (1-7) and leave a working day"
+        )
 
-    conn = get_db()
     cur = conn.cursor()
 
-    # Fetch leave (must be Pending)
     cur.execute("""
-        SELECT user_id, start_date, end_date, status
-        FROM leave_requests
-        WHERE id = %s
-          AND company_id = %s
-    """, (leave_id, current["company_id"]))
+        INSERT INTO company_calendars (company_id, weekly_offs)
+        VALUES (%s, %s::smallint[])
+        ON CONFLICT (company_id)
+        DO UPDATE SET
+            weekly_offs = EXCLUDED.weekly_offs,
+            updated_at = CURRENT_TIMESTAMP
+    """, (current["company_id"], offs))
 
-    row = cur.fetchone()
+    notify_calendar_change(cur, current["company_id"])
 
-    if not row:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=404, detail="Leave not found")
+    conn.commit()
+    cur.close()
 
-    user_id, start_date, end_date, current_status = row
+    working_calendar.discard(current["company_id"])
 
-    if current_status != "Pending":
-        cur.close()
-        conn.close()
-        raise HTTPException(
-            status_code=400,
-            detail="Leave already reviewed"
-        )
+    return {"weekly_offs": offs}
+
+@app.post("/company/holidays")
+def add_holiday(
+    data: HolidayCreate,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    require_hr(conn, current)
+
+    cur = conn.cursor()
 
-    # Update leave status
     cur.execute("""
-        UPDATE leave_requests
-        SET
-            status = %s,
-            reviewed_by = %s,
-            reviewed_at = CURRENT_TIMESTAMP,
-            review_notes = %s
-        WHERE id = %s
-    """, (
-        data.status,
-        current["user_id"],
-        data.review_notes,
-        leave_id
-    ))
+        INSERT INTO company_holidays (company_id, date, name)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (company_id, date)
+        DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    """, (current["company_id"], data.date, data.name))
+    holiday_id = cur.fetchone()[0]
 
-    # ✅ If approved → mark attendance as Leave
-    if data.status == "Approved":
-        current_date = start_date
-        while current_date <= end_date:
-            cur.execute("""
-                INSERT INTO attendance (
-                    company_id,
-                    user_id,
-                    date,
-                    status,
-                    marked_by,
-                    marked_at
-                )
-                VALUES (%s, %s, %s, 'Leave', %s, CURRENT_TIMESTAMP)
-                ON CONFLICT (company_id, user_id, date)
-                DO UPDATE SET
-                    status = 'Leave',
-                    marked_by = EXCLUDED.marked_by,
-                    marked_at = CURRENT_TIMESTAMP
-            """, (
-                current["company_id"],
-                user_id,
-                current_date,
-                current["user_id"]
-            ))
-            current_date += timedelta(days=1)
+    notify_calendar_change(cur, current["company_id"])
 
     conn.commit()
     cur.close()
-    conn.close()
 
-    return {"message": f"Leave {data.status.lower()} successfully"}
+    working_calendar.discard(current["company_id"])
+
+    return {"id": holiday_id}
+
+@app.delete("/company/holidays/{holiday_id}")
+def delete_holiday(holiday_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
+    require_hr(conn, current)
+
+    cur = conn.cursor()
+
+    cur.execute("""
+        DELETE FROM company_holidays
+        WHERE id = %s AND company_id = %s
+    """, (holiday_id, current["company_id"]))
+
+    if cur.rowcount == 0:
+        cur.close()
+        raise HTTPException(status_code=404, detail="Holiday not found")
+
+    notify_calendar_change(cur, current["company_id"])
+
+    conn.commit()
+    cur.close()
+
+    working_calendar.discard(current["company_id"])
+
+    return {"message": "Holiday deleted"}
 
 @app.get("/company/teams")
-def get_teams(current=Depends(get_current_user)):
-    conn = get_db()
+def get_teams(
+    request: Request,
+    response: Response,
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    not_modified = etag_check(request, response, conn, ("teams", current["company_id"]))
+    if not_modified:
+        return not_modified
+
     cur = conn.cursor()
 
     cur.execute("""
@@ -1700,7 +4964,6 @@ def get_teams(current=Depends(get_current_user)):
     rows = cur.fetchall()
 
     cur.close()
-    conn.close()
 
     return [
         {
@@ -1716,11 +4979,12 @@ def get_teams(current=Depends(get_current_user)):
     ]
 
 @app.post("/company/teams")
+@query_budget(4)
 def create_team(
     data: TeamCreate,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     try:
@@ -1737,12 +5001,13 @@ def create_team(
 
         team_id = cur.fetchone()[0]
 
-        for user_id in data.member_ids:
-            cur.execute("""
-                INSERT INTO team_members (team_id, user_id)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING
-            """, (team_id, user_id))
+        cur.execute("""
+            INSERT INTO team_members (team_id, user_id)
+            SELECT %s, unnest(%s::int[])
+            ON CONFLICT DO NOTHING
+        """, (team_id, data.member_ids))
+
+        bump_resource_versions(cur, ("teams", current["company_id"]))
 
         conn.commit()
 
@@ -1752,29 +5017,31 @@ def create_team(
 
     finally:
         cur.close()
-        conn.close()
+
+    etag_versions.discard(("teams", current["company_id"]))
 
     return {"message": "Team created", "team_id": team_id}
 
 @app.get("/company/teams/{team_id}")
 def get_team(
     team_id: int,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
-        SELECT id, name, description, manager_id, status
-        FROM teams
-        WHERE id = %s AND company_id = %s
+        SELECT t.id, t.name, t.description, t.manager_id, t.status,
+               u.name AS manager_name
+        FROM teams t
+        LEFT JOIN users u ON u.id = t.manager_id
+        WHERE t.id = %s AND t.company_id = %s
     """, (team_id, current["company_id"]))
 
     team = cur.fetchone()
 
     if not team:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Team not found")
 
     cur.execute("""
@@ -1787,13 +5054,13 @@ def get_team(
     members = cur.fetchall()
 
     cur.close()
-    conn.close()
 
     return {
         "id": team[0],
         "name": team[1],
         "description": team[2],
         "manager_id": team[3],
+        "manager_name": team[5],
         "status": team[4],
         "members": [
             {"user_id": m[0], "name": m[1]} for m in members
@@ -1801,12 +5068,13 @@ def get_team(
     }
 
 @app.put("/company/teams/{team_id}")
+@query_budget(5)
 def update_team(
     team_id: int,
     data: TeamUpdate,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -1826,24 +5094,26 @@ def update_team(
 
     cur.execute("DELETE FROM team_members WHERE team_id = %s", (team_id,))
 
-    for user_id in data.member_ids:
-        cur.execute("""
-            INSERT INTO team_members (team_id, user_id)
-            VALUES (%s, %s)
-        """, (team_id, user_id))
+    cur.execute("""
+        INSERT INTO team_members (team_id, user_id)
+        SELECT %s, unnest(%s::int[])
+    """, (team_id, data.member_ids))
+
+    bump_resource_versions(cur, ("teams", current["company_id"]))
 
     conn.commit()
     cur.close()
-    conn.close()
+
+    etag_versions.discard(("teams", current["company_id"]))
 
     return {"message": "Team updated"}
 
 @app.delete("/company/teams/{team_id}")
 def archive_team(
     team_id: int,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -1853,18 +5123,21 @@ def archive_team(
         WHERE id = %s AND company_id = %s
     """, (team_id, current["company_id"]))
 
+    bump_resource_versions(cur, ("teams", current["company_id"]))
+
     conn.commit()
     cur.close()
-    conn.close()
+
+    etag_versions.discard(("teams", current["company_id"]))
 
     return {"message": "Team archived"}
 
 @app.post("/sales/leads")
 def create_lead(
     data: LeadCreate,
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -1895,57 +5168,126 @@ def create_lead(
 
 
     lead_id = cur.fetchone()[0]
+    notify_typeahead_change(cur, user["company_id"])
     conn.commit()
     cur.close()
-    conn.close()
+
+    typeahead_index.put(user["company_id"], "lead", {
+        "id": lead_id,
+        "client_name": data.client_name,
+        "status": "New"
+    })
 
     return {"lead_id": lead_id}
 
+LEADS_LIST_SQL = """
+    SELECT
+        l.id,
+        l.client_name,
+        l.contact_email,
+        l.contact_phone,
+        l.status,
+        l.next_follow_up_date,
+        l.last_interaction_at,
+        u.name,
+        l.created_at
+    FROM leads l
+    JOIN users u ON u.id = l.assigned_employee_id
+    WHERE {where}
+    ORDER BY l.created_at DESC, l.id DESC
+    LIMIT %s
+"""
+
+def leads_page_query(company_id, status, assigned_employee_id, source,
+                     follow_up_from, follow_up_to, after, limit):
+    """
+    One keyset page of a company's leads, newest first.
+
+    A page continues strictly after the (created_at, id) of the previous
+    page's last row, so it is a bounded range scan on
+    idx_leads_company_created (or its status / assignee variants) however
+    deep the client pages. One extra row is fetched to detect a next page.
+    """
+    where = ["l.company_id = %s"]
+    params = [company_id]
+
+    if status:
+        where.append("l.status = %s")
+        params.append(status)
+
+    if assigned_employee_id:
+        where.append("l.assigned_employee_id = %s")
+        params.append(assigned_employee_id)
+
+    if source:
+        where.append("l.source = %s")
+        params.append(source)
+
+    if follow_up_from:
+        where.append("l.next_follow_up_date >= %s")
+        params.append(follow_up_from)
+
+    if follow_up_to:
+        where.append("l.next_follow_up_date <= %s")
+        params.append(follow_up_to)
+
+    if after:
+        created_at, lead_id = decode_cursor(after, 2)
+        where.append("(l.created_at, l.id) < (%s, %s)")
+        params.extend([created_at, lead_id])
+
+    params.append(page_limit(limit) + 1)
+
+    return LEADS_LIST_SQL.format(where=" AND ".join(where)), params
+
+def leads_page(rows, limit):
+    items, next_cursor = keyset_page(rows, limit, 8, 0)
+    return {"items": items, "next_cursor": next_cursor}
+
 @app.get("/sales/leads")
-def get_all_leads(user=Depends(get_current_user)):
-    conn = get_db()
+@query_budget(2)
+def get_all_leads(
+    status: Optional[str] = None,
+    assigned_employee_id: Optional[int] = None,
+    source: Optional[str] = None,
+    follow_up_from: Optional[date] = None,
+    follow_up_to: Optional[date] = None,
+    after: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    user=Depends(get_current_user),
+    conn=Depends(get_db)
+):
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            l.id,
-            l.client_name,
-            l.contact_email,
-            l.contact_phone,
-            l.status,
-            l.next_follow_up_date,
-            l.last_interaction_at,
-            u.name
-        FROM leads l
-        JOIN users u ON u.id = l.assigned_employee_id
-        WHERE l.company_id = %s
-        ORDER BY l.created_at DESC
-    """, (user["company_id"],))
-
+    cur.execute(*leads_page_query(
+        user["company_id"], status, assigned_employee_id, source,
+        follow_up_from, follow_up_to, after, limit
+    ))
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
-    return rows
+    return leads_page(rows, limit)
+
+FOLLOWUPS_TODAY_SQL = """
+    SELECT
+        id,
+        client_name,
+        status,
+        next_follow_up_date,
+        last_interaction_at
+    FROM leads
+    WHERE company_id = %s
+    AND assigned_employee_id = %s
+    AND next_follow_up_date = CURRENT_DATE
+"""
 
 @app.get("/sales/leads/today")
-def todays_followups(user=Depends(get_current_user)):
-    conn = get_db()
+@query_budget(2)
+def todays_followups(user=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            id,
-            client_name,
-            status,
-            next_follow_up_date,
-            last_interaction_at
-        FROM leads
-        WHERE company_id = %s
-        AND assigned_employee_id = %s
-        AND next_follow_up_date = CURRENT_DATE
-    """, (
+    cur.execute(FOLLOWUPS_TODAY_SQL, (
         user["company_id"],
         user["user_id"]
     ))
@@ -1953,7 +5295,6 @@ def todays_followups(user=Depends(get_current_user)):
 
     data = cur.fetchall()
     cur.close()
-    conn.close()
 
     return data
 
@@ -1961,14 +5302,14 @@ def todays_followups(user=Depends(get_current_user)):
 def update_lead(
     lead_id: int,
     data: LeadUpdate,
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     # Fetch current lead state
     cur.execute("""
-        SELECT status, project_created
+        SELECT status, project_created, client_name, company_id
         FROM leads
         WHERE id = %s
     """, (lead_id,))
@@ -1976,10 +5317,10 @@ def update_lead(
 
     if not lead:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Lead not found")
 
-    current_status, project_created = lead
+    current_status, project_created, client_name, company_id = lead
+    status_changed = bool(data.status) and data.status != current_status
 
     fields = []
     values = []
@@ -2031,9 +5372,18 @@ def update_lead(
             WHERE id = %s
         """, (lead_id,))
 
+    if status_changed:
+        notify_typeahead_change(cur, company_id)
+
     conn.commit()
     cur.close()
-    conn.close()
+
+    if status_changed:
+        typeahead_index.put(company_id, "lead", {
+            "id": lead_id,
+            "client_name": client_name,
+            "status": data.status
+        })
 
     return {"status": "updated"}
 
@@ -2041,9 +5391,9 @@ def update_lead(
 def log_interaction(
     lead_id: int,
     data: LeadInteractionCreate,
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -2071,16 +5421,15 @@ def log_interaction(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"status": "interaction logged"}
 
 @app.get("/sales/leads/{lead_id}/interactions")
 def get_lead_interactions(
     lead_id: int,
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     cur.execute("""
@@ -2097,13 +5446,11 @@ def get_lead_interactions(
 
     data = cur.fetchall()
     cur.close()
-    conn.close()
 
     return data
 
 @app.get("/company/projects/unassigned")
-def get_unassigned_projects(current=Depends(get_current_user)):
-    conn = get_db()
+def get_unassigned_projects(current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -2125,7 +5472,6 @@ def get_unassigned_projects(current=Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -2144,9 +5490,9 @@ def get_unassigned_projects(current=Depends(get_current_user)):
 def assign_team_to_project(
     project_id: int,
     data: AssignTeamPayload,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     cur = conn.cursor()
 
     # Ensure project belongs to company and is unassigned
@@ -2160,7 +5506,6 @@ def assign_team_to_project(
 
     if not cur.fetchone():
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Project not available for assignment")
 
     # Assign team
@@ -2174,13 +5519,11 @@ def assign_team_to_project(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Team assigned to project"}
 
 @app.get("/company/teams/{team_id}/details")
-def get_team_details(team_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+def get_team_details(team_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     # 1️⃣ Get Team Info + Manager
@@ -2200,7 +5543,6 @@ def get_team_details(team_id: int, current=Depends(get_current_user)):
 
     if not team:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Team not found")
 
     team_info = {
@@ -2256,7 +5598,6 @@ def get_team_details(team_id: int, current=Depends(get_current_user)):
     ]
 
     cur.close()
-    conn.close()
 
     return {
         "team": team_info,
@@ -2265,8 +5606,7 @@ def get_team_details(team_id: int, current=Depends(get_current_user)):
     }
 
 @app.get("/projects")
-def list_projects(current=Depends(get_current_user)):
-    conn = get_db()
+def list_projects(current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -2285,7 +5625,6 @@ def list_projects(current=Depends(get_current_user)):
 
     projects = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -2299,8 +5638,7 @@ def list_projects(current=Depends(get_current_user)):
     ]
 
 @app.get("/projects/{project_id}")
-def get_project_details(project_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+def get_project_details(project_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -2319,7 +5657,6 @@ def get_project_details(project_id: int, current=Depends(get_current_user)):
     project = cur.fetchone()
     if not project:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404)
 
     cur.execute("""
@@ -2345,7 +5682,6 @@ def get_project_details(project_id: int, current=Depends(get_current_user)):
     planning = cur.fetchone()
 
     cur.close()
-    conn.close()
 
     return {
         "project": {
@@ -2362,9 +5698,9 @@ def get_project_details(project_id: int, current=Depends(get_current_user)):
 def save_project_planning(
     project_id: int,
     data: CreateProjectPlanning,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
 
     status, is_leader, is_admin = get_project_and_role(conn, project_id, current)
 
@@ -2431,13 +5767,11 @@ def save_project_planning(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Project planning saved"}
 
 @app.post("/projects/{project_id}/start")
-def start_project(project_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+def start_project(project_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
 
     status, is_leader, _ = get_project_and_role(conn, project_id, current)
 
@@ -2469,13 +5803,12 @@ def start_project(project_id: int, current=Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Project started"}
 
 @app.get("/projects/{project_id}/tasks")
-def list_project_tasks(project_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+@query_budget(3)
+def list_project_tasks(project_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     # Ensure project belongs to company
@@ -2486,7 +5819,6 @@ def list_project_tasks(project_id: int, current=Depends(get_current_user)):
 
     if not cur.fetchone():
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404)
 
     cur.execute("""
@@ -2505,7 +5837,6 @@ def list_project_tasks(project_id: int, current=Depends(get_current_user)):
 
     tasks = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -2523,9 +5854,9 @@ def list_project_tasks(project_id: int, current=Depends(get_current_user)):
 def create_task(
     project_id: int,
     data: CreateTask,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     status, is_leader, _ = get_project_and_role(conn, project_id, current)
 
     if not is_leader:
@@ -2570,7 +5901,6 @@ def create_task(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Task created"}
 
@@ -2578,9 +5908,9 @@ def create_task(
 def suggest_task(
     project_id: int,
     data: CreateTask,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     status, is_leader, _ = get_project_and_role(conn, project_id, current)
 
     if is_leader:
@@ -2611,7 +5941,6 @@ def suggest_task(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Task suggestion submitted"}
 
@@ -2619,9 +5948,9 @@ def suggest_task(
 def approve_task(
     task_id: int,
     data: ApproveTask,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     task_status, project_status, is_leader, _, _ = get_task_and_project(
         conn, task_id, current
     )
@@ -2649,7 +5978,6 @@ def approve_task(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Task decision recorded"}
 
@@ -2657,9 +5985,9 @@ def approve_task(
 def update_task_status(
     task_id: int,
     data: UpdateTaskStatus,
-    current=Depends(get_current_user)
+    current=Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db()
     task_status, project_status, _, is_assignee, _ = get_task_and_project(
         conn, task_id, current
     )
@@ -2693,13 +6021,11 @@ def update_task_status(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Task updated"}
 
 @app.post("/tasks/{task_id}/complete")
-def complete_task(task_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+def complete_task(task_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
     task_status, _, is_leader, _, _ = get_task_and_project(
         conn, task_id, current
     )
@@ -2717,13 +6043,11 @@ def complete_task(task_id: int, current=Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Task marked as done"}
 
 @app.post("/projects/{project_id}/complete")
-def complete_project(project_id: int, current=Depends(get_current_user)):
-    conn = get_db()
+def complete_project(project_id: int, current=Depends(get_current_user), conn=Depends(get_db)):
 
     status, is_leader, _ = get_project_and_role(conn, project_id, current)
 
@@ -2748,7 +6072,6 @@ def complete_project(project_id: int, current=Depends(get_current_user)):
 
     if remaining > 0:
         cur.close()
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="All tasks must be completed before ending project"
@@ -2776,7 +6099,6 @@ def complete_project(project_id: int, current=Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Project completed successfully"}
 
@@ -21,6 +21,34 @@ SET xmloption = content;
 SET client_min_messages = warning;
 SET row_security = off;
 
+--
+-- Name: btree_gist; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION btree_gist; Type: COMMENT; Schema: -; Owner: 
+--
+
+COMMENT ON EXTENSION btree_gist IS 'support for indexing common datatypes in GiST';
+
+
+--
+-- Name: pg_trgm; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION pg_trgm; Type: COMMENT; Schema: -; Owner: 
+--
+
+COMMENT ON EXTENSION pg_trgm IS 'text similarity measurement and index searching based on trigrams';
+
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
@@ -39,12 +67,29 @@ CREATE TABLE public.attendance (
     marked_by integer NOT NULL,
     marked_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
     remarks text,
+    leave_request_id integer,
     CONSTRAINT attendance_status_check CHECK (((status)::text = ANY ((ARRAY['Present'::character varying, 'Absent'::character varying, 'Leave'::character varying])::text[])))
 );
 
 
 ALTER TABLE public.attendance OWNER TO postgres;
 
+--
+-- Name: attendance_daily; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.attendance_daily (
+    company_id integer NOT NULL,
+    date date NOT NULL,
+    present integer DEFAULT 0 NOT NULL,
+    absent integer DEFAULT 0 NOT NULL,
+    leave integer DEFAULT 0 NOT NULL,
+    total_active integer DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.attendance_daily OWNER TO postgres;
+
 --
 -- TOC entry 273 (class 1259 OID 17235)
 -- Name: attendance_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
@@ -70,6 +115,23 @@ ALTER SEQUENCE public.attendance_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.attendance_id_seq OWNED BY public.attendance.id;
 
 
+--
+-- Name: attendance_monthly; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.attendance_monthly (
+    company_id integer NOT NULL,
+    user_id integer NOT NULL,
+    month date NOT NULL,
+    present integer DEFAULT 0 NOT NULL,
+    absent integer DEFAULT 0 NOT NULL,
+    leave integer DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.attendance_monthly OWNER TO postgres;
+
+
 --
 -- TOC entry 252 (class 1259 OID 16671)
 -- Name: audit_logs; Type: TABLE; Schema: public; Owner: postgres
@@ -200,6 +262,20 @@ ALTER SEQUENCE public.company_activity_logs_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.company_activity_logs_id_seq OWNED BY public.company_activity_logs.id;
 
 
+--
+-- Name: company_calendars; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.company_calendars (
+    company_id integer NOT NULL,
+    weekly_offs smallint[] DEFAULT '{6,7}'::smallint[] NOT NULL,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT chk_company_calendars_weekly_offs CHECK (((weekly_offs <@ '{1,2,3,4,5,6,7}'::smallint[]) AND (cardinality(weekly_offs) < 7)))
+);
+
+
+ALTER TABLE public.company_calendars OWNER TO postgres;
+
 --
 -- TOC entry 224 (class 1259 OID 16427)
 -- Name: company_contacts; Type: TABLE; Schema: public; Owner: postgres
@@ -325,6 +401,43 @@ ALTER SEQUENCE public.company_health_scores_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.company_health_scores_id_seq OWNED BY public.company_health_scores.id;
 
 
+--
+-- Name: company_holidays; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.company_holidays (
+    id integer NOT NULL,
+    company_id integer NOT NULL,
+    date date NOT NULL,
+    name character varying(100) NOT NULL,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+
+ALTER TABLE public.company_holidays OWNER TO postgres;
+
+--
+-- Name: company_holidays_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.company_holidays_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.company_holidays_id_seq OWNER TO postgres;
+
+--
+-- Name: company_holidays_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.company_holidays_id_seq OWNED BY public.company_holidays.id;
+
+
 --
 -- TOC entry 238 (class 1259 OID 16550)
 -- Name: company_onboarding_logs; Type: TABLE; Schema: public; Owner: postgres
@@ -708,6 +821,106 @@ ALTER SEQUENCE public.leads_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.leads_id_seq OWNED BY public.leads.id;
 
 
+--
+-- Name: leave_balances; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.leave_balances (
+    company_id integer NOT NULL,
+    user_id integer NOT NULL,
+    leave_type character varying(50) NOT NULL,
+    balance numeric(7,2) DEFAULT 0 NOT NULL,
+    accrued_through date,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+
+ALTER TABLE public.leave_balances OWNER TO postgres;
+
+--
+-- Name: leave_ledger; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.leave_ledger (
+    id bigint NOT NULL,
+    company_id integer NOT NULL,
+    user_id integer NOT NULL,
+    leave_type character varying(50) NOT NULL,
+    entry_type character varying(20) NOT NULL,
+    amount numeric(7,2) NOT NULL,
+    balance_after numeric(7,2) NOT NULL,
+    leave_request_id integer,
+    note text,
+    created_by integer,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT chk_leave_ledger_entry_type CHECK (((entry_type)::text = ANY ((ARRAY['accrual'::character varying, 'debit'::character varying, 'credit'::character varying, 'adjustment'::character varying])::text[])))
+);
+
+
+ALTER TABLE public.leave_ledger OWNER TO postgres;
+
+--
+-- Name: leave_ledger_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.leave_ledger_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.leave_ledger_id_seq OWNER TO postgres;
+
+--
+-- Name: leave_ledger_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.leave_ledger_id_seq OWNED BY public.leave_ledger.id;
+
+
+--
+-- Name: leave_policies; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.leave_policies (
+    id integer NOT NULL,
+    company_id integer NOT NULL,
+    user_id integer,
+    leave_type character varying(50) NOT NULL,
+    annual_days numeric(5,2) NOT NULL,
+    accrual_period character varying(10) DEFAULT 'month'::character varying NOT NULL,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    allow_negative boolean DEFAULT false NOT NULL,
+    CONSTRAINT chk_leave_policy_period CHECK (((accrual_period)::text = ANY ((ARRAY['month'::character varying, 'year'::character varying])::text[])))
+);
+
+
+ALTER TABLE public.leave_policies OWNER TO postgres;
+
+--
+-- Name: leave_policies_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.leave_policies_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.leave_policies_id_seq OWNER TO postgres;
+
+--
+-- Name: leave_policies_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.leave_policies_id_seq OWNED BY public.leave_policies.id;
+
+
 --
 -- TOC entry 276 (class 1259 OID 17255)
 -- Name: leave_requests; Type: TABLE; Schema: public; Owner: postgres
@@ -727,6 +940,7 @@ CREATE TABLE public.leave_requests (
     reviewed_by integer,
     reviewed_at timestamp without time zone,
     review_notes text,
+    period daterange GENERATED ALWAYS AS (daterange(start_date, end_date, '[]'::text)) STORED,
     CONSTRAINT chk_leave_status CHECK (((status)::text = ANY ((ARRAY['Pending'::character varying, 'Approved'::character varying, 'Rejected'::character varying, 'Cancelled'::character varying])::text[])))
 );
 
@@ -1246,6 +1460,19 @@ ALTER SEQUENCE public.projects_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.projects_id_seq OWNED BY public.projects.id;
 
 
+--
+-- Name: resource_versions; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.resource_versions (
+    scope character varying(20) NOT NULL,
+    ident integer NOT NULL,
+    version bigint DEFAULT 1 NOT NULL
+);
+
+
+ALTER TABLE public.resource_versions OWNER TO postgres;
+
 --
 -- TOC entry 262 (class 1259 OID 17097)
 -- Name: role_permissions; Type: TABLE; Schema: public; Owner: postgres
@@ -1494,6 +1721,19 @@ ALTER SEQUENCE public.teams_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.teams_id_seq OWNED BY public.teams.id;
 
 
+--
+-- Name: user_access; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.user_access (
+    user_id integer NOT NULL,
+    feature_ids integer[] DEFAULT '{}'::integer[] NOT NULL,
+    refreshed_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+
+ALTER TABLE public.user_access OWNER TO postgres;
+
 --
 -- TOC entry 272 (class 1259 OID 17210)
 -- Name: user_profile_data; Type: TABLE; Schema: public; Owner: postgres
@@ -1627,6 +1867,44 @@ ALTER SEQUENCE public.user_sessions_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.user_sessions_id_seq OWNED BY public.user_sessions.id;
 
 
+--
+-- Name: user_status_history; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.user_status_history (
+    id bigint NOT NULL,
+    company_id integer NOT NULL,
+    user_id integer NOT NULL,
+    previous_status character varying(20),
+    status character varying(20) NOT NULL,
+    changed_by integer,
+    changed_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+ALTER TABLE public.user_status_history OWNER TO postgres;
+
+--
+-- Name: user_status_history_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.user_status_history_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.user_status_history_id_seq OWNER TO postgres;
+
+--
+-- Name: user_status_history_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.user_status_history_id_seq OWNED BY public.user_status_history.id;
+
+
 --
 -- TOC entry 254 (class 1259 OID 17017)
 -- Name: users; Type: TABLE; Schema: public; Owner: postgres
@@ -1728,6 +2006,13 @@ ALTER TABLE ONLY public.company_features ALTER COLUMN id SET DEFAULT nextval('pu
 ALTER TABLE ONLY public.company_health_scores ALTER COLUMN id SET DEFAULT nextval('public.company_health_scores_id_seq'::regclass);
 
 
+--
+-- Name: company_holidays id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_holidays ALTER COLUMN id SET DEFAULT nextval('public.company_holidays_id_seq'::regclass);
+
+
 --
 -- TOC entry 3843 (class 2604 OID 16553)
 -- Name: company_onboarding_logs id; Type: DEFAULT; Schema: public; Owner: postgres
@@ -1800,6 +2085,20 @@ ALTER TABLE ONLY public.lead_interactions ALTER COLUMN id SET DEFAULT nextval('p
 ALTER TABLE ONLY public.leads ALTER COLUMN id SET DEFAULT nextval('public.leads_id_seq'::regclass);
 
 
+--
+-- Name: leave_ledger id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_ledger ALTER COLUMN id SET DEFAULT nextval('public.leave_ledger_id_seq'::regclass);
+
+
+--
+-- Name: leave_policies id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_policies ALTER COLUMN id SET DEFAULT nextval('public.leave_policies_id_seq'::regclass);
+
+
 --
 -- TOC entry 3882 (class 2604 OID 17258)
 -- Name: leave_requests id; Type: DEFAULT; Schema: public; Owner: postgres
@@ -1968,6 +2267,13 @@ ALTER TABLE ONLY public.user_roles ALTER COLUMN id SET DEFAULT nextval('public.u
 ALTER TABLE ONLY public.user_sessions ALTER COLUMN id SET DEFAULT nextval('public.user_sessions_id_seq'::regclass);
 
 
+--
+-- Name: user_status_history id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.user_status_history ALTER COLUMN id SET DEFAULT nextval('public.user_status_history_id_seq'::regclass);
+
+
 --
 -- TOC entry 3861 (class 2604 OID 17020)
 -- Name: users id; Type: DEFAULT; Schema: public; Owner: postgres
@@ -1994,6 +2300,22 @@ ALTER TABLE ONLY public.attendance
     ADD CONSTRAINT attendance_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: attendance_daily attendance_daily_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.attendance_daily
+    ADD CONSTRAINT attendance_daily_pkey PRIMARY KEY (company_id, date);
+
+
+--
+-- Name: attendance_monthly attendance_monthly_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.attendance_monthly
+    ADD CONSTRAINT attendance_monthly_pkey PRIMARY KEY (company_id, user_id, month);
+
+
 --
 -- TOC entry 3967 (class 2606 OID 16682)
 -- Name: audit_logs audit_logs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2021,6 +2343,14 @@ ALTER TABLE ONLY public.company_activity_logs
     ADD CONSTRAINT company_activity_logs_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: company_calendars company_calendars_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_calendars
+    ADD CONSTRAINT company_calendars_pkey PRIMARY KEY (company_id);
+
+
 --
 -- TOC entry 3923 (class 2606 OID 16436)
 -- Name: company_contacts company_contacts_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2066,6 +2396,22 @@ ALTER TABLE ONLY public.company_health_scores
     ADD CONSTRAINT company_health_scores_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: company_holidays company_holidays_company_id_date_key; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_holidays
+    ADD CONSTRAINT company_holidays_company_id_date_key UNIQUE (company_id, date);
+
+
+--
+-- Name: company_holidays company_holidays_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_holidays
+    ADD CONSTRAINT company_holidays_pkey PRIMARY KEY (id);
+
+
 --
 -- TOC entry 3945 (class 2606 OID 16559)
 -- Name: company_onboarding_logs company_onboarding_logs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2192,6 +2538,38 @@ ALTER TABLE ONLY public.leads
     ADD CONSTRAINT leads_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: leave_balances leave_balances_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_balances
+    ADD CONSTRAINT leave_balances_pkey PRIMARY KEY (user_id, leave_type);
+
+
+--
+-- Name: leave_ledger leave_ledger_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_ledger
+    ADD CONSTRAINT leave_ledger_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: leave_policies leave_policies_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_policies
+    ADD CONSTRAINT leave_policies_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: leave_requests leave_requests_no_overlap; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_requests
+    ADD CONSTRAINT leave_requests_no_overlap EXCLUDE USING gist (company_id WITH OPERATOR(pg_catalog.=), user_id WITH OPERATOR(pg_catalog.=), period WITH OPERATOR(pg_catalog.&&)) WHERE (((status)::text = ANY ((ARRAY['Pending'::character varying, 'Approved'::character varying])::text[])));
+
+
 --
 -- TOC entry 4010 (class 2606 OID 17274)
 -- Name: leave_requests leave_requests_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2345,6 +2723,14 @@ ALTER TABLE ONLY public.projects
     ADD CONSTRAINT projects_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: resource_versions resource_versions_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.resource_versions
+    ADD CONSTRAINT resource_versions_pkey PRIMARY KEY (scope, ident);
+
+
 --
 -- TOC entry 3984 (class 2606 OID 17105)
 -- Name: role_permissions role_permissions_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2444,6 +2830,14 @@ ALTER TABLE ONLY public.team_members
     ADD CONSTRAINT uq_team_user UNIQUE (team_id, user_id);
 
 
+--
+-- Name: user_access user_access_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.user_access
+    ADD CONSTRAINT user_access_pkey PRIMARY KEY (user_id);
+
+
 --
 -- TOC entry 4002 (class 2606 OID 17222)
 -- Name: user_profile_data user_profile_data_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2489,6 +2883,14 @@ ALTER TABLE ONLY public.user_sessions
     ADD CONSTRAINT user_sessions_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: user_status_history user_status_history_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.user_status_history
+    ADD CONSTRAINT user_status_history_pkey PRIMARY KEY (id);
+
+
 --
 -- TOC entry 3970 (class 2606 OID 17033)
 -- Name: users users_company_id_emp_id_key; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -2523,6 +2925,34 @@ CREATE INDEX idx_interactions_lead ON public.lead_interactions USING btree (lead
 CREATE INDEX idx_leads_assigned_employee ON public.leads USING btree (assigned_employee_id);
 
 
+--
+-- Name: idx_leads_company_assigned_created; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leads_company_assigned_created ON public.leads USING btree (company_id, assigned_employee_id, created_at, id);
+
+
+--
+-- Name: idx_leads_company_created; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leads_company_created ON public.leads USING btree (company_id, created_at, id);
+
+
+--
+-- Name: idx_leads_company_follow_up; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leads_company_follow_up ON public.leads USING btree (company_id, next_follow_up_date);
+
+
+--
+-- Name: idx_leads_company_status_created; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leads_company_status_created ON public.leads USING btree (company_id, status, created_at, id);
+
+
 --
 -- TOC entry 4020 (class 1259 OID 17478)
 -- Name: idx_leads_follow_up; Type: INDEX; Schema: public; Owner: postgres
@@ -2531,6 +2961,97 @@ CREATE INDEX idx_leads_assigned_employee ON public.leads USING btree (assigned_e
 CREATE INDEX idx_leads_follow_up ON public.leads USING btree (next_follow_up_date);
 
 
+--
+-- Name: idx_leave_ledger_leave_request; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leave_ledger_leave_request ON public.leave_ledger USING btree (leave_request_id) WHERE (leave_request_id IS NOT NULL);
+
+
+--
+-- Name: idx_leave_ledger_user_type; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leave_ledger_user_type ON public.leave_ledger USING btree (user_id, leave_type, id);
+
+
+--
+-- Name: idx_leave_policies_company_type; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX idx_leave_policies_company_type ON public.leave_policies USING btree (company_id, leave_type) WHERE (user_id IS NULL);
+
+
+--
+-- Name: idx_leave_policies_company_user_type; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX idx_leave_policies_company_user_type ON public.leave_policies USING btree (company_id, user_id, leave_type) WHERE (user_id IS NOT NULL);
+
+
+--
+-- Name: idx_leave_requests_company_applied; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leave_requests_company_applied ON public.leave_requests USING btree (company_id, applied_at, id);
+
+
+--
+-- Name: idx_leave_requests_company_status_applied; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leave_requests_company_status_applied ON public.leave_requests USING btree (company_id, status, applied_at, id);
+
+
+--
+-- Name: idx_leave_requests_company_user_applied; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_leave_requests_company_user_applied ON public.leave_requests USING btree (company_id, user_id, applied_at, id);
+
+
+--
+-- Name: idx_user_sessions_auth; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_user_sessions_auth ON public.user_sessions USING btree (id, user_id, company_id, expires_at);
+
+
+--
+-- Name: idx_user_status_history_user_changed; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_user_status_history_user_changed ON public.user_status_history USING btree (user_id, changed_at, id);
+
+
+--
+-- Name: idx_users_company_created; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_users_company_created ON public.users USING btree (company_id, created_at, id);
+
+
+--
+-- Name: idx_users_company_email_prefix; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_users_company_email_prefix ON public.users USING btree (company_id, lower((email)::text) text_pattern_ops);
+
+
+--
+-- Name: idx_users_company_emp_id_prefix; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_users_company_emp_id_prefix ON public.users USING btree (company_id, lower((emp_id)::text) text_pattern_ops);
+
+
+--
+-- Name: idx_users_name_trgm; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_users_name_trgm ON public.users USING gin (name public.gin_trgm_ops);
+
+
 --
 -- TOC entry 3968 (class 1259 OID 17164)
 -- Name: uniq_company_email; Type: INDEX; Schema: public; Owner: postgres
@@ -2539,6 +3060,22 @@ CREATE INDEX idx_leads_follow_up ON public.leads USING btree (next_follow_up_dat
 CREATE UNIQUE INDEX uniq_company_email ON public.users USING btree (company_id, email) WHERE (email IS NOT NULL);
 
 
+--
+-- Name: attendance attendance_leave_request_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.attendance
+    ADD CONSTRAINT attendance_leave_request_id_fkey FOREIGN KEY (leave_request_id) REFERENCES public.leave_requests(id) ON DELETE SET NULL;
+
+
+--
+-- Name: attendance_monthly attendance_monthly_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.attendance_monthly
+    ADD CONSTRAINT attendance_monthly_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4058 (class 2606 OID 17153)
 -- Name: company_activity_logs company_activity_logs_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -2557,6 +3094,14 @@ ALTER TABLE ONLY public.company_activity_logs
     ADD CONSTRAINT company_activity_logs_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE SET NULL;
 
 
+--
+-- Name: company_calendars company_calendars_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_calendars
+    ADD CONSTRAINT company_calendars_company_id_fkey FOREIGN KEY (company_id) REFERENCES public.companies(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4038 (class 2606 OID 16437)
 -- Name: company_contacts company_contacts_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -2593,6 +3138,14 @@ ALTER TABLE ONLY public.company_health_scores
     ADD CONSTRAINT company_health_scores_company_id_fkey FOREIGN KEY (company_id) REFERENCES public.companies(id) ON DELETE CASCADE;
 
 
+--
+-- Name: company_holidays company_holidays_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.company_holidays
+    ADD CONSTRAINT company_holidays_company_id_fkey FOREIGN KEY (company_id) REFERENCES public.companies(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4044 (class 2606 OID 16560)
 -- Name: company_onboarding_logs company_onboarding_logs_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -2683,6 +3236,46 @@ ALTER TABLE ONLY public.leads
     ADD CONSTRAINT fk_leads_company FOREIGN KEY (company_id) REFERENCES public.companies(id) ON DELETE CASCADE;
 
 
+--
+-- Name: leave_balances leave_balances_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_balances
+    ADD CONSTRAINT leave_balances_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: leave_ledger leave_ledger_leave_request_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_ledger
+    ADD CONSTRAINT leave_ledger_leave_request_id_fkey FOREIGN KEY (leave_request_id) REFERENCES public.leave_requests(id) ON DELETE SET NULL;
+
+
+--
+-- Name: leave_ledger leave_ledger_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_ledger
+    ADD CONSTRAINT leave_ledger_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
+--
+-- Name: leave_policies leave_policies_company_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_policies
+    ADD CONSTRAINT leave_policies_company_id_fkey FOREIGN KEY (company_id) REFERENCES public.companies(id) ON DELETE CASCADE;
+
+
+--
+-- Name: leave_policies leave_policies_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.leave_policies
+    ADD CONSTRAINT leave_policies_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4065 (class 2606 OID 17275)
 -- Name: leave_requests fk_leave_company; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -2872,6 +3465,14 @@ ALTER TABLE ONLY public.user_profile_data
     ADD CONSTRAINT fk_user FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
 
 
+--
+-- Name: user_status_history user_status_history_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.user_status_history
+    ADD CONSTRAINT user_status_history_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4075 (class 2606 OID 17467)
 -- Name: lead_interactions lead_interactions_lead_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -2989,6 +3590,14 @@ ALTER TABLE ONLY public.roles_features
     ADD CONSTRAINT roles_features_role_id_fkey FOREIGN KEY (role_id) REFERENCES public.roles(id) ON DELETE CASCADE;
 
 
+--
+-- Name: user_access user_access_user_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.user_access
+    ADD CONSTRAINT user_access_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 4056 (class 2606 OID 17135)
 -- Name: user_roles user_roles_role_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -0,0 +1,130 @@
+--
+-- Adds leave_requests.period and leave_requests_no_overlap (see Schema.sql)
+-- to a database created before them.
+--
+-- PostgreSQL cannot add an exclusion constraint as NOT VALID, so existing
+-- overlapping Pending / Approved leaves of a user are resolved first:
+--
+--   1. every overlapping pair is listed;
+--   2. if two Approved leaves overlap, the script stops without changing
+--      anything and names them (HR cancels or shortens one, then re-runs);
+--   3. Pending leaves are settled in the order they were applied for:
+--      one that overlaps an Approved leave, or an earlier Pending one
+--      that was kept, is Rejected with a review note saying why;
+--   4. the constraint is added.
+--
+--   psql -v ON_ERROR_STOP=1 -d <database> -f SQL/migrations/001_leave_requests_no_overlap.sql
+--
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public;
+
+ALTER TABLE public.leave_requests
+    ADD COLUMN IF NOT EXISTS period daterange
+    GENERATED ALWAYS AS (daterange(start_date, end_date, '[]'::text)) STORED;
+
+-- 1. Overlapping pairs
+
+SELECT
+    a.company_id,
+    a.user_id,
+    a.id AS leave_id,
+    a.status,
+    a.period,
+    b.id AS overlapping_leave_id,
+    b.status AS overlapping_status,
+    b.period AS overlapping_period
+FROM public.leave_requests a
+JOIN public.leave_requests b
+  ON b.company_id = a.company_id
+ AND b.user_id = a.user_id
+ AND b.id > a.id
+ AND b.period && a.period
+WHERE a.status IN ('Pending', 'Approved')
+  AND b.status IN ('Pending', 'Approved')
+ORDER BY a.company_id, a.user_id, a.id, b.id;
+
+-- 2. Approved leaves already deducted and marked: not ours to pick
+
+DO $$
+DECLARE
+    conflicts text;
+BEGIN
+    SELECT string_agg(format('%s and %s', a.id, b.id), ', ' ORDER BY a.id, b.id)
+    INTO conflicts
+    FROM public.leave_requests a
+    JOIN public.leave_requests b
+      ON b.company_id = a.company_id
+     AND b.user_id = a.user_id
+     AND b.id > a.id
+     AND b.period && a.period
+    WHERE a.status = 'Approved'
+      AND b.status = 'Approved';
+
+    IF conflicts IS NOT NULL THEN
+        RAISE EXCEPTION 'Approved leaves overlap: %', conflicts
+            USING HINT = 'Cancel or shorten one leave of each pair, then run this migration again.';
+    END IF;
+END $$;
+
+-- 3. Pending leaves lose to Approved ones, and to Pending ones applied
+--    for earlier that are kept. Rejecting a leave can free a later one
+--    (A overlaps B, B overlaps C, A and C apart: only B goes), so they are
+--    settled one at a time in applied_at order.
+
+DO $$
+DECLARE
+    p record;
+    winner integer;
+BEGIN
+    FOR p IN
+        SELECT lr.id, lr.company_id, lr.user_id, lr.period, lr.applied_at
+        FROM public.leave_requests lr
+        WHERE lr.status = 'Pending'
+          AND EXISTS (
+              SELECT 1
+              FROM public.leave_requests o
+              WHERE o.company_id = lr.company_id
+                AND o.user_id = lr.user_id
+                AND o.id <> lr.id
+                AND o.period && lr.period
+                AND o.status IN ('Pending', 'Approved')
+          )
+        ORDER BY lr.applied_at, lr.id
+    LOOP
+        -- Earlier Pending leaves are settled by now: still Pending means kept
+        SELECT o.id
+        INTO winner
+        FROM public.leave_requests o
+        WHERE o.company_id = p.company_id
+          AND o.user_id = p.user_id
+          AND o.id <> p.id
+          AND o.period && p.period
+          AND (
+              o.status = 'Approved'
+              OR (o.status = 'Pending' AND (o.applied_at, o.id) < (p.applied_at, p.id))
+          )
+        ORDER BY o.status = 'Approved' DESC, o.applied_at, o.id
+        LIMIT 1;
+
+        IF winner IS NOT NULL THEN
+            UPDATE public.leave_requests
+            SET
+                status = 'Rejected',
+                reviewed_at = CURRENT_TIMESTAMP,
+                review_notes = concat_ws(
+                    E'\n', review_notes,
+                    'Rejected when overlapping leaves were disallowed: overlaps leave ' || winner
+                )
+            WHERE id = p.id;
+        END IF;
+    END LOOP;
+END $$;
+
+-- 4. The constraint, as in Schema.sql
+
+ALTER TABLE ONLY public.leave_requests
+    ADD CONSTRAINT leave_requests_no_overlap EXCLUDE USING gist (company_id WITH OPERATOR(pg_catalog.=), user_id WITH OPERATOR(pg_catalog.=), period WITH OPERATOR(pg_catalog.&&)) WHERE (((status)::text = ANY ((ARRAY['Pending'::character varying, 'Approved'::character varying])::text[])));
+
+COMMIT;
@@ -0,0 +1,119 @@
+--
+-- Fills attendance_monthly and attendance_daily (see Schema.sql) from
+-- attendance, for a database that had attendance before the rollups.
+-- The employee and company summaries read only the rollups, so until
+-- this runs they report zero for every day marked earlier.
+--
+-- Writers to the three tables wait while it runs, so no mark is counted
+-- twice or missed. Both rollups are recounted from scratch, so running
+-- it again is harmless.
+--
+--   psql -v ON_ERROR_STOP=1 -d <database> -f SQL/migrations/002_attendance_rollups_backfill.sql
+--
+
+BEGIN;
+
+LOCK TABLE public.attendance, public.attendance_monthly, public.attendance_daily
+    IN SHARE ROW EXCLUSIVE MODE;
+
+-- 1. Per employee and month
+
+DELETE FROM public.attendance_monthly;
+
+INSERT INTO public.attendance_monthly (company_id, user_id, month, present, absent, leave)
+SELECT
+    company_id,
+    user_id,
+    date_trunc('month', date)::date,
+    COUNT(*) FILTER (WHERE status = 'Present'),
+    COUNT(*) FILTER (WHERE status = 'Absent'),
+    COUNT(*) FILTER (WHERE status = 'Leave')
+FROM public.attendance
+GROUP BY company_id, user_id, date_trunc('month', date);
+
+-- 2. Per company and day. total_active is the headcount on that day,
+--    not today's: users created by then and active according to
+--    user_status_history, as the rollup rebuild endpoint counts it
+--    (REBUILD_ATTENDANCE_DAILY_SQL). Each active span adds one from the
+--    day it starts and drops it from the day it ends; a running sum over
+--    those steps gives every day's headcount in one pass.
+
+DELETE FROM public.attendance_daily;
+
+WITH events AS (
+    -- the status each user was created with: before their first change
+    SELECT
+        u.company_id,
+        u.id AS user_id,
+        COALESCE(u.created_at, '-infinity') AS since,
+        COALESCE(f.previous_status, u.status) AS status,
+        0 AS ord
+    FROM public.users u
+    LEFT JOIN (
+        SELECT DISTINCT ON (user_id) user_id, previous_status
+        FROM public.user_status_history
+        ORDER BY user_id, changed_at, id
+    ) f ON f.user_id = u.id
+
+    UNION ALL
+
+    SELECT company_id, user_id, changed_at, status, id
+    FROM public.user_status_history
+),
+active_spans AS (
+    SELECT company_id, since, until
+    FROM (
+        SELECT
+            company_id,
+            status,
+            since,
+            lead(since) OVER (PARTITION BY user_id ORDER BY since, ord) AS until
+        FROM events
+    ) e
+    WHERE status = 'active'
+),
+steps AS (
+    SELECT company_id, day, SUM(delta) AS delta
+    FROM (
+        SELECT company_id, since::date AS day, 1 AS delta
+        FROM active_spans
+
+        UNION ALL
+
+        SELECT company_id, until::date, -1
+        FROM active_spans
+        WHERE until IS NOT NULL
+    ) s
+    GROUP BY company_id, day
+),
+marks AS (
+    SELECT
+        company_id,
+        date,
+        COUNT(*) FILTER (WHERE status = 'Present') AS present,
+        COUNT(*) FILTER (WHERE status = 'Absent') AS absent,
+        COUNT(*) FILTER (WHERE status = 'Leave') AS leave
+    FROM public.attendance
+    GROUP BY company_id, date
+)
+INSERT INTO public.attendance_daily (company_id, date, present, absent, leave, total_active)
+SELECT company_id, date, present, absent, leave, total_active
+FROM (
+    SELECT
+        COALESCE(m.company_id, s.company_id) AS company_id,
+        COALESCE(m.date, s.day) AS date,
+        m.present,
+        m.absent,
+        m.leave,
+        SUM(COALESCE(s.delta, 0)) OVER (
+            PARTITION BY COALESCE(m.company_id, s.company_id)
+            ORDER BY COALESCE(m.date, s.day)
+        ) AS total_active
+    FROM marks m
+    FULL JOIN steps s
+      ON s.company_id = m.company_id
+     AND s.day = m.date
+) t
+WHERE present IS NOT NULL;
+
+COMMIT;
@@ -3,10 +3,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import psycopg2
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt
 from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
@@ -15,9 +15,24 @@ from psycopg2.errors import UniqueViolation
 from typing import List
 from datetime import date
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
+# Common/ (pool, metrics, password hashing) is shared with the Company backend
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from Common.access import refresh_user_access
+from Common.db import DatabasePool, pool_dependency
+from Common.metrics import (
+    InstrumentedCursor,
+    MetricsMiddleware,
+    render_route_metrics,
+    render_stats,
+    metrics_response
+)
+from Common.passwords import PasswordHasher
+
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
@@ -33,6 +48,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request counts, latency / DB-time histograms and pool wait,
+# exposed in Prometheus text format on /metrics (see Common/metrics.py).
+route_metrics = {}
+
+app.add_middleware(MetricsMiddleware, route_metrics=route_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    lines = render_route_metrics(route_metrics)
+
+    render_stats(lines, "db_pool", db_pool.stats())
+    render_stats(lines, "password_hasher", password_hasher.stats())
+
+    return metrics_response(lines)
+
+db_pool = DatabasePool(
+    int(os.getenv("DB_POOL_MIN", "1")),
+    int(os.getenv("DB_POOL_MAX", "10")),
+    float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+    host=os.getenv("DB_HOST"),
+    database=os.getenv("DB_NAME"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    cursor_factory=InstrumentedCursor
+)
+
+@app.on_event("startup")
+def open_db_pool():
+    db_pool.open()
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db_pool.close()
+
+# One pooled connection per request, shared by auth and the handler
+get_db_connection = pool_dependency(db_pool)
+
 class UserLogin(BaseModel):
     admin_id: str
     password: str
@@ -91,7 +144,10 @@ class CompanyAdminCreate(BaseModel):
     password: str
 
 
-def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def get_current_admin(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    conn=Depends(get_db_connection)
+):
     token = credentials.credentials
 
     try:
@@ -107,7 +163,6 @@ def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(securi
 
     admin_id = int(admin_id)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -124,7 +179,6 @@ def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(securi
     row = cur.fetchone()
 
     cur.close()
-    conn.close()
 
     if not row:
         raise HTTPException(status_code=401, detail="Session not found")
@@ -140,21 +194,24 @@ def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(securi
         "session_id": session_id
     }
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
+password_hasher = PasswordHasher(
+    int(os.getenv("PASSWORD_WORKERS", "1")),
+    int(os.getenv("PASSWORD_QUEUE_LIMIT", "8"))
+)
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
 
-def hash_password(p: str):
-    return pwd_context.hash(p)
+async def hash_password(p: str):
+    return await password_hasher.hash(p)
 
-def verify_password(p: str, h: str):
-    return pwd_context.verify(p, h)
+async def verify_password(p: str, h: str):
+    return await password_hasher.verify(p, h)
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -174,6 +231,7 @@ def calculate_end_date(start: date, cycle: str):
         raise HTTPException(status_code=400, detail="Invalid billing cycle")
 
 def log_platform_activity(
+    conn,
     actor_type: str,
     actor_id: int,
     action: str,
@@ -181,7 +239,6 @@ def log_platform_activity(
     target_id: int = None,
     metadata: dict = None
 ):
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -202,15 +259,14 @@ def log_platform_activity(
 
     conn.commit()
     cur.close()
-    conn.close()
 
 def write_audit_log(
+    conn,
     entity_type: str,
     entity_id: int,
     action: str,
     performed_by: str
 ):
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -229,29 +285,49 @@ def write_audit_log(
 
     conn.commit()
     cur.close()
-    conn.close()
 
-@app.post("/login")
-def login(user: UserLogin, request: Request):
-    conn = get_db_connection()
+# Expires the ETags the Company backend serves for /company/me,
+# /company/roles and /company/feature-bundles (resource_versions), and
+# tells its workers to drop the cached versions. COMPANY_CHANNEL is the
+# Company backend's SESSION_CHANNEL.
+COMPANY_CHANNEL = "session_invalidation"
+
+def notify_company_change(cur, company_id=None):
+    """company_id=None expires every tenant (feature catalogue changes)."""
+    cur.execute("""
+        WITH bumped AS (
+            INSERT INTO resource_versions AS v (scope, ident)
+            SELECT 'company', id
+            FROM companies
+            WHERE %s::int IS NULL OR id = %s
+            ORDER BY id
+            ON CONFLICT (scope, ident)
+            DO UPDATE SET version = v.version + 1
+            RETURNING v.scope, v.ident
+        )
+        SELECT pg_notify(%s, 'version:' || scope || ':' || ident)
+        FROM bumped
+    """, (company_id, company_id, COMPANY_CHANNEL))
+
+# Password routes are async so bcrypt is awaited off the threadpool; their
+# psycopg2 work still runs on the threadpool through these helpers.
+def find_admin_login(conn, admin_id):
     cur = conn.cursor()
 
     cur.execute(
         "SELECT id, password_hash FROM platform_admins WHERE name = %s",
-        (user.admin_id,)
+        (admin_id,)
     )
     row = cur.fetchone()
+    cur.close()
 
-    if not row:
-        return {"error": "Invalid credentials"}
-
-    user_id, password_hash = row
-
-    if not verify_password(user.password, password_hash):
-        return {"error": "Invalid credentials"}
+    return row
 
+def open_admin_session(conn, user_id, request):
     expires_at = datetime.utcnow() + timedelta(minutes=30)
 
+    cur = conn.cursor()
+
     cur.execute(
         """
         INSERT INTO platform_sessions (admin_id, ip_address, user_agent, expires_at)
@@ -269,14 +345,9 @@ def login(user: UserLogin, request: Request):
     session_id = cur.fetchone()[0]
     conn.commit()
     cur.close()
-    conn.close()
-
-    token = create_access_token({
-        "sub": str(user_id),
-        "sid": session_id
-    })
 
     log_platform_activity(
+        conn,
         actor_type="ADMIN",
         actor_id=user_id,
         action="ADMIN_LOGIN",
@@ -286,17 +357,42 @@ def login(user: UserLogin, request: Request):
         }
     )
 
+    return session_id
+
+@app.post("/login")
+async def login(user: UserLogin, request: Request, conn=Depends(get_db_connection)):
+    row = await run_in_threadpool(find_admin_login, conn, user.admin_id)
+
+    if not row:
+        return {"error": "Invalid credentials"}
+
+    user_id, password_hash = row
+
+    if not await verify_password(user.password, password_hash):
+        return {"error": "Invalid credentials"}
+
+    session_id = await run_in_threadpool(open_admin_session, conn, user_id, request)
+
+    token = create_access_token({
+        "sub": str(user_id),
+        "sid": session_id
+    })
+
     return {"access_token": token}
 
 @app.post("/admins")
-def add_admin(
+async def add_admin(
     admin: CreateAdmin,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    conn = get_db_connection()
+    password_hash = await hash_password(admin.password)
+    return await run_in_threadpool(insert_admin, conn, current, admin, password_hash)
+
+def insert_admin(conn, current, admin, password_hash):
     cur = conn.cursor()
 
     cur.execute(
@@ -309,16 +405,16 @@ def add_admin(
             admin.name,
             admin.email,
             "SUPPORT",
-            hash_password(admin.password)
+            password_hash
         )
     )
 
     new_admin_id = cur.fetchone()[0]
     conn.commit()
     cur.close()
-    conn.close()
 
     write_audit_log(
+        conn,
         entity_type="PLATFORM_ADMIN",
         entity_id=new_admin_id,
         action="ADMIN_CREATED",
@@ -328,22 +424,21 @@ def add_admin(
     return {"message": "Admin added successfully"}
 
 @app.get("/admins")
-def list_admins(current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def list_admins(current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("SELECT id, name, email, role FROM platform_admins")
     admins = cur.fetchall()
 
     cur.close()
-    conn.close()
 
     return admins
 
 @app.delete("/admins/{admin_id}")
 def remove_admin(
     admin_id: int,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403, detail="Not allowed")
@@ -351,7 +446,6 @@ def remove_admin(
     if current["id"] == admin_id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -362,7 +456,6 @@ def remove_admin(
 
     if not row:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Admin not found")
 
     role_to_delete = row[0]
@@ -375,7 +468,6 @@ def remove_admin(
 
         if super_admin_count <= 1:
             cur.close()
-            conn.close()
             raise HTTPException(
                 status_code=400,
                 detail="Cannot delete the last SUPER_ADMIN"
@@ -388,9 +480,9 @@ def remove_admin(
     conn.commit()
 
     cur.close()
-    conn.close()
 
     write_audit_log(
+        conn,
         entity_type="PLATFORM_ADMIN",
         entity_id=admin_id,
         action="ADMIN_DELETED",
@@ -400,11 +492,10 @@ def remove_admin(
     return {"message": "Admin removed successfully"}
 
 @app.post("/logout")
-def logout(current=Depends(get_current_admin)):
+def logout(current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     admin_id = current["id"]
     session_id = current["session_id"]
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -414,9 +505,9 @@ def logout(current=Depends(get_current_admin)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     log_platform_activity(
+        conn,
         actor_type="ADMIN",
         actor_id=admin_id,
         action="ADMIN_LOGOUT"
@@ -428,12 +519,12 @@ def logout(current=Depends(get_current_admin)):
 def add_company(
     company: CompanyCreate,
     contact: CompanyContactCreate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] not in ["SUPER_ADMIN", "SUPPORT"]:
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -471,9 +562,9 @@ def add_company(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     log_platform_activity(
+        conn,
         actor_type="ADMIN",
         actor_id=current["id"],
         action="COMPANY_CREATED",
@@ -485,6 +576,7 @@ def add_company(
     )
 
     write_audit_log(
+        conn,
         entity_type="COMPANY",
         entity_id=company_id,
         action="COMPANY_CREATED",
@@ -494,8 +586,7 @@ def add_company(
     return {"message": "Company added successfully", "company_id": company_id}
 
 @app.get("/companies")
-def list_companies(current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def list_companies(current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -506,12 +597,10 @@ def list_companies(current=Depends(get_current_admin)):
     companies = cur.fetchall()
 
     cur.close()
-    conn.close()
     return companies
 
 @app.get("/companies/{company_id}")
-def get_company(company_id: int, current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def get_company(company_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -523,7 +612,6 @@ def get_company(company_id: int, current=Depends(get_current_admin)):
 
     company = cur.fetchone()
     cur.close()
-    conn.close()
 
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
@@ -542,9 +630,9 @@ def get_company(company_id: int, current=Depends(get_current_admin)):
 def update_company(
     company_id: int,
     company: CompanyUpdate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute(
@@ -573,18 +661,18 @@ def update_company(
     if cur.rowcount == 0:
         raise HTTPException(status_code=404, detail="Company not found")
 
+    notify_company_change(cur, company_id)
+
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Company updated successfully"}
 
 @app.post("/plans")
-def create_plan(plan: PlanCreate, current=Depends(get_current_admin)):
+def create_plan(plan: PlanCreate, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -594,13 +682,11 @@ def create_plan(plan: PlanCreate, current=Depends(get_current_admin)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Plan created"}
 
 @app.get("/plans")
-def list_plans(current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def list_plans(current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -611,15 +697,13 @@ def list_plans(current=Depends(get_current_admin)):
     plans = cur.fetchall()
 
     cur.close()
-    conn.close()
     return plans
 
 @app.post("/features")
-def create_feature(feature: FeatureCreate, current=Depends(get_current_admin)):
+def create_feature(feature: FeatureCreate, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] not in ["SUPER_ADMIN", "SUPPORT"]:
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     try:
@@ -641,13 +725,11 @@ def create_feature(feature: FeatureCreate, current=Depends(get_current_admin)):
 
     finally:
         cur.close()
-        conn.close()
 
     return {"message": "Feature added successfully"}
 
 @app.get("/features")
-def list_features(current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def list_features(current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -658,19 +740,18 @@ def list_features(current=Depends(get_current_admin)):
     features = cur.fetchall()
 
     cur.close()
-    conn.close()
     return features
 
 @app.put("/plans/{plan_id}")
 def update_plan(
     plan_id: int,
     plan: PlanUpdate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -693,16 +774,14 @@ def update_plan(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Plan updated successfully"}
 
 @app.delete("/plans/{plan_id}")
-def delete_plan(plan_id: int, current=Depends(get_current_admin)):
+def delete_plan(plan_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     # 1. Remove subscriptions using this plan
@@ -723,9 +802,9 @@ def delete_plan(plan_id: int, current=Depends(get_current_admin)):
 
     conn.commit()
     cur.close()
-    conn.close()
 
     write_audit_log(
+        conn,
         entity_type="PLAN",
         entity_id=plan_id,
         action="PLAN_DELETED",
@@ -739,12 +818,12 @@ def delete_plan(plan_id: int, current=Depends(get_current_admin)):
 def update_feature(
     feature_id: int,
     feature: FeatureUpdate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] not in ["SUPER_ADMIN", "SUPPORT"]:
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     try:
@@ -767,6 +846,8 @@ def update_feature(
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Feature not found")
 
+        notify_company_change(cur)
+
         conn.commit()
 
     except UniqueViolation:
@@ -785,16 +866,14 @@ def update_feature(
 
     finally:
         cur.close()
-        conn.close()
 
     return {"message": "Feature updated successfully"}
 
 @app.delete("/features/{feature_id}")
-def delete_feature(feature_id: int, current=Depends(get_current_admin)):
+def delete_feature(feature_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     # 1. Remove feature access from companies
@@ -813,11 +892,13 @@ def delete_feature(feature_id: int, current=Depends(get_current_admin)):
         conn.rollback()
         raise HTTPException(status_code=404, detail="Feature not found")
 
+    notify_company_change(cur)
+
     conn.commit()
     cur.close()
-    conn.close()
 
     write_audit_log(
+        conn,
         entity_type="FEATURE",
         entity_id=feature_id,
         action="FEATURE_DELETED",
@@ -828,8 +909,7 @@ def delete_feature(feature_id: int, current=Depends(get_current_admin)):
 
 
 @app.get("/companies/{company_id}/subscription")
-def get_company_subscription(company_id: int, current=Depends(get_current_admin)):
-    conn = get_db_connection()
+def get_company_subscription(company_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -850,7 +930,6 @@ def get_company_subscription(company_id: int, current=Depends(get_current_admin)
     features = [f[0] for f in cur.fetchall()]
 
     cur.close()
-    conn.close()
 
     return {
         "subscription": subscription,
@@ -861,7 +940,8 @@ def get_company_subscription(company_id: int, current=Depends(get_current_admin)
 def set_company_subscription(
     company_id: int,
     data: CompanySubscriptionCreate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] not in ["SUPER_ADMIN", "SUPPORT"]:
         raise HTTPException(status_code=403)
@@ -869,7 +949,6 @@ def set_company_subscription(
     start = data.start_date or datetime.utcnow().date()
     end = calculate_end_date(start, data.billing_cycle)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -893,9 +972,9 @@ def set_company_subscription(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     log_platform_activity(
+        conn,
         actor_type="ADMIN",
         actor_id=current["id"],
         action="SUBSCRIPTION_UPDATED",
@@ -908,6 +987,7 @@ def set_company_subscription(
     )
 
     write_audit_log(
+        conn,
         entity_type="COMPANY",
         entity_id=company_id,
         action="SUBSCRIPTION_ASSIGNED",
@@ -920,12 +1000,12 @@ def set_company_subscription(
 def update_company_features(
     company_id: int,
     data: CompanyFeatureUpdate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] not in ["SUPER_ADMIN", "SUPPORT"]:
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -942,11 +1022,14 @@ def update_company_features(
             DO UPDATE SET enabled = TRUE, enabled_at = CURRENT_TIMESTAMP
         """, (company_id, feature_id))
 
+    refresh_user_access(cur, "u.company_id = %s", (company_id,))
+    notify_company_change(cur, company_id)
+
     conn.commit()
     cur.close()
-    conn.close()
 
     write_audit_log(
+        conn,
         entity_type="COMPANY",
         entity_id=company_id,
         action="FEATURES_UPDATED",
@@ -956,15 +1039,21 @@ def update_company_features(
     return {"message": "Features updated"}
 
 @app.post("/companies/{company_id}/admin")
-def create_company_admin(
+async def create_company_admin(
     company_id: int,
     admin: CompanyAdminCreate,
-    current=Depends(get_current_admin)
+    current=Depends(get_current_admin),
+    conn=Depends(get_db_connection)
 ):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
+    password_hash = await hash_password(admin.password)
+    return await run_in_threadpool(
+        insert_company_admin, conn, company_id, admin, password_hash
+    )
+
+def insert_company_admin(conn, company_id, admin, password_hash):
     cur = conn.cursor()
 
     # ensure company exists
@@ -982,21 +1071,26 @@ def create_company_admin(
         admin.emp_id,
         admin.name,
         admin.email,
-        hash_password(admin.password)
+        password_hash
     ))
 
+    # Company backend's per-day headcount (attendance_daily.total_active)
+    cur.execute("""
+        UPDATE attendance_daily
+        SET total_active = total_active + 1
+        WHERE company_id = %s AND date >= CURRENT_DATE
+    """, (company_id,))
+
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Company admin created"}
 
 @app.get("/plans/{plan_id}/usage")
-def get_plan_usage(plan_id: int, current=Depends(get_current_admin)):
+def get_plan_usage(plan_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -1008,7 +1102,6 @@ def get_plan_usage(plan_id: int, current=Depends(get_current_admin)):
 
     companies = cur.fetchall()
     cur.close()
-    conn.close()
 
     return {
         "in_use": len(companies) > 0,
@@ -1018,11 +1111,10 @@ def get_plan_usage(plan_id: int, current=Depends(get_current_admin)):
     }
 
 @app.get("/features/{feature_id}/usage")
-def get_feature_usage(feature_id: int, current=Depends(get_current_admin)):
+def get_feature_usage(feature_id: int, current=Depends(get_current_admin), conn=Depends(get_db_connection)):
     if current["role"] != "SUPER_ADMIN":
         raise HTTPException(status_code=403)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -1034,7 +1126,6 @@ def get_feature_usage(feature_id: int, current=Depends(get_current_admin)):
 
     companies = cur.fetchall()
     cur.close()
-    conn.close()
 
     return {
         "in_use": len(companies) > 0,
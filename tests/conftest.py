@@ -0,0 +1,108 @@
+"""
+Fixtures shared by the suite, against a real Postgres.
+
+    CMS_TEST_DSN="host=localhost user=postgres dbname=postgres" python -m pytest tests
+
+CMS_TEST_DSN points at a maintenance database; the database named by
+CMS_TEST_DB (default cms_test) is dropped, recreated from SQL/Schema.sql
+and seeded with Benchmarks/seed.py once per run. Without CMS_TEST_DSN the
+database tests are skipped locally and fail under CI (CI is set), so a
+misconfigured pipeline cannot pass by skipping everything; see
+.github/workflows/tests.yml.
+
+Every test module gets its own tenant (TENANTS), so tests that write do
+not see each other's rows.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Benchmarks"))
+
+TEST_DSN = os.getenv("CMS_TEST_DSN")
+
+# Tenant sizes; index 0 is the admin (E000001), the rest are members
+TENANTS = {
+    "test_query_budget": 3,
+    "test_pagination": 6,
+    "test_session_cache": 3,
+    "test_leave_ledger": 3,
+    "test_attendance_rollups": 4,
+    "test_attendance_export": 3,
+    "test_leave_overlap_migration": 2,
+}
+
+
+@pytest.fixture(scope="session")
+def database():
+    if not TEST_DSN:
+        if os.getenv("CI"):
+            pytest.fail("CMS_TEST_DSN is not set")
+        pytest.skip("CMS_TEST_DSN is not set")
+
+    psycopg2 = pytest.importorskip("psycopg2")
+    import bench
+    from seed import seed
+
+    params, _ = bench.prepare_database(
+        TEST_DSN, os.getenv("CMS_TEST_DB", "cms_test"), reset=True
+    )
+
+    conn = psycopg2.connect(**params)
+    bench.load_schema(conn)
+    fixture = seed(conn, list(TENANTS.values()), attendance_days=3, leads_per_user=2)
+    conn.close()
+
+    tenants = dict(zip(TENANTS, fixture["tenants"]))
+    return params, fixture["password"], tenants
+
+
+@pytest.fixture(scope="session")
+def company_server(database):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    import bench
+    from fastapi.testclient import TestClient
+
+    params, _, _ = database
+
+    bench.configure_env(params, ["QUERY_DEBUG=strict", "DB_ASYNC=false"])
+    server = bench.load_app("company_server_under_test", bench.COMPANY_SERVER)
+
+    with TestClient(server.app) as client:
+        yield server, client
+
+
+@pytest.fixture(scope="module")
+def tenant(request, database):
+    """The seeded tenant of the requesting module (see seed_tenant)."""
+    _, _, tenants = database
+    return tenants[request.module.__name__.rpartition(".")[2]]
+
+
+@pytest.fixture(scope="module")
+def login(company_server, database):
+    """login(company_id, emp_id) -> Authorization header for that user."""
+    import bench
+
+    _, client = company_server
+    _, password, _ = database
+
+    def login(company_id, emp_id):
+        return bench.company_login(client, company_id, emp_id, password)
+
+    return login
+
+
+@pytest.fixture
+def db(database):
+    """A direct connection for arranging and checking rows."""
+    import psycopg2
+
+    params, _, _ = database
+    conn = psycopg2.connect(**params)
+    yield conn
+    conn.close()
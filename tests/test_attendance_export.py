@@ -0,0 +1,47 @@
+"""
+/company/attendance/export streams the matrix on the request's own pooled
+connection and hands it back once the body is sent.
+"""
+import csv
+import io
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def admin(company_server, tenant, login):
+    _, client = company_server
+    return client, login(tenant["company_id"], tenant["admin_emp_id"])
+
+
+def test_export_streams_on_one_connection(company_server, admin, db, tenant, monkeypatch):
+    server, _ = company_server
+    client, headers = admin
+    today = date.today()
+
+    checkouts = []
+    getconn = server.db_pool.getconn
+    monkeypatch.setattr(server.db_pool, "getconn", lambda: checkouts.append(1) or getconn())
+
+    res = client.get("/company/attendance/export", headers=headers, params={
+        "date_from": str(today - timedelta(days=2)),
+        "date_to": str(today)
+    })
+
+    assert res.status_code == 200, res.text
+    assert len(checkouts) == 1
+    assert server.db_pool.stats()["in_use"] == 0
+
+    header, *rows = csv.reader(io.StringIO(res.text))
+    assert header[2:] == [str(today - timedelta(days=d)) for d in (2, 1, 0)]
+
+    cur = db.cursor()
+    cur.execute("""
+        SELECT u.emp_id, a.status
+        FROM users u
+        LEFT JOIN attendance a ON a.user_id = u.id AND a.date = %s
+        WHERE u.company_id = %s
+        ORDER BY u.emp_id
+    """, (today, tenant["company_id"]))
+    assert [(r[0], r[-1] or None) for r in rows] == cur.fetchall()
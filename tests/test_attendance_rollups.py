@@ -0,0 +1,160 @@
+"""
+attendance_monthly / attendance_daily: kept current by every write, and
+filled for existing data by SQL/migrations/002_attendance_rollups_backfill.sql.
+The summaries read only the rollups, so each test compares them with
+counts taken from attendance itself.
+"""
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+BACKFILL = (
+    Path(__file__).resolve().parent.parent
+    / "SQL" / "migrations" / "002_attendance_rollups_backfill.sql"
+)
+
+
+@pytest.fixture(scope="module")
+def admin(company_server, tenant, login):
+    _, client = company_server
+    return client, login(tenant["company_id"], tenant["admin_emp_id"])
+
+
+def base_daily(db, company_id, day):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'Present'),
+            COUNT(*) FILTER (WHERE status = 'Absent'),
+            COUNT(*) FILTER (WHERE status = 'Leave')
+        FROM attendance
+        WHERE company_id = %s AND date = %s
+    """, (company_id, day))
+    return dict(zip(("present", "absent", "leave"), cur.fetchone()))
+
+
+def base_monthly(db, user_id, day):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'Present'),
+            COUNT(*) FILTER (WHERE status = 'Absent'),
+            COUNT(*) FILTER (WHERE status = 'Leave')
+        FROM attendance
+        WHERE user_id = %s AND date_trunc('month', date) = date_trunc('month', %s::date)
+    """, (user_id, day))
+    return dict(zip(("present", "absent", "leave"), cur.fetchone()))
+
+
+def company_summary(admin, day):
+    client, headers = admin
+    res = client.get("/company/attendance/summary", params={"date": str(day)}, headers=headers)
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def employee_summary(admin, user_id, day):
+    client, headers = admin
+    res = client.get(
+        f"/company/attendance/user/{user_id}/summary",
+        params={"month": day.strftime("%Y-%m")},
+        headers=headers
+    )
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def counts(summary):
+    return {k: summary[k] for k in ("present", "absent", "leave")}
+
+
+def user_ids(db, company_id):
+    cur = db.cursor()
+    cur.execute("SELECT id FROM users WHERE company_id = %s ORDER BY id", (company_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def test_marking_keeps_rollups_current(admin, db, tenant):
+    client, headers = admin
+    day = date.today() - timedelta(days=1)
+    user_id = user_ids(db, tenant["company_id"])[1]
+
+    for status in ("Absent", "Leave", "Present"):
+        res = client.post("/company/attendance", headers=headers, json={
+            "user_id": user_id, "date": str(day), "status": status
+        })
+        assert res.status_code == 200, res.text
+
+        assert counts(company_summary(admin, day)) == base_daily(db, tenant["company_id"], day)
+        assert counts(employee_summary(admin, user_id, day)) == base_monthly(db, user_id, day)
+
+
+def test_backfill_fills_empty_rollups(admin, db, tenant):
+    company_id = tenant["company_id"]
+    day = date.today()
+    user_id = user_ids(db, company_id)[0]
+
+    cur = db.cursor()
+    cur.execute("DELETE FROM attendance_monthly WHERE company_id = %s", (company_id,))
+    cur.execute("DELETE FROM attendance_daily WHERE company_id = %s", (company_id,))
+    db.commit()
+
+    assert counts(company_summary(admin, day)) == {"present": 0, "absent": 0, "leave": 0}
+
+    db.autocommit = True
+    cur.execute(BACKFILL.read_text())
+    cur.execute(BACKFILL.read_text())   # re-running recounts, never adds
+
+    assert counts(company_summary(admin, day)) == base_daily(db, company_id, day)
+    assert counts(employee_summary(admin, user_id, day)) == base_monthly(db, user_id, day)
+
+
+def daily_rows(db, company_id):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT date, present, absent, leave, total_active
+        FROM attendance_daily
+        WHERE company_id = %s
+        ORDER BY date
+    """, (company_id,))
+    return cur.fetchall()
+
+
+def test_backfill_counts_headcount_per_day(admin, db, tenant):
+    client, headers = admin
+    company_id = tenant["company_id"]
+    today = date.today()
+    ids = user_ids(db, company_id)
+
+    # Everyone joined a month ago; one member leaves today
+    cur = db.cursor()
+    cur.execute(
+        "UPDATE users SET created_at = created_at - interval '30 days' WHERE company_id = %s",
+        (company_id,)
+    )
+    db.commit()
+
+    res = client.get("/company/users", params={"q": "E000003"}, headers=headers)
+    (leaver,) = res.json()["items"]
+    res = client.put(f"/company/users/{leaver['id']}", headers=headers, json={
+        "name": leaver["name"],
+        "email": leaver["email"],
+        "status": "inactive",
+        "is_company_admin": False
+    })
+    assert res.status_code == 200, res.text
+
+    db.autocommit = True
+    cur.execute(BACKFILL.read_text())
+
+    headcount = {row[0]: row[4] for row in daily_rows(db, company_id)}
+    assert headcount[today - timedelta(days=1)] == len(ids)
+    assert headcount[today] == len(ids) - 1
+    assert company_summary(admin, today)["total_employees"] == len(ids) - 1
+
+    # Matches the per-company rebuild the app runs
+    backfilled = daily_rows(db, company_id)
+    res = client.post("/company/attendance/rollups/rebuild", headers=headers)
+    assert res.status_code == 200, res.text
+    assert daily_rows(db, company_id) == backfilled
@@ -0,0 +1,132 @@
+"""
+Leave ledger rules: approvals are blocked for overdraft only under an
+effective policy that forbids it, and cancelling an approved leave
+credits back only what its approval debited.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def people(company_server, tenant, login):
+    _, client = company_server
+    return (
+        client,
+        login(tenant["company_id"], tenant["admin_emp_id"]),
+        login(tenant["company_id"], "E000002")
+    )
+
+
+@pytest.fixture
+def member_id(db, tenant):
+    cur = db.cursor()
+    cur.execute(
+        "SELECT id FROM users WHERE company_id = %s AND emp_id = 'E000002'",
+        (tenant["company_id"],)
+    )
+    return cur.fetchone()[0]
+
+
+def monday(weeks_ahead):
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday() + 7 * weeks_ahead)
+
+
+def apply(people, db, member_id, leave_type, start):
+    client, _, member = people
+    res = client.post("/company/leaves", headers=member, json={
+        "leave_type": leave_type,
+        "start_date": str(start),
+        "end_date": str(start + timedelta(days=1))
+    })
+    assert res.status_code == 200, res.text
+
+    cur = db.cursor()
+    cur.execute(
+        "SELECT id FROM leave_requests WHERE user_id = %s AND start_date = %s",
+        (member_id, start)
+    )
+    return cur.fetchone()[0]
+
+
+def review(people, leave_id):
+    client, admin, _ = people
+    return client.put(
+        f"/company/leaves/{leave_id}/review", headers=admin, json={"status": "Approved"}
+    )
+
+
+def ledger(db, leave_id):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT entry_type, amount
+        FROM leave_ledger
+        WHERE leave_request_id = %s
+        ORDER BY id
+    """, (leave_id,))
+    return [(entry_type, float(amount)) for entry_type, amount in cur.fetchall()]
+
+
+def set_policy(people, leave_type, allow_negative):
+    client, admin, _ = people
+    res = client.put("/company/leave-policies", headers=admin, json={
+        "leave_type": leave_type,
+        "annual_days": 0,
+        "allow_negative": allow_negative
+    })
+    assert res.status_code == 200, res.text
+
+
+def test_approval_without_policy_is_not_metered(people, db, member_id):
+    leave_id = apply(people, db, member_id, "Unpaid", monday(1))
+
+    assert review(people, leave_id).status_code == 200
+    assert ledger(db, leave_id) == [("debit", -2.0)]
+
+
+def test_policy_blocks_overdraft_unless_negative_allowed(people, db, member_id):
+    set_policy(people, "Earned", allow_negative=False)
+    leave_id = apply(people, db, member_id, "Earned", monday(2))
+
+    res = review(people, leave_id)
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Insufficient leave balance"
+    assert ledger(db, leave_id) == []
+
+    set_policy(people, "Earned", allow_negative=True)
+
+    assert review(people, leave_id).status_code == 200
+    assert ledger(db, leave_id) == [("debit", -2.0)]
+
+
+def test_cancel_credits_back_the_debit(people, db, member_id):
+    client, _, member = people
+    leave_id = apply(people, db, member_id, "Casual", monday(3))
+    assert review(people, leave_id).status_code == 200
+
+    res = client.put(f"/company/leaves/{leave_id}/cancel", headers=member)
+
+    assert res.status_code == 200
+    assert ledger(db, leave_id) == [("debit", -2.0), ("credit", 2.0)]
+
+
+def test_cancel_without_debit_credits_nothing(people, db, tenant, member_id):
+    # Approved before the ledger existed: no debit was ever posted
+    client, _, member = people
+    start = monday(4)
+
+    cur = db.cursor()
+    cur.execute("""
+        INSERT INTO leave_requests
+            (company_id, user_id, leave_type, start_date, end_date, total_days, status)
+        VALUES (%s, %s, 'Casual', %s, %s, 2, 'Approved')
+        RETURNING id
+    """, (tenant["company_id"], member_id, start, start + timedelta(days=1)))
+    leave_id = cur.fetchone()[0]
+    db.commit()
+
+    res = client.put(f"/company/leaves/{leave_id}/cancel", headers=member)
+
+    assert res.status_code == 200
+    assert ledger(db, leave_id) == []
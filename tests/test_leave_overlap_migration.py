@@ -0,0 +1,67 @@
+"""
+SQL/migrations/001_leave_requests_no_overlap.sql on a database that still
+has overlapping Pending leaves: they are settled in applied_at order, and
+only the ones that overlap a kept leave are Rejected.
+"""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+MIGRATION = (
+    Path(__file__).resolve().parent.parent
+    / "SQL" / "migrations" / "001_leave_requests_no_overlap.sql"
+)
+
+
+def add_leave(cur, tenant, user_id, start, days, status, applied_at):
+    cur.execute("""
+        INSERT INTO leave_requests
+            (company_id, user_id, leave_type, start_date, end_date, total_days, status, applied_at)
+        VALUES (%s, %s, 'Casual', %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (tenant["company_id"], user_id, start, start + timedelta(days=days - 1),
+          days, status, applied_at))
+    return cur.fetchone()[0]
+
+
+def test_overlaps_resolved_in_applied_order(db, tenant):
+    cur = db.cursor()
+    cur.execute(
+        "SELECT id FROM users WHERE company_id = %s AND emp_id = 'E000002'",
+        (tenant["company_id"],)
+    )
+    user_id = cur.fetchone()[0]
+    start = date.today() + timedelta(days=60)
+    applied = datetime(2024, 1, 1)
+
+    cur.execute("ALTER TABLE leave_requests DROP CONSTRAINT leave_requests_no_overlap")
+
+    # A chain inserted newest first, so id order is the reverse of
+    # applied order: A overlaps B, B overlaps C, A and C are apart
+    c = add_leave(cur, tenant, user_id, start + timedelta(days=4), 3, "Pending", applied + timedelta(days=2))
+    b = add_leave(cur, tenant, user_id, start + timedelta(days=2), 3, "Pending", applied + timedelta(days=1))
+    a = add_leave(cur, tenant, user_id, start, 3, "Pending", applied)
+
+    # Approved wins over a Pending leave applied for earlier
+    d = add_leave(cur, tenant, user_id, start + timedelta(days=20), 2, "Pending", applied)
+    e = add_leave(cur, tenant, user_id, start + timedelta(days=21), 2, "Approved", applied + timedelta(days=3))
+    db.commit()
+
+    db.autocommit = True
+    cur.execute(MIGRATION.read_text())
+
+    cur.execute(
+        "SELECT id, status, review_notes FROM leave_requests WHERE id = ANY(%s)",
+        ([a, b, c, d, e],)
+    )
+    rows = {r[0]: r[1:] for r in cur.fetchall()}
+
+    assert {i: rows[i][0] for i in (a, b, c, d, e)} == {
+        a: "Pending", b: "Rejected", c: "Pending", d: "Rejected", e: "Approved"
+    }
+    assert rows[b][1].endswith(f"overlaps leave {a}")
+    assert rows[d][1].endswith(f"overlaps leave {e}")
+
+    cur.execute("""
+        SELECT 1 FROM pg_constraint WHERE conname = 'leave_requests_no_overlap'
+    """)
+    assert cur.fetchone() is not None
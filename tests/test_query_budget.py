@@ -0,0 +1,40 @@
+"""
+@query_budget under QUERY_DEBUG=strict (the whole suite runs that way).
+"""
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def company(company_server, tenant, login):
+    server, client = company_server
+    headers = login(tenant["company_id"], tenant["user_emp_id"])
+    return server, client, headers
+
+
+def route_endpoint(server, path, method):
+    for route in server.app.routes:
+        if getattr(route, "path", None) == path and method in route.methods:
+            return route.endpoint
+    raise LookupError(f"{method} {path}")
+
+
+def test_route_within_budget_passes(company):
+    server, client, headers = company
+
+    res = client.get(f"/company/attendance?date={date.today()}", headers=headers)
+
+    assert res.status_code == 200
+    budget = route_endpoint(server, "/company/attendance", "GET").query_budget
+    assert 0 < int(res.headers["x-query-count"]) <= budget
+
+
+def test_route_over_budget_fails(company, monkeypatch):
+    server, client, headers = company
+
+    endpoint = route_endpoint(server, "/company/attendance", "GET")
+    monkeypatch.setattr(endpoint, "query_budget", 0)
+
+    with pytest.raises(server.QueryBudgetExceeded, match="exceeded its query budget of 0"):
+        client.get(f"/company/attendance?date={date.today()}", headers=headers)
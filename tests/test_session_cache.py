@@ -0,0 +1,112 @@
+"""
+Invalidation of what a worker caches per session (SessionCache), per user
+(user_access) and per resource (ETags): a write must be visible to the
+very next request, not after SESSION_CACHE_TTL.
+"""
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def admin(company_server, tenant, login):
+    _, client = company_server
+    return client, login(tenant["company_id"], tenant["admin_emp_id"])
+
+
+def find_user(admin, emp_id):
+    client, headers = admin
+    res = client.get("/company/users", params={"q": emp_id}, headers=headers)
+    (user,) = [u for u in res.json()["items"] if u["emp_id"] == emp_id]
+    return user
+
+
+def role_ids(admin):
+    client, headers = admin
+    return {r["name"]: r["id"] for r in client.get("/company/roles", headers=headers).json()}
+
+
+def update_user(admin, user, **changes):
+    client, headers = admin
+    res = client.put(f"/company/users/{user['id']}", headers=headers, json={
+        "name": user["name"],
+        "email": user["email"],
+        "status": user["status"],
+        "is_company_admin": False,
+        "role_ids": [],
+        **changes
+    })
+    assert res.status_code == 200, res.text
+
+
+def test_deactivation_ends_cached_session(admin, tenant, login):
+    client, _ = admin
+    user = find_user(admin, "E000002")
+    headers = login(tenant["company_id"], "E000002")
+
+    assert client.get("/company/me", headers=headers).status_code == 200
+
+    update_user(admin, user, status="inactive")
+    try:
+        assert client.get("/company/me", headers=headers).status_code == 403
+    finally:
+        update_user(admin, user, status="active")
+
+    assert client.get("/company/me", headers=headers).status_code == 200
+
+
+def test_logout_ends_cached_session(admin, tenant, login):
+    client, _ = admin
+    headers = login(tenant["company_id"], "E000002")
+
+    assert client.get("/company/me", headers=headers).status_code == 200
+    assert client.post("/company/logout", headers=headers).status_code == 200
+
+    assert client.get("/company/me", headers=headers).status_code == 401
+
+
+def test_role_change_refreshes_features_and_etag(admin, tenant, login):
+    client, _ = admin
+    user = find_user(admin, "E000003")
+    roles = role_ids(admin)
+    headers = login(tenant["company_id"], "E000003")
+
+    update_user(admin, user, role_ids=[roles["Sales"]])
+    before = client.get("/company/me", headers=headers)
+    assert [f["code"] for f in before.json()["features"]] == ["ATTENDANCE", "LEAVES", "SALES"]
+
+    cached = {**headers, "If-None-Match": before.headers["etag"]}
+    assert client.get("/company/me", headers=cached).status_code == 304
+
+    update_user(admin, user, role_ids=[roles["HR"]])
+    after = client.get("/company/me", headers=cached)
+
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert [f["code"] for f in after.json()["features"]] == ["ATTENDANCE", "LEAVES", "HR"]
+
+
+def test_bump_from_another_process_expires_cached_etag(company_server, admin, db, tenant):
+    # What Super-Admin's notify_company_change does, on its own connection
+    server, _ = company_server
+    client, headers = admin
+
+    before = client.get("/company/me", headers=headers)
+    cached = {**headers, "If-None-Match": before.headers["etag"]}
+    assert client.get("/company/me", headers=cached).status_code == 304
+    assert ("company", tenant["company_id"]) in server.etag_versions._entries
+
+    cur = db.cursor()
+    cur.execute(server.BUMP_RESOURCE_VERSIONS_SQL, (
+        ["company"], [tenant["company_id"]], server.SESSION_CHANNEL
+    ))
+    db.commit()
+
+    deadline = time.monotonic() + 5
+    while ("company", tenant["company_id"]) in server.etag_versions._entries:
+        assert time.monotonic() < deadline, "version notification not applied"
+        time.sleep(0.01)
+
+    after = client.get("/company/me", headers=cached)
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
@@ -0,0 +1,47 @@
+"""
+explain_statement only runs EXPLAIN ANALYZE for plain reads; anything
+that writes, locks rows or calls a volatile function is explained
+without being executed, and nothing survives the explain transaction.
+"""
+import pytest
+
+
+@pytest.fixture
+def explain(company_server, db):
+    server, _ = company_server
+    return lambda query, params: server.explain_statement(db, query, params)
+
+
+def analyzed(plan):
+    return "actual time=" in plan
+
+
+def test_plain_read_is_analyzed(explain):
+    plan = explain("SELECT id FROM users WHERE company_id = %s", (1,))
+
+    assert analyzed(plan)
+    assert "$1" in plan
+
+
+@pytest.mark.parametrize("query, params", [
+    ("UPDATE users SET name = name WHERE id = %s", (1,)),
+    ("SELECT id FROM users WHERE id = %s FOR UPDATE", (1,)),
+    ("SELECT id FROM users WHERE id = %s FOR NO KEY UPDATE", (1,)),
+    ("SELECT id FROM users WHERE id = %s FOR SHARE", (1,)),
+    ("SELECT id FROM users WHERE id = %s FOR KEY SHARE", (1,)),
+    ("WITH d AS (DELETE FROM user_sessions WHERE user_id = %s RETURNING id) SELECT * FROM d", (1,)),
+    ("SELECT nextval('leave_ledger_id_seq') WHERE %s", (True,)),
+    ("SELECT id FROM users WHERE company_id = %s", None),
+])
+def test_writes_and_locks_are_not_executed(explain, db, query, params):
+    cur = db.cursor()
+    cur.execute("SELECT last_value FROM leave_ledger_id_seq")
+    sequence = cur.fetchone()[0]
+    db.rollback()
+
+    plan = explain(query, params)
+
+    assert not analyzed(plan)
+    cur.execute("SELECT last_value FROM leave_ledger_id_seq")
+    assert cur.fetchone()[0] == sequence
+    cur.close()
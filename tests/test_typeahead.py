@@ -0,0 +1,44 @@
+"""
+TypeaheadIndex builds a tenant lazily; writes and invalidations that land
+while the build is reading the tables must not be lost.
+"""
+import pytest
+
+
+@pytest.fixture
+def index(company_server):
+    server, _ = company_server
+    return server, server.TypeaheadIndex(max_entries=1000, ttl=60)
+
+
+def build_with(server, index, during_build):
+    """A build that reads an empty snapshot, then lets `during_build` run."""
+    def build(conn, company_id):
+        tenant = server.TenantTypeahead({"user": [], "lead": []})
+        during_build()
+        return tenant
+
+    index._build = build
+
+
+def user(name):
+    return {"id": 7, "emp_id": "E000007", "name": name, "status": "active"}
+
+
+def test_put_during_build_is_replayed(index):
+    server, index = index
+    build_with(server, index, lambda: index.put(1, "user", user("Asha Rao")))
+
+    assert [u["name"] for u in index.search(None, 1, "user", "asha", 10)] == ["Asha Rao"]
+
+    # Kept: the next lookup reuses the built tenant
+    index._build = None
+    assert [u["name"] for u in index.search(None, 1, "user", "rao", 10)] == ["Asha Rao"]
+
+
+def test_discard_during_build_is_not_kept(index):
+    server, index = index
+    build_with(server, index, lambda: index.discard(1))
+
+    assert index.search(None, 1, "user", "asha", 10) == []
+    assert index.stats()["tenants"] == 0